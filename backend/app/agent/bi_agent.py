@@ -9,21 +9,41 @@ Optimizations kept:
   2. Quota cooldown — skips API for 5 min after a 429
   3. Pre-flight check — tiny HTTP call before expensive agent call
   4. Local fallback — answers from data alone when API unavailable
+  5. Shared async client — one genai.Client reused across requests,
+     and generate_content is awaited so the event loop stays free
+  6. Semantic cache — paraphrased questions on the same file reuse a
+     cached answer (local embedding, cosine similarity >= threshold)
+  7. Context caching — system prompt + tool schemas are cached server-side
+     once and referenced by name instead of being resent every round
+  8. Streaming — stream_agent_query yields answer text as it is generated
+  9. Fast path — short generic questions (summary, anomalies, trends, ...)
+     that name no column are answered locally without calling Gemini
+ 10. History compaction — tool results the model has already read are
+     resent as one-line headers, keeping only the latest few in full
 """
 
 import os
+import re
 import asyncio
 import json
 import hashlib
+import io
+import logging
 import time
-import traceback
+import threading
+from collections import defaultdict
+from typing import AsyncIterator
 
+import numpy as np
+from cachetools import TTLCache
 from google import genai
+from google.genai import errors as genai_errors
 from google.genai import types as genai_types
 
 from ..config import settings
 from .tools import (
-    set_context,
+    ToolContext,
+    make_tool_context,
     get_data_summary,
     get_column_statistics,
     query_data,
@@ -35,13 +55,214 @@ from .tools import (
 )
 from .prompts import SYSTEM_PROMPT
 
+logger = logging.getLogger(__name__)
+
 # ── Response cache ───────────────────────────────────────────
-_chat_cache: dict[str, dict] = {}
+# Bounded + expiring so a long-running server doesn't keep every question
+# forever. Keys are tracked per file_id so a file's answers can be dropped
+# wholesale when its data changes (see invalidate_file).
+# With AGENT_CACHE_DIR set (and diskcache installed) the cache lives on
+# disk and is shared by every uvicorn worker; entries are tagged with
+# their file_id instead of being tracked in _cache_by_file.
+_CHAT_CACHE_TTL = 3600
+
+
+def _open_shared_chat_cache():
+    """Open the on-disk chat cache shared across workers, or None."""
+    if not settings.AGENT_CACHE_DIR:
+        return None
+    try:
+        import diskcache
+        return diskcache.Cache(settings.AGENT_CACHE_DIR, size_limit=2**30, tag_index=True)
+    except Exception as e:
+        logger.warning("Shared chat cache unavailable, using in-process cache: %s", e)
+        return None
+
+
+_shared_chat_cache = _open_shared_chat_cache()
+_chat_cache = _shared_chat_cache if _shared_chat_cache is not None else TTLCache(maxsize=1024, ttl=_CHAT_CACHE_TTL)
+_cache_by_file: dict[str, set[str]] = defaultdict(set)
+
+# Tool results are pure functions of a file's cached data + the call args,
+# so repeated calls (across rounds and questions) are served from here.
+# Keyed by (file_id, tool_name, sorted args); guarded because tools run
+# in worker threads.
+_tool_result_cache: TTLCache = TTLCache(maxsize=512, ttl=3600)
+_tool_cache_lock = threading.Lock()
 
 
 def _chat_cache_key(file_id: str, question: str) -> str:
     q_norm = question.strip().lower()[:200]
-    return hashlib.md5(f"{file_id}:{q_norm}".encode()).hexdigest()
+    return hashlib.blake2b(f"{file_id}:{q_norm}".encode(), digest_size=16).hexdigest()
+
+
+# ── Semantic cache ───────────────────────────────────────────
+# Per file_id: a ring of normalized question embeddings and their results.
+# Catches paraphrases ("top 5 customers by revenue" vs "show me the top
+# five customers by revenue") that the exact-match key above misses.
+# Capped like the insight side, and entries expire with the exact cache.
+_SEMANTIC_MAX_ENTRIES = 512
+
+
+class _SemanticRing:
+    """Up to _SEMANTIC_MAX_ENTRIES (embedding, result, stored_at) rows, overwriting the oldest."""
+
+    def __init__(self, dim: int):
+        self.vectors = np.empty((16, dim), dtype=np.float32)  # doubles until the cap
+        self.results: list[dict | None] = [None] * 16
+        self.stored_at = np.zeros(16)
+        self.next = 0
+        self.size = 0
+
+    def add(self, emb: np.ndarray, result: dict, stored_at: float):
+        cap = len(self.results)
+        if self.size == cap and cap < _SEMANTIC_MAX_ENTRIES:
+            new_cap = min(cap * 2, _SEMANTIC_MAX_ENTRIES)
+            self.vectors = np.concatenate([self.vectors, np.empty((new_cap - cap, self.vectors.shape[1]), np.float32)])
+            self.results += [None] * (new_cap - cap)
+            self.stored_at = np.concatenate([self.stored_at, np.zeros(new_cap - cap)])
+            self.next, cap = cap, new_cap  # a full ring is still in order, so append after it
+        i = self.next
+        self.vectors[i], self.results[i], self.stored_at[i] = emb, result, stored_at
+        self.next = (i + 1) % cap
+        self.size = min(self.size + 1, cap)
+
+    def lookup(self, emb: np.ndarray, threshold: float) -> dict | None:
+        """Result of the most similar unexpired question, if it is at least threshold similar."""
+        sims = self.vectors[:self.size] @ emb
+        sims[self.stored_at[:self.size] <= time.time() - _CHAT_CACHE_TTL] = -np.inf
+        best = int(np.argmax(sims))
+        return self.results[best] if sims[best] >= threshold else None
+
+    def rows(self) -> list[int]:
+        """Row indices, oldest first."""
+        start = self.next if self.size == len(self.results) else 0
+        return [(start + k) % len(self.results) for k in range(self.size)]
+
+
+_semantic_cache: dict[str, _SemanticRing] = {}
+_embedder = None
+_embedder_failed = False
+
+
+def _get_embedder():
+    """Lazily load the local sentence embedder. Returns None if unavailable."""
+    global _embedder, _embedder_failed
+    if _embedder is None and not _embedder_failed and settings.AGENT_SEMANTIC_CACHE:
+        try:
+            from sentence_transformers import SentenceTransformer
+            try:
+                _embedder = SentenceTransformer(settings.AGENT_EMBED_MODEL, backend="onnx")
+            except Exception:
+                _embedder = SentenceTransformer(settings.AGENT_EMBED_MODEL)
+        except Exception as e:
+            logger.warning("Semantic cache disabled: %s", e)
+            _embedder_failed = True
+    return _embedder
+
+
+def _embed_question(question: str) -> np.ndarray | None:
+    """Embed a normalized question, or None when no embedder is available."""
+    model = _get_embedder()
+    if model is None:
+        return None
+    emb = model.encode(question.strip().lower(), normalize_embeddings=True)
+    return np.asarray(emb, dtype=np.float32)
+
+
+def _semantic_lookup(file_id: str, emb: np.ndarray | None) -> dict | None:
+    """Return the cached result of the most similar question for this file, if close enough."""
+    ring = _semantic_cache.get(file_id)
+    if emb is None or ring is None or ring.vectors.shape[1] != emb.shape[0]:
+        return None
+    return ring.lookup(emb, settings.AGENT_SEMANTIC_THRESHOLD)
+
+
+def _store_result(cache_key: str, file_id: str, emb: np.ndarray | None, result: dict):
+    """Record a result in both the exact-match and semantic caches."""
+    if _shared_chat_cache is not None:
+        _shared_chat_cache.set(cache_key, result, expire=_CHAT_CACHE_TTL, tag=file_id)
+    else:
+        _chat_cache[cache_key] = result
+        _cache_by_file[file_id].add(cache_key)
+    if emb is None:
+        return
+    _semantic_add(file_id, emb, result, time.time())
+
+
+def _semantic_add(file_id: str, emb: np.ndarray, result: dict, stored_at: float):
+    ring = _semantic_cache.get(file_id)
+    if ring is None or ring.vectors.shape[1] != emb.shape[0]:
+        ring = _semantic_cache[file_id] = _SemanticRing(emb.shape[0])
+    ring.add(emb, result, stored_at)
+
+
+def invalidate_file(file_id: str):
+    """Drop every cached answer for a file (call when its data is replaced or deleted)."""
+    if _shared_chat_cache is not None:
+        _shared_chat_cache.evict(file_id)
+    for key in _cache_by_file.pop(file_id, set()):
+        _chat_cache.pop(key, None)
+    _semantic_cache.pop(file_id, None)
+    with _tool_cache_lock:
+        for key in [k for k in _tool_result_cache if k[0] == file_id]:
+            _tool_result_cache.pop(key, None)
+
+
+def save_chat_cache(path: str | None = None):
+    """Persist both chat caches to a JSON file (called on app shutdown).
+
+    The exact-match entries are skipped when the shared disk cache is in use,
+    since it is already persistent.
+    """
+    path = path or settings.AGENT_CACHE_FILE
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        payload = {
+            "exact": dict(_chat_cache) if _shared_chat_cache is None else {},
+            "by_file": {fid: sorted(keys) for fid, keys in _cache_by_file.items()},
+            "semantic": {
+                fid: {
+                    "embeddings": ring.vectors[rows].tolist(),
+                    "results": [ring.results[i] for i in rows],
+                    "stored_at": ring.stored_at[rows].tolist(),
+                }
+                for fid, ring in _semantic_cache.items()
+                for rows in [ring.rows()]
+            },
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(payload, f)
+    except Exception as e:
+        logger.warning("Could not save chat cache: %s", e)
+
+
+def load_chat_cache(path: str | None = None):
+    """Restore chat caches saved by save_chat_cache (called on app startup)."""
+    path = path or settings.AGENT_CACHE_FILE
+    if not os.path.isfile(path):
+        return
+    try:
+        with open(path, encoding="utf-8") as f:
+            payload = json.load(f)
+        if _shared_chat_cache is None:
+            _chat_cache.update(payload.get("exact", {}))
+            for fid, keys in payload.get("by_file", {}).items():
+                _cache_by_file[fid].update(keys)
+        # Rows are saved oldest first; expired ones are dropped and only the
+        # newest _SEMANTIC_MAX_ENTRIES per file are kept
+        expired_before = time.time() - _CHAT_CACHE_TTL
+        for fid, entry in payload.get("semantic", {}).items():
+            emb = np.asarray(entry["embeddings"], dtype=np.float32)
+            results = entry["results"]
+            stored_at = entry.get("stored_at", [0.0] * len(results))
+            if emb.ndim != 2 or not len(emb) == len(results) == len(stored_at):
+                continue
+            for i in range(max(0, len(results) - _SEMANTIC_MAX_ENTRIES), len(results)):
+                if stored_at[i] > expired_before:
+                    _semantic_add(fid, emb[i], results[i], stored_at[i])
+    except Exception as e:
+        logger.warning("Could not load chat cache: %s", e)
 
 
 # ── Quota cooldown ───────────────────────────────────────────
@@ -56,7 +277,7 @@ def _is_api_available() -> bool:
 def _set_api_cooldown():
     global _api_cooldown_until
     _api_cooldown_until = time.time() + _API_COOLDOWN_SECS
-    print(f"[Agent] API cooldown set for {_API_COOLDOWN_SECS}s.")
+    logger.info("API cooldown set for %ss.", _API_COOLDOWN_SECS)
 
 
 # ── Resolve API key robustly ─────────────────────────────────
@@ -77,6 +298,26 @@ def _get_api_key() -> str:
     return key
 
 
+# ── Shared Gemini client ─────────────────────────────────────
+# Built once and reused so every chat shares one connection pool
+# instead of paying client setup + TLS handshake per question.
+_client: genai.Client | None = None
+_client_api_key: str = ""
+_client_lock = asyncio.Lock()
+
+
+async def _get_client() -> genai.Client:
+    """Return the shared Gemini client, rebuilding it only if the API key changed."""
+    global _client, _client_api_key
+    api_key = _get_api_key()
+    async with _client_lock:
+        if _client is None or api_key != _client_api_key:
+            _client = genai.Client(api_key=api_key)
+            _client_api_key = api_key
+            _reset_cached_content()
+    return _client
+
+
 # ── Tool declarations for Gemini function calling ────────────
 TOOL_DECLARATIONS = genai_types.Tool(
     function_declarations=[
@@ -101,7 +342,10 @@ TOOL_DECLARATIONS = genai_types.Tool(
         ),
         genai_types.FunctionDeclaration(
             name="query_data",
-            description="Filter the dataset and return matching rows. Operators: ==, !=, >, <, >=, <=, contains.",
+            description=(
+                "Filter the dataset and return matching rows. Operators: ==, !=, >, <, >=, <=, contains. "
+                "Results over ~4 KB are cut off with a '... (N more lines omitted; total=K)' marker."
+            ),
             parameters=genai_types.Schema(
                 type="OBJECT",
                 properties={
@@ -138,7 +382,10 @@ TOOL_DECLARATIONS = genai_types.Tool(
         ),
         genai_types.FunctionDeclaration(
             name="compute_group_aggregation",
-            description="Compute a grouped aggregation (sum, mean, median, count, min, max) on the data.",
+            description=(
+                "Compute a grouped aggregation (sum, mean, median, count, min, max) on the data. "
+                "Results over ~4 KB are cut off with a '... (N more lines omitted; total=K)' marker."
+            ),
             parameters=genai_types.Schema(
                 type="OBJECT",
                 properties={
@@ -160,62 +407,254 @@ TOOL_DECLARATIONS = genai_types.Tool(
     ]
 )
 
+# Built once at import — the prompt and tool schemas never change, so there's
+# no need to re-validate all the declarations on every round.
+_GEN_CONFIG = genai_types.GenerateContentConfig(
+    system_instruction=SYSTEM_PROMPT,
+    tools=[TOOL_DECLARATIONS],
+    temperature=0.2,
+)
+
+# ── Server-side context cache ────────────────────────────────
+# The system prompt + tool schemas are identical on every call, so they are
+# uploaded once with client.caches.create and referenced by name afterwards.
+# If caching isn't possible (e.g. the prefix is below the model's minimum
+# cacheable size) we fall back to sending _GEN_CONFIG inline. Permanent
+# refusals (400/404: content too small, model without caching) switch it off
+# for the process; transient failures (429, 5xx, timeouts) retry later.
+_CACHED_CONTENT_RETRY_SECS = 300
+_cached_gen_config: genai_types.GenerateContentConfig | None = None
+_cached_content_retry_at = 0.0  # time.monotonic() before which not to retry; inf = never
+_cached_content_lock = asyncio.Lock()
+
+
+def _reset_cached_content():
+    global _cached_gen_config, _cached_content_retry_at
+    _cached_gen_config = None
+    _cached_content_retry_at = 0.0
+
+
+def _cached_content_blocked() -> bool:
+    return time.monotonic() < _cached_content_retry_at
+
+
+async def _get_gen_config(client: genai.Client) -> genai_types.GenerateContentConfig:
+    """Return a config that references the cached prefix, or the inline config."""
+    global _cached_gen_config, _cached_content_retry_at
+    if _cached_gen_config is not None or _cached_content_blocked():
+        return _cached_gen_config or _GEN_CONFIG
+    async with _cached_content_lock:
+        if _cached_gen_config is None and not _cached_content_blocked():
+            try:
+                cache = await client.aio.caches.create(
+                    model=settings.GEMINI_MODEL,
+                    config=genai_types.CreateCachedContentConfig(
+                        system_instruction=SYSTEM_PROMPT,
+                        tools=[TOOL_DECLARATIONS],
+                        ttl="3600s",
+                    ),
+                )
+                _cached_gen_config = genai_types.GenerateContentConfig(
+                    cached_content=cache.name,
+                    temperature=0.2,
+                )
+            except Exception as e:
+                if isinstance(e, genai_errors.ClientError) and e.code in (400, 404):
+                    logger.warning("Context caching unsupported, sending prompt inline: %s", e)
+                    _cached_content_retry_at = float("inf")
+                else:
+                    logger.warning("Context caching failed, retrying in %ss: %s", _CACHED_CONTENT_RETRY_SECS, e)
+                    _cached_content_retry_at = time.monotonic() + _CACHED_CONTENT_RETRY_SECS
+    return _cached_gen_config or _GEN_CONFIG
+
+
+async def _generate_stream(client: genai.Client, contents: list):
+    """Start one streamed generate_content round, refreshing the context cache if it expired."""
+    config = await _get_gen_config(client)
+    try:
+        return await client.aio.models.generate_content_stream(
+            model=settings.GEMINI_MODEL,
+            contents=contents,
+            config=config,
+        )
+    except genai_errors.ClientError as e:
+        if e.code != 404 or config is _GEN_CONFIG:
+            raise
+        # Cached content expired or was deleted server-side — recreate it once
+        _reset_cached_content()
+        return await client.aio.models.generate_content_stream(
+            model=settings.GEMINI_MODEL,
+            contents=contents,
+            config=await _get_gen_config(client),
+        )
+
+
 # ── Map function names to actual Python callables ────────────
 _TOOL_MAP = {
-    "get_data_summary": lambda **kw: get_data_summary(),
-    "get_column_statistics": lambda **kw: get_column_statistics(**kw),
-    "query_data": lambda **kw: query_data(**kw),
-    "get_correlation_insights": lambda **kw: get_correlation_insights(),
-    "get_trend_insights": lambda **kw: get_trend_insights(),
-    "get_anomaly_summary": lambda **kw: get_anomaly_summary(),
-    "compute_group_aggregation": lambda **kw: compute_group_aggregation(**kw),
-    "get_analysis_results": lambda **kw: get_analysis_results(),
+    "get_data_summary": lambda ctx, **kw: get_data_summary(ctx),
+    "get_column_statistics": lambda ctx, **kw: get_column_statistics(ctx, **kw),
+    "query_data": lambda ctx, **kw: query_data(ctx, **kw),
+    "get_correlation_insights": lambda ctx, **kw: get_correlation_insights(ctx),
+    "get_trend_insights": lambda ctx, **kw: get_trend_insights(ctx),
+    "get_anomaly_summary": lambda ctx, **kw: get_anomaly_summary(ctx),
+    "compute_group_aggregation": lambda ctx, **kw: compute_group_aggregation(ctx, **kw),
+    "get_analysis_results": lambda ctx, **kw: get_analysis_results(ctx),
 }
 
 
-def _execute_tool(name: str, args: dict) -> str:
-    """Execute a tool by name with given arguments."""
+# Row-returning tools are capped before their output goes back to Gemini —
+# every function_response is re-sent as input tokens on each later round.
+_TOOL_RESULT_MAX_CHARS = 4096
+_TRUNCATED_TOOLS = {"query_data", "compute_group_aggregation"}
+
+
+def _truncate_tool_result(result: str) -> str:
+    """Keep whole leading lines of result up to _TOOL_RESULT_MAX_CHARS."""
+    if len(result) <= _TOOL_RESULT_MAX_CHARS:
+        return result
+    lines = result.split("\n")
+    kept, size = [], 0
+    for line in lines:
+        size += len(line) + 1
+        if size > _TOOL_RESULT_MAX_CHARS:
+            break
+        kept.append(line)
+    kept.append(f"... ({len(lines) - len(kept)} more lines omitted; total={len(lines)})")
+    return "\n".join(kept)
+
+
+def _execute_tool(name: str, args: dict, ctx: ToolContext) -> str:
+    """Execute a tool by name against ctx's data, memoized per ctx.file_id.
+
+    The result is computed from ctx alone, so the cache key (file_id, name,
+    args) fully determines the value stored under it.
+    """
     fn = _TOOL_MAP.get(name)
     if fn is None:
         return f"Unknown tool: {name}"
+
+    file_id = ctx.file_id
+    key = (file_id, name, tuple(sorted((k, str(v)) for k, v in args.items())))
+    with _tool_cache_lock:
+        cached = _tool_result_cache.get(key)
+    if cached is not None:
+        return cached
+
     try:
-        return fn(**args)
+        result = fn(ctx, **args)
     except Exception as e:
         return f"Tool {name} error: {e}"
+    if name in _TRUNCATED_TOOLS and isinstance(result, str):
+        result = _truncate_tool_result(result)
+
+    if file_id is not None:
+        with _tool_cache_lock:
+            _tool_result_cache[key] = result
+    return result
+
+
+# ── History compaction ───────────────────────────────────────
+# Every round resends the whole conversation, so old tool output is paid
+# for again and again. Results from earlier rounds beyond the most recent
+# few are shortened to a one-line header in the copy sent to Gemini; the
+# canonical `contents` list is never modified.
+_KEEP_FULL_TOOL_RESULTS = 3
+
+
+def _summarize_tool_result(name: str, text: str) -> str:
+    lines = text.strip().splitlines() or [""]
+    return f"[{name}] OK ({len(text)} chars) | {lines[0]} → {lines[-1]}"
+
+
+def _compact_history(contents: list) -> list:
+    """Return contents with stale function responses replaced by one-line summaries."""
+    positions = [
+        (i, j)
+        for i, c in enumerate(contents[:-1])  # the latest turn is always sent in full
+        for j, p in enumerate(c.parts or [])
+        if p.function_response
+    ]
+    latest = sum(1 for p in (contents[-1].parts or []) if p.function_response)
+    stale = set(positions[:max(0, len(positions) - max(0, _KEEP_FULL_TOOL_RESULTS - latest))])
+    if not stale:
+        return contents
+
+    compacted = []
+    for i, c in enumerate(contents):
+        if not any((i, j) in stale for j in range(len(c.parts or []))):
+            compacted.append(c)
+            continue
+        parts = []
+        for j, p in enumerate(c.parts):
+            if (i, j) in stale:
+                fr = p.function_response
+                text = str((fr.response or {}).get("result", ""))
+                p = genai_types.Part.from_function_response(
+                    name=fr.name,
+                    response={"result": _summarize_tool_result(fr.name, text)},
+                )
+            parts.append(p)
+        compacted.append(genai_types.Content(role=c.role, parts=parts))
+    return compacted
 
 
 # ── Main agent query function ────────────────────────────────
-async def run_agent_query(
+async def stream_agent_query(
     df,
     analysis_results: dict,
     anomaly_results: dict,
     file_id: str,
     question: str,
     session_id: str = None,
-) -> dict:
+) -> AsyncIterator[dict]:
     """
-    Run a user question through Gemini with function calling.
-    Flow: cache → cooldown → preflight → multi-turn tool loop → local fallback.
+    Run a user question through Gemini with function calling, streaming events:
+      {"delta": "..."}   — answer text as the model produces it
+      {"result": {...}}  — the final result dict (always the last event)
+    Flow: cache (exact, then semantic) → fast path → cooldown → multi-turn tool loop → local fallback.
+
+    result["answer"] is authoritative. It normally equals the concatenated
+    deltas, but when a quota error or exception hands over to the local
+    fallback mid-stream, clients must replace their delta buffer with it.
     """
-    # 1. Cache check
+    # This request's data for the tools and the local fallback, bound before
+    # the first await — passed explicitly, never via a module global, so a
+    # concurrent chat on another file can't swap it mid-request
+    tool_ctx = make_tool_context(df, analysis_results, file_id)
+
+    # 1. Cache check — exact match first, then semantic (paraphrase) match
     cache_key = _chat_cache_key(file_id, question)
-    if cache_key in _chat_cache:
-        return _chat_cache[cache_key]
+    cached = _chat_cache.get(cache_key)
+    if cached is not None:
+        yield {"result": cached}
+        return
+
+    q_emb = await asyncio.to_thread(_embed_question, question)
+    similar = _semantic_lookup(file_id, q_emb)
+    if similar is not None:
+        _store_result(cache_key, file_id, None, similar)
+        yield {"result": similar}
+        return
+
+    # Fast path — the local fallback fully covers short, generic questions
+    if settings.AGENT_FAST_PATH and _is_fast_path_question(question, tool_ctx.columns):
+        result = _local_chat_fallback(tool_ctx, anomaly_results, question)
+        result["source"] = "local_fast_path"
+        _store_result(cache_key, file_id, q_emb, result)
+        yield {"result": result}
+        return
 
     # 2. Cooldown check
     if not _is_api_available():
-        result = _local_chat_fallback(df, analysis_results, anomaly_results, question)
-        _chat_cache[cache_key] = result
-        return result
+        result = _local_chat_fallback(tool_ctx, anomaly_results, question)
+        _store_result(cache_key, file_id, q_emb, result)
+        yield {"result": result}
+        return
 
     try:
-        # Set the data context for tools
-        set_context(df, analysis_results, file_id)
-
-        # Create genai client
-        api_key = _get_api_key()
-        print(f"[Agent] Using API key: {api_key[:10]}... model: {settings.GEMINI_MODEL}")
-        client = genai.Client(api_key=api_key)
+        # Reuse the shared genai client
+        client = await _get_client()
+        logger.debug("Using API key: %s... model: %s", _client_api_key[:10], settings.GEMINI_MODEL)
 
         # Build initial contents
         contents = [
@@ -226,54 +665,64 @@ async def run_agent_query(
         ]
 
         tool_calls_log = []
+        streamed = []  # every delta sent so far, across all rounds
         max_rounds = 6
 
         for _round in range(max_rounds):
-            response = client.models.generate_content(
-                model=settings.GEMINI_MODEL,
-                contents=contents,
-                config=genai_types.GenerateContentConfig(
-                    system_instruction=SYSTEM_PROMPT,
-                    tools=[TOOL_DECLARATIONS],
-                    temperature=0.2,
-                ),
-            )
-
-            # Check for function calls in the response
-            part = response.candidates[0].content.parts[0]
-
-            if part.function_call:
-                fc = part.function_call
-                fn_name = fc.name
-                fn_args = dict(fc.args) if fc.args else {}
-                print(f"[Agent] Tool call: {fn_name}({fn_args})")
-
-                tool_calls_log.append({"tool": fn_name, "args": fn_args})
-
-                # Execute the tool
-                tool_result = _execute_tool(fn_name, fn_args)
-
-                # Append assistant's function_call and our function_response
-                contents.append(response.candidates[0].content)
+            # Stream every round: text parts go straight to the caller, and
+            # function calls (which arrive whole) are collected for the tools.
+            parts = []
+            async for chunk in await _generate_stream(client, _compact_history(contents)):
+                if not chunk.candidates or not chunk.candidates[0].content:
+                    continue
+                for p in chunk.candidates[0].content.parts or []:
+                    parts.append(p)
+                    if p.text:
+                        streamed.append(p.text)
+                        yield {"delta": p.text}
+
+            # Gemini may return several independent function calls in one turn
+            calls = [p.function_call for p in parts if p.function_call]
+
+            if calls:
+                call_args = [dict(fc.args) if fc.args else {} for fc in calls]
+                for fc, fn_args in zip(calls, call_args):
+                    logger.debug("Tool call: %s(%s)", fc.name, fn_args)
+                    tool_calls_log.append({"tool": fc.name, "args": fn_args})
+
+                # Tools only read this request's tool_ctx, so run them concurrently
+                tool_results = await asyncio.gather(*[
+                    asyncio.to_thread(_execute_tool, fc.name, fn_args, tool_ctx)
+                    for fc, fn_args in zip(calls, call_args)
+                ])
+
+                # Append assistant's function_calls and all our function_responses
+                contents.append(genai_types.Content(role="model", parts=parts))
                 contents.append(
                     genai_types.Content(
                         role="user",
-                        parts=[genai_types.Part.from_function_response(
-                            name=fn_name,
-                            response={"result": tool_result},
-                        )],
+                        parts=[
+                            genai_types.Part.from_function_response(
+                                name=fc.name,
+                                response={"result": tool_result},
+                            )
+                            for fc, tool_result in zip(calls, tool_results)
+                        ],
                     )
                 )
                 # Continue loop for next round
             else:
-                # Text response — we're done
-                answer = part.text or "I could not generate a response."
+                # Text response — we're done. The answer includes any preamble
+                # text streamed alongside earlier tool calls, so it matches
+                # what the client has already rendered.
+                answer = "".join(streamed) or "I could not generate a response."
 
                 if "RESOURCE_EXHAUSTED" in answer or "429" in answer:
                     _set_api_cooldown()
-                    result = _local_chat_fallback(df, analysis_results, anomaly_results, question)
-                    _chat_cache[cache_key] = result
-                    return result
+                    result = _local_chat_fallback(tool_ctx, anomaly_results, question)
+                    _store_result(cache_key, file_id, q_emb, result)
+                    yield {"result": result}
+                    return
 
                 result = {
                     "answer": answer,
@@ -281,170 +730,260 @@ async def run_agent_query(
                     "session_id": session_id or "direct",
                     "error": False,
                 }
-                _chat_cache[cache_key] = result
-                return result
+                _store_result(cache_key, file_id, q_emb, result)
+                yield {"result": result}
+                return
 
         # If we exhausted rounds, collect whatever text we have
-        answer = "I analyzed the data using multiple tools. Here's what I found based on the analysis."
+        answer = "".join(streamed) or (
+            "I analyzed the data using multiple tools. Here's what I found based on the analysis."
+        )
         result = {
             "answer": answer,
             "tool_calls": tool_calls_log,
             "session_id": session_id or "direct",
             "error": False,
         }
-        _chat_cache[cache_key] = result
-        return result
+        _store_result(cache_key, file_id, q_emb, result)
+        yield {"result": result}
 
     except Exception as e:
         err_str = str(e)
-        traceback.print_exc()
+        logger.exception("Agent query failed")
         _set_api_cooldown()
 
         try:
-            result = _local_chat_fallback(df, analysis_results, anomaly_results, question)
-            _chat_cache[cache_key] = result
-            return result
+            result = _local_chat_fallback(tool_ctx, anomaly_results, question)
+            _store_result(cache_key, file_id, q_emb, result)
         except Exception as fallback_err:
-            print(f"[Agent] Local fallback also failed: {fallback_err}")
-            return {
+            logger.error("Local fallback also failed: %s", fallback_err)
+            result = {
                 "answer": f"Agent error: {err_str}",
                 "tool_calls": [],
                 "error": True,
             }
+        yield {"result": result}
+
+
+async def run_agent_query(
+    df,
+    analysis_results: dict,
+    anomaly_results: dict,
+    file_id: str,
+    question: str,
+    session_id: str = None,
+) -> dict:
+    """Run a user question through the agent and return only the final result."""
+    result = None
+    async for event in stream_agent_query(
+        df, analysis_results, anomaly_results, file_id, question, session_id
+    ):
+        if "result" in event:
+            result = event["result"]
+    return result
 
 
 # ══════════════════════════════════════════════════════════════
 #  LOCAL CHAT FALLBACK — answers from data, zero API calls
 # ══════════════════════════════════════════════════════════════
 
-def _local_chat_fallback(df, analysis: dict, anomalies: dict, question: str) -> dict:
-    """Answer common questions using only the cached analysis data."""
-    import pandas as pd
+# One compiled pattern classifies the question in a single scan. Each named
+# group is a bucket; when several buckets match, _BUCKET_PRIORITY decides
+# (same precedence as the original keyword checks).
+_BUCKET_RE = re.compile(
+    r"(?P<summary>summary|overview|describe|about|insight|key)"
+    r"|(?P<anomaly>anomal|outlier|unusual|weird)"
+    r"|(?P<trend>trend|time|over time|increas|decreas)"
+    r"|(?P<corr>correlat|relationship|related)"
+    r"|(?P<dist>distribution|spread|skew|normal)"
+    r"|(?P<top>top|best|highest|most|largest)",
+    re.IGNORECASE,
+)
+_BUCKET_PRIORITY = ("summary", "anomaly", "trend", "corr", "dist", "top")
+
+
+def _classify_question(q: str) -> str | None:
+    """Return the highest-priority keyword bucket found in the question, or None."""
+    found = {m.lastgroup for m in _BUCKET_RE.finditer(q)}
+    return next((b for b in _BUCKET_PRIORITY if b in found), None)
+
 
+_FAST_PATH_BUCKETS = {"summary", "anomaly", "trend", "corr", "dist"}
+_FAST_PATH_MAX_TOKENS = 12
+
+
+def _is_fast_path_question(question: str, cols: dict) -> bool:
+    """True for short keyword questions that don't mention any specific column.
+
+    The fast-path answers are dataset-wide, so any column named in the
+    question (matched like the fallback handlers do, spaces and punctuation
+    included) sends it to the model instead.
+    """
     q = question.lower().strip()
+    if len(re.findall(r"\w+", q)) > _FAST_PATH_MAX_TOKENS:
+        return False
+    if _mentioned_columns(q, cols):
+        return False
+    return _classify_question(q) in _FAST_PATH_BUCKETS
+
+
+def _mentioned_columns(q: str, cols: dict) -> list:
+    """Columns whose lowercase name appears in q, longest name first.
+
+    Substring (not token) matching, so names with spaces or punctuation
+    ("unit price", "sales-2024") still match, and "unit price" wins over "price".
+    """
+    return [col for name, col in cols["by_length"] if name and name in q]
+
+
+# Each handler writes its answer lines (newline-terminated) through `w`,
+# the bound write() of the StringIO buffer owned by _local_chat_fallback.
+
+def _answer_summary(df, analysis: dict, anomalies: dict, q: str, cols: dict, w) -> None:
     summary = analysis.get("summary", {})
-    stats = analysis.get("descriptive_stats", {})
     corrs = analysis.get("strong_correlations", [])
-    trends = analysis.get("trends", {})
     anomaly_summary = (anomalies or {}).get("summary", {})
+    w("**Dataset Overview:**\n")
+    w(f"- **{summary.get('total_rows', '?')} rows** x **{summary.get('total_columns', '?')} columns**\n")
+    w(f"- {summary.get('numeric_columns', 0)} numeric, {summary.get('categorical_columns', 0)} categorical, {summary.get('datetime_columns', 0)} datetime\n")
+    quality = summary.get("data_quality_score")
+    if quality:
+        w(f"- Data quality score: **{quality}%**\n")
+    if corrs:
+        w(f"- {len(corrs)} strong correlations found\n")
+    total_anom = anomaly_summary.get("total_anomalous_values", 0)
+    if total_anom:
+        w(f"- {total_anom} anomalies detected\n")
+
+
+def _answer_anomaly(df, analysis: dict, anomalies: dict, q: str, cols: dict, w) -> None:
+    total = (anomalies or {}).get("summary", {}).get("total_anomalous_values", 0)
+    w(f"**Anomaly Report:** {total} anomalous values detected.\n")
+    per_col = (anomalies or {}).get("per_column", {})
+    for col, data in list(per_col.items())[:6]:
+        z = data.get("z_score", {}).get("count", 0)
+        iqr = data.get("iqr", {}).get("count", 0)
+        if z + iqr > 0:
+            w(f"- **{col}**: {z} Z-score outliers, {iqr} IQR outliers\n")
+
+
+def _answer_trend(df, analysis: dict, anomalies: dict, q: str, cols: dict, w) -> None:
+    trends = analysis.get("trends", {})
+    w("**Trend Analysis:**\n")
+    if trends:
+        for col, t in list(trends.items())[:6]:
+            if isinstance(t, dict):
+                w(f"- **{col}**: {t.get('direction', '?')} ({t.get('strength', '')})\n")
+            else:
+                w(f"- **{col}**: {t}\n")
+    else:
+        w("No significant trends detected in the data.\n")
 
-    answer_lines = []
 
-    if any(w in q for w in ["summary", "overview", "describe", "about", "insight", "key"]):
-        answer_lines.append("**Dataset Overview:**")
-        answer_lines.append(f"- **{summary.get('total_rows', '?')} rows** x **{summary.get('total_columns', '?')} columns**")
-        answer_lines.append(f"- {summary.get('numeric_columns', 0)} numeric, {summary.get('categorical_columns', 0)} categorical, {summary.get('datetime_columns', 0)} datetime")
-        quality = summary.get("data_quality_score")
-        if quality:
-            answer_lines.append(f"- Data quality score: **{quality}%**")
-        if corrs:
-            answer_lines.append(f"- {len(corrs)} strong correlations found")
-        total_anom = anomaly_summary.get("total_anomalous_values", 0)
-        if total_anom:
-            answer_lines.append(f"- {total_anom} anomalies detected")
-
-    elif any(w in q for w in ["anomal", "outlier", "unusual", "weird"]):
-        total = anomaly_summary.get("total_anomalous_values", 0)
-        answer_lines.append(f"**Anomaly Report:** {total} anomalous values detected.")
-        per_col = (anomalies or {}).get("per_column", {})
-        for col, data in list(per_col.items())[:6]:
-            z = data.get("z_score", {}).get("count", 0)
-            iqr = data.get("iqr", {}).get("count", 0)
-            if z + iqr > 0:
-                answer_lines.append(f"- **{col}**: {z} Z-score outliers, {iqr} IQR outliers")
-
-    elif any(w in q for w in ["trend", "time", "over time", "increas", "decreas"]):
-        answer_lines.append("**Trend Analysis:**")
-        if trends:
-            for col, t in list(trends.items())[:6]:
-                if isinstance(t, dict):
-                    answer_lines.append(f"- **{col}**: {t.get('direction', '?')} ({t.get('strength', '')})")
-                else:
-                    answer_lines.append(f"- **{col}**: {t}")
-        else:
-            answer_lines.append("No significant trends detected in the data.")
+def _answer_corr(df, analysis: dict, anomalies: dict, q: str, cols: dict, w) -> None:
+    corrs = analysis.get("strong_correlations", [])
+    w("**Strong Correlations:**\n")
+    if corrs:
+        for c in corrs[:6]:
+            w(
+                f"- **{c.get('col_a')}** & **{c.get('col_b')}**: "
+                f"r = {c.get('correlation', '?')} ({c.get('strength', '')}, {c.get('direction', '')})\n"
+            )
+    else:
+        w("No strong correlations found (|r| > 0.7).\n")
 
-    elif any(w in q for w in ["correlat", "relationship", "related"]):
-        answer_lines.append("**Strong Correlations:**")
-        if corrs:
-            for c in corrs[:6]:
-                answer_lines.append(
-                    f"- **{c.get('col_a')}** & **{c.get('col_b')}**: "
-                    f"r = {c.get('correlation', '?')} ({c.get('strength', '')}, {c.get('direction', '')})"
-                )
+
+def _answer_dist(df, analysis: dict, anomalies: dict, q: str, cols: dict, w) -> None:
+    dists = analysis.get("distributions", {})
+    w("**Distribution Analysis:**\n")
+    for col, d in list(dists.items())[:6]:
+        if isinstance(d, dict):
+            w(
+                f"- **{col}**: {d.get('shape', '?')} (skew={d.get('skewness', '?')}, "
+                f"normal={'Yes' if d.get('is_normal') else 'No'})\n"
+            )
+
+
+def _answer_top(df, analysis: dict, anomalies: dict, q: str, cols: dict, w) -> None:
+    numeric_cols, cat_cols = cols["numeric"], cols["cat"]
+    mentioned = _mentioned_columns(q, cols)
+
+    target_col = next((c for c in mentioned if c in numeric_cols), None)
+    if target_col is None and numeric_cols:
+        target_col = numeric_cols[0]
+
+    if target_col:
+        if cat_cols:
+            group_col = next((c for c in mentioned if c in cat_cols), cat_cols[0])
+            top = df.groupby(group_col, sort=False, observed=True)[target_col].sum().nlargest(5)
+            w(f"**Top {group_col} by {target_col}:**\n")
+            for name, val in top.items():
+                w(f"- **{name}**: {val:,.2f}\n")
         else:
-            answer_lines.append("No strong correlations found (|r| > 0.7).")
-
-    elif any(w in q for w in ["distribution", "spread", "skew", "normal"]):
-        dists = analysis.get("distributions", {})
-        answer_lines.append("**Distribution Analysis:**")
-        for col, d in list(dists.items())[:6]:
-            if isinstance(d, dict):
-                answer_lines.append(
-                    f"- **{col}**: {d.get('shape', '?')} (skew={d.get('skewness', '?')}, "
-                    f"normal={'Yes' if d.get('is_normal') else 'No'})"
-                )
+            w(f"**Top values in {target_col}:**\n")
+            top = df[target_col].nlargest(5)
+            for idx, val in top.items():
+                w(f"- Row {idx}: {val:,.2f}\n")
 
-    elif any(w in q for w in ["top", "best", "highest", "most", "largest"]):
-        target_col = None
-        for col in df.select_dtypes(include=["number"]).columns:
-            if col.lower() in q:
-                target_col = col
-                break
-        if target_col is None and len(df.select_dtypes(include=["number"]).columns) > 0:
-            target_col = df.select_dtypes(include=["number"]).columns[0]
-
-        if target_col:
-            cat_cols = df.select_dtypes(include=["object", "category"]).columns.tolist()
-            if cat_cols:
-                group_col = cat_cols[0]
-                for c in cat_cols:
-                    if c.lower() in q:
-                        group_col = c
-                        break
-                top = df.groupby(group_col)[target_col].sum().sort_values(ascending=False).head(5)
-                answer_lines.append(f"**Top {group_col} by {target_col}:**")
-                for name, val in top.items():
-                    answer_lines.append(f"- **{name}**: {val:,.2f}")
-            else:
-                answer_lines.append(f"**Top values in {target_col}:**")
-                top = df[target_col].nlargest(5)
-                for idx, val in top.items():
-                    answer_lines.append(f"- Row {idx}: {val:,.2f}")
 
+def _answer_default(df, analysis: dict, anomalies: dict, q: str, cols: dict, w) -> None:
+    summary = analysis.get("summary", {})
+    stats = analysis.get("descriptive_stats", {})
+    corrs = analysis.get("strong_correlations", [])
+
+    matched_col = next(iter(_mentioned_columns(q, cols)), None)
+
+    if matched_col and matched_col in stats:
+        s = stats[matched_col]
+        mean, std, lo, hi, median = _fmt_batch(
+            [s.get("mean"), s.get("std"), s.get("min"), s.get("max"), s.get("median")]
+        )
+        w(f"**Statistics for {matched_col}:**\n")
+        w(f"- Mean: {mean}\n")
+        w(f"- Std: {std}\n")
+        w(f"- Min: {lo} / Max: {hi}\n")
+        w(f"- Median: {median}\n")
     else:
-        matched_col = None
-        for col in df.columns:
-            if col.lower() in q:
-                matched_col = col
-                break
-
-        if matched_col and matched_col in stats:
-            s = stats[matched_col]
-            answer_lines.append(f"**Statistics for {matched_col}:**")
-            answer_lines.append(f"- Mean: {_fmt(s.get('mean'))}")
-            answer_lines.append(f"- Std: {_fmt(s.get('std'))}")
-            answer_lines.append(f"- Min: {_fmt(s.get('min'))} / Max: {_fmt(s.get('max'))}")
-            answer_lines.append(f"- Median: {_fmt(s.get('median'))}")
-        else:
-            answer_lines.append("Here's a quick overview of the dataset:")
-            answer_lines.append(f"- **{summary.get('total_rows', '?')} rows**, **{summary.get('total_columns', '?')} columns**")
-            answer_lines.append(f"- Columns: {', '.join(df.columns.tolist()[:10])}")
-            if corrs:
-                answer_lines.append(f"- {len(corrs)} strong correlations found")
-            answer_lines.append("\nTry asking about specific columns, trends, anomalies, or correlations!")
+        w("Here's a quick overview of the dataset:\n")
+        w(f"- **{summary.get('total_rows', '?')} rows**, **{summary.get('total_columns', '?')} columns**\n")
+        w(f"- Columns: {', '.join(df.columns.tolist()[:10])}\n")
+        if corrs:
+            w(f"- {len(corrs)} strong correlations found\n")
+        w("\nTry asking about specific columns, trends, anomalies, or correlations!\n")
+
+
+_FALLBACK_HANDLERS = {
+    "summary": _answer_summary,
+    "anomaly": _answer_anomaly,
+    "trend": _answer_trend,
+    "corr": _answer_corr,
+    "dist": _answer_dist,
+    "top": _answer_top,
+}
+
+
+def _local_chat_fallback(ctx: ToolContext, anomalies: dict, question: str) -> dict:
+    """Answer common questions using only the request's data and cached analysis."""
+    q = question.lower().strip()
+    handler = _FALLBACK_HANDLERS.get(_classify_question(q), _answer_default)
+    buf = io.StringIO()
+    handler(ctx.df, ctx.analysis, anomalies, q, ctx.columns, buf.write)
 
     return {
-        "answer": "\n".join(answer_lines),
+        "answer": buf.getvalue().rstrip("\n"),
         "tool_calls": [{"tool": "local_fallback", "args": {"reason": "API quota optimization"}}],
         "error": False,
         "source": "local_fallback",
     }
 
 
-def _fmt(v) -> str:
-    if v is None:
-        return "N/A"
-    if isinstance(v, float):
-        return f"{v:,.4f}" if abs(v) < 1000 else f"{v:,.0f}"
-    return str(v)
+def _fmt_batch(values: list) -> list[str]:
+    """Format several stat values at once (None → N/A, floats by magnitude)."""
+    out = ["N/A" if v is None else str(v) for v in values]
+    float_idx = [i for i, v in enumerate(values) if isinstance(v, float)]
+    if float_idx:
+        arr = np.asarray([values[i] for i in float_idx], dtype=float)
+        specs = np.where(np.abs(arr) < 1000, "{:,.4f}", "{:,.0f}")
+        for i, spec, v in zip(float_idx, specs, arr.tolist()):
+            out[i] = spec.format(v)
+    return out
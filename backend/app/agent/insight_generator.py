@@ -3,62 +3,219 @@ insight_generator.py - Optimized Gemini-Powered Insight Generation
 
 Optimizations applied:
   1. Response caching — same data = same insight, no repeat API calls
+     (keyed on the exact compacted prompt inputs, plus an opt-in semantic
+     cache that reuses reports for near-identical analyses of the same file)
   2. Token-compressed prompts — only send essential stats (~60% fewer tokens)
   3. Rate limiting with exponential backoff + jitter
   4. Local fallback — generates basic insights without API when quota is exhausted
+  5. Shared client — one genai.Client (and its connection pool) reused across calls
+  6. Streaming — stream_insights yields each report section as soon as it is complete
+  7. Structured output — Gemini fills an InsightReport JSON schema directly,
+     so no section labels are generated and no Markdown parsing is needed
+  8. Batching — generate_insights_batch writes several reports in one call
 """
 
 import os
 import json
 import asyncio
 import hashlib
+import io
+import logging
 import random
-import traceback
-from typing import Optional
+from operator import itemgetter
+import re
+import threading
+import time
+from typing import AsyncIterator, Optional
 
+import numpy as np
+import orjson
+from cachetools import LRUCache, TTLCache
 from google import genai
 from google.genai import types as genai_types
+from pydantic import BaseModel, Field, ValidationError
 
 from ..config import settings
+from .prompts import compress_prompt
+
+logger = logging.getLogger(__name__)
 
 MAX_RETRIES = 2          # reduced from 3 to fail faster
-RETRY_DELAYS = [5, 15]   # shorter delays
+BACKOFF_BASE = 2         # seconds; delay = base * 2**attempt + jitter
+MAX_CONCURRENT_CALLS = 8  # in-flight generate_content calls per process
+
+# Caps concurrent Gemini calls so a burst of requests queues here instead
+# of tripping the per-minute quota all at once.
+_gemini_semaphore = asyncio.Semaphore(MAX_CONCURRENT_CALLS)
+
+
+def _backoff_delay(attempt: int) -> float:
+    """Exponential backoff with full-base jitter so concurrent retries spread out."""
+    return BACKOFF_BASE * (2 ** attempt) + random.uniform(0, BACKOFF_BASE)
 
 # ── In-memory cache ──────────────────────────────────────────
-_insight_cache: dict[str, dict] = {}
+# Bounded + expiring: each entry holds a full markdown report plus its
+# parsed sections, so an unbounded dict would grow for the server's lifetime.
+_insight_cache: TTLCache = TTLCache(maxsize=1024, ttl=3600)
 
 # ── Quota cooldown ───────────────────────────────────────────
-import time
-_api_cooldown_until: float = 0
 _API_COOLDOWN_SECS = 300  # 5 minutes
 
 
+class _Cooldown:
+    """Deadline before which the API should not be called, safe to share across threads."""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self._until = 0.0
+        self._lock = threading.Lock()
+
+    def active(self) -> bool:
+        with self._lock:
+            return time.time() <= self._until
+
+    def start(self):
+        with self._lock:
+            self._until = time.time() + self.seconds
+
+
+_api_cooldown = _Cooldown(_API_COOLDOWN_SECS)
+
+
 def _is_api_available() -> bool:
-    return time.time() > _api_cooldown_until
+    return not _api_cooldown.active()
 
 
 def _set_api_cooldown():
-    global _api_cooldown_until
-    _api_cooldown_until = time.time() + _API_COOLDOWN_SECS
-    print(f"[InsightGen] API cooldown set for {_API_COOLDOWN_SECS}s.")
+    _api_cooldown.start()
+    logger.info("API cooldown set for %ss.", _API_COOLDOWN_SECS)
+
+
+def _cache_key(prompt_inputs: dict) -> str:
+    """Hash the compacted prompt inputs so only identical analyses share a cached insight."""
+    sig = orjson.dumps(prompt_inputs, option=orjson.OPT_SORT_KEYS)
+    return hashlib.blake2b(sig, digest_size=16).hexdigest()
+
+
+# ── Shared Gemini client ─────────────────────────────────────
+# Building a client per call redoes TLS setup and config parsing; keep one
+# and rebuild only when the API key changes (e.g. after a key rotation).
+_CLIENT_TIMEOUT_MS = 60_000
+_client: genai.Client | None = None
+_client_api_key: str = ""
+_client_lock = asyncio.Lock()
 
 
-def _cache_key(analysis: dict, anomalies: dict, forecasts: list) -> str:
-    """Generate a hash key from analysis inputs so identical data reuses cached insights."""
-    summary = analysis.get("summary", {})
-    sig = json.dumps({
-        "rows": summary.get("total_rows"),
-        "cols": summary.get("total_columns"),
-        "corr_count": len(analysis.get("strong_correlations", [])),
-        "anomaly_count": (anomalies or {}).get("summary", {}).get("total_anomalous_values", 0),
-        "forecast_count": len(forecasts) if isinstance(forecasts, list) else 0,
-    }, sort_keys=True)
-    return hashlib.md5(sig.encode()).hexdigest()
+async def _get_client(api_key: str) -> genai.Client:
+    """Return the shared Gemini client for api_key."""
+    global _client, _client_api_key
+    async with _client_lock:
+        if _client is None or api_key != _client_api_key:
+            _client = genai.Client(
+                api_key=api_key,
+                http_options=genai_types.HttpOptions(timeout=_CLIENT_TIMEOUT_MS),
+            )
+            _client_api_key = api_key
+    return _client
+
+
+# ── Semantic cache ───────────────────────────────────────────
+# Normalized embeddings of previous prompts (N x D) + their results and the
+# file each came from, so a near-identical re-analysis of the same file
+# reuses a report instead of a new generation. Lookups never cross files:
+# two datasets with the same schema would otherwise get each other's numbers.
+_SEMANTIC_MAX_ENTRIES = 512
+_semantic_vectors: np.ndarray | None = None
+_semantic_results: list[dict] = []
+_semantic_files: list[str] = []
+
+
+async def _embed_prompt(client: genai.Client, prompt: str, file_id: str | None) -> np.ndarray | None:
+    """Embed the prompt with Gemini; None if disabled, unscoped, or the call fails."""
+    if not settings.INSIGHT_SEMANTIC_CACHE or file_id is None:
+        return None
+    try:
+        response = await client.aio.models.embed_content(
+            model=settings.INSIGHT_EMBED_MODEL,
+            contents=prompt,
+        )
+        emb = np.asarray(response.embeddings[0].values, dtype=np.float32)
+        norm = np.linalg.norm(emb)
+        return emb / norm if norm else None
+    except Exception as e:
+        logger.warning("Embedding failed, skipping semantic cache: %s", e)
+        return None
+
+
+def _semantic_lookup(file_id: str | None, emb: np.ndarray | None) -> dict | None:
+    """Return the cached result of file_id's most similar previous prompt, if close enough."""
+    if emb is None or _semantic_vectors is None or _semantic_vectors.shape[1] != emb.shape[0]:
+        return None
+    idx = [i for i, f in enumerate(_semantic_files) if f == file_id]
+    if not idx:
+        return None
+    sims = _semantic_vectors[idx] @ emb
+    best = int(np.argmax(sims))
+    if sims[best] >= settings.INSIGHT_SEMANTIC_THRESHOLD:
+        return _semantic_results[idx[best]]
+    return None
+
+
+def _semantic_store(file_id: str | None, emb: np.ndarray | None, result: dict):
+    """Remember a generated result under its file and prompt embedding, dropping the oldest past the cap."""
+    global _semantic_vectors, _semantic_results, _semantic_files
+    if emb is None or file_id is None:
+        return
+    if _semantic_vectors is None or _semantic_vectors.shape[1] != emb.shape[0]:
+        _semantic_vectors, _semantic_results, _semantic_files = emb[None, :], [result], [file_id]
+        return
+    keep = _SEMANTIC_MAX_ENTRIES - 1
+    _semantic_vectors = np.vstack([_semantic_vectors[-keep:], emb])
+    _semantic_results = _semantic_results[-keep:] + [result]
+    _semantic_files = _semantic_files[-keep:] + [file_id]
+
+
+def save_insight_cache(path: str | None = None):
+    """Persist the insight caches to a JSON file (called on app shutdown)."""
+    path = path or settings.INSIGHT_CACHE_FILE
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        payload = {
+            "exact": dict(_insight_cache),
+            "semantic": {
+                "embeddings": _semantic_vectors.tolist() if _semantic_vectors is not None else [],
+                "results": _semantic_results,
+                "file_ids": _semantic_files,
+            },
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, default=str)
+    except Exception as e:
+        logger.warning("Could not save insight cache: %s", e)
+
+
+def load_insight_cache(path: str | None = None):
+    """Restore insight caches saved by save_insight_cache (called on app startup)."""
+    global _semantic_vectors, _semantic_results, _semantic_files
+    path = path or settings.INSIGHT_CACHE_FILE
+    if not os.path.isfile(path):
+        return
+    try:
+        with open(path, encoding="utf-8") as f:
+            payload = json.load(f)
+        _insight_cache.update(payload.get("exact", {}))
+        semantic = payload.get("semantic", {})
+        emb = np.asarray(semantic.get("embeddings", []), dtype=np.float32)
+        files = semantic.get("file_ids", [])  # older files had no scope — dropped
+        if emb.ndim == 2 and len(emb) and len(emb) == len(semantic.get("results", [])) == len(files):
+            _semantic_vectors, _semantic_results, _semantic_files = emb, semantic["results"], files
+    except Exception as e:
+        logger.warning("Could not load insight cache: %s", e)
 
 
 # ── Token-Compressed Prompt ──────────────────────────────────
 
-INSIGHT_PROMPT = """You are a BI Analyst. Analyze this data and produce a Markdown insight report.
+INSIGHT_PROMPT_VERBOSE = """You are a BI Analyst. Analyze this data and produce a Markdown insight report.
 
 ## Dataset
 {overview}
@@ -103,13 +260,102 @@ Unusual values or data quality issues.
 Use bullet points, bold for emphasis, and include specific numbers. Be concise.
 """
 
+INSIGHT_PROMPT = (
+    compress_prompt(INSIGHT_PROMPT_VERBOSE) if settings.PROMPT_COMPRESSION else INSIGHT_PROMPT_VERBOSE
+)
+
+# The template is constant, so its placeholders are located once here:
+# even indices are literal text, odd indices are field names.
+_INSIGHT_PROMPT_PARTS = re.split(r"\{(\w+)\}", INSIGHT_PROMPT)
+
+
+def _render_insight_prompt(fields: dict) -> str:
+    """Fill INSIGHT_PROMPT from its pre-split parts (same result as .format(**fields))."""
+    parts = _INSIGHT_PROMPT_PARTS.copy()
+    for i in range(1, len(parts), 2):
+        parts[i] = fields[parts[i]]
+    return "".join(parts)
+
+
+# ── Preflight budget ─────────────────────────────────────────
+# Estimate prompt size locally (~4 chars per token) and drop the least
+# important sections before sending, rather than finding out from a 400.
+MAX_INPUT_TOKENS = 24_000
+_DROP_PRIORITY = ("distributions", "trends", "forecasts")
+
+
+def _estimate_tokens(s: str) -> int:
+    return len(s) // 4
+
+
+def _build_prompt(fields: dict) -> str:
+    """Render the insight prompt, dropping low-priority sections if it's over budget."""
+    prompt = _render_insight_prompt(fields)
+    if _estimate_tokens(prompt) <= MAX_INPUT_TOKENS:
+        return prompt
+    fields = dict(fields)
+    for name in _DROP_PRIORITY:
+        fields[name] = "Omitted."
+        prompt = _render_insight_prompt(fields)
+        logger.info("Prompt over budget, dropped the %s section.", name)
+        if _estimate_tokens(prompt) <= MAX_INPUT_TOKENS:
+            break
+    return prompt
+
+
+# ── Structured output schema ─────────────────────────────────
+# Field names match the section keys the frontend renders.
+class InsightReport(BaseModel):
+    executive_summary: str = Field(description="2-3 sentences on the most critical findings.")
+    key_findings: str = Field(description="Markdown bullets: top 3-5 discoveries with supporting numbers.")
+    trends_and_patterns: str = Field(description="Markdown bullets: significant trends with direction and magnitude.")
+    anomalies_and_concerns: str = Field(description="Markdown bullets: unusual values or data quality issues.")
+    actionable_recommendations: str = Field(description="Numbered Markdown list: 3-5 specific, ranked recommendations.")
+
+
+_SECTION_TITLES = {
+    "executive_summary": "Executive Summary",
+    "key_findings": "Key Findings",
+    "trends_and_patterns": "Trends & Patterns",
+    "anomalies_and_concerns": "Anomalies & Concerns",
+    "actionable_recommendations": "Actionable Recommendations",
+}
+
+
+def _gen_config() -> genai_types.GenerateContentConfig:
+    if settings.INSIGHT_STRUCTURED_OUTPUT:
+        return genai_types.GenerateContentConfig(
+            temperature=0.2,
+            max_output_tokens=2048,
+            response_mime_type="application/json",
+            response_schema=InsightReport,
+        )
+    return genai_types.GenerateContentConfig(
+        temperature=0.2,
+        max_output_tokens=2048,  # reduced from 4096
+    )
+
+
+def _sections_from_response(text: str) -> tuple[str, dict]:
+    """Return (markdown, sections) from a JSON InsightReport or, failing that, Markdown text."""
+    try:
+        report = InsightReport.model_validate_json(text)
+    except ValidationError:
+        return text, _parse_sections(text)
+    sections = {k: v.strip() for k, v in report.model_dump().items()}
+    markdown = "\n\n".join(f"## {_SECTION_TITLES[k]}\n{v}" for k, v in sections.items())
+    return markdown, sections
+
+
+_ORJSON_DICT_OPTS = orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
 
 def _format_dict_compact(d: dict, max_chars: int = 2000) -> str:
     """Format dict compactly — much smaller than the old 5000-char limit."""
     if not d:
         return "None."
     try:
-        return json.dumps(d, indent=1, default=str)[:max_chars]
+        return orjson.dumps(d, default=str, option=_ORJSON_DICT_OPTS).decode()[:max_chars]
     except Exception:
         return str(d)[:max_chars]
 
@@ -127,14 +373,16 @@ def _format_stats_compact(stats: dict) -> str:
     return "\n".join(lines) if lines else "None."
 
 
+# analyzer.find_correlations always sets these three keys
+_corr_fields = itemgetter("col_a", "col_b", "correlation")
+_corr_line = "{} <-> {}: r={}".format
+
+
 def _format_correlations_compact(corrs: list) -> str:
     """Only top 5 correlations, one line each."""
     if not corrs:
         return "None."
-    lines = []
-    for c in corrs[:5]:
-        lines.append(f"{c.get('col_a')} <-> {c.get('col_b')}: r={c.get('correlation', '?')}")
-    return "\n".join(lines)
+    return "\n".join(_corr_line(*_corr_fields(c)) for c in corrs[:5])
 
 
 def _format_anomalies_compact(anomaly_results: dict) -> str:
@@ -165,133 +413,325 @@ def _format_forecasts_compact(forecast_results: list) -> str:
     return "\n".join(lines) if lines else "None."
 
 
-async def generate_insights(
+# The analysis API hands us the same cached result objects for a given
+# upload, so the formatted strings are memoized per file and object
+# identity. Only the strings are kept — holding the result objects would
+# pin up to 64 full analyses outside the ANALYSIS_CACHE_MB budget — so a
+# file's entries are dropped via invalidate_prompt_inputs whenever its
+# results are replaced (an id could be reused by the new objects).
+# Empty inputs ({} / [] / None) all count as the same.
+_prompt_inputs_cache: LRUCache = LRUCache(maxsize=64)
+
+
+def _ident(obj) -> int | None:
+    return id(obj) if obj else None
+
+
+def invalidate_prompt_inputs(file_id: str):
+    """Forget the memoized prompt inputs for a file (call when its results change)."""
+    for key in [k for k in _prompt_inputs_cache if k[0] == file_id]:
+        _prompt_inputs_cache.pop(key, None)
+
+
+def _prompt_inputs(
+    analysis_results: dict, anomaly_results: dict, forecast_results: list, file_id: str | None = None,
+) -> dict:
+    """The compacted strings that fill INSIGHT_PROMPT (also the cache signature)."""
+    memo_key = None
+    if file_id is not None:
+        memo_key = (file_id, id(analysis_results), _ident(anomaly_results), _ident(forecast_results))
+        hit = _prompt_inputs_cache.get(memo_key)
+        if hit is not None:
+            return hit
+
+    summary = analysis_results.get("summary", {})
+    overview = (
+        f"Rows: {summary.get('total_rows', '?')}, "
+        f"Columns: {summary.get('total_columns', '?')} "
+        f"({summary.get('numeric_columns', 0)} numeric, "
+        f"{summary.get('categorical_columns', 0)} categorical)"
+    )
+    inputs = {
+        "overview": overview,
+        "descriptive_stats": _format_stats_compact(analysis_results.get("descriptive_stats", {})),
+        "correlations": _format_correlations_compact(analysis_results.get("strong_correlations", [])),
+        "distributions": _format_dict_compact(analysis_results.get("distributions", {}), 1500),
+        "trends": _format_dict_compact(analysis_results.get("trends", {}), 1500),
+        "anomalies": _format_anomalies_compact(anomaly_results),
+        "forecasts": _format_forecasts_compact(forecast_results),
+    }
+    if memo_key is not None:
+        _prompt_inputs_cache[memo_key] = inputs
+    return inputs
+
+
+def _resolve_api_key() -> str:
+    """The Gemini API key from settings, the environment or .env ("" if unset)."""
+    api_key = settings.GOOGLE_API_KEY
+    if not api_key or api_key == "your_google_api_key_here":
+        api_key = os.environ.get("GOOGLE_API_KEY", "")
+    if not api_key:
+        try:
+            from dotenv import load_dotenv
+            load_dotenv()
+            api_key = os.environ.get("GOOGLE_API_KEY", "")
+        except Exception:
+            pass
+    if api_key == "your_google_api_key_here":
+        return ""
+    return api_key
+
+
+async def stream_insights(
     analysis_results: dict,
     anomaly_results: Optional[dict] = None,
     forecast_results: Optional[list] = None,
-) -> dict:
+    file_id: Optional[str] = None,
+) -> AsyncIterator[dict]:
     """
-    Generate AI-powered insights. Optimized flow:
-      1. Check cache → return if hit
+    Generate AI-powered insights, streaming events as the report is written:
+      {"section": name, "content": text}  — a report section, once it is complete
+      {"result": {...}}                   — the full result dict (always the last event)
+    Optimized flow:
+      1. Check cache (exact, then semantic within file_id) → return if hit
       2. Try Gemini API with compressed prompt
       3. On quota error → generate local fallback insights (no API needed)
     """
     # ── 1. Cache check ───────────────────────────────────────
-    key = _cache_key(analysis_results, anomaly_results or {}, forecast_results or [])
+    prompt_inputs = _prompt_inputs(analysis_results, anomaly_results or {}, forecast_results or [], file_id)
+    key = _cache_key(prompt_inputs)
     if key in _insight_cache:
-        return _insight_cache[key]
+        yield {"result": _insight_cache[key]}
+        return
 
     # ── 2. Cooldown check — skip API if recently rate-limited ─
     if not _is_api_available():
         result = _generate_local_insights(analysis_results, anomaly_results, forecast_results)
         _insight_cache[key] = result
-        return result
+        yield {"result": result}
+        return
 
     # ── 3. Ensure API key ────────────────────────────────────
-    api_key = settings.GOOGLE_API_KEY
-    if not api_key or api_key == "your_google_api_key_here":
-        api_key = os.environ.get("GOOGLE_API_KEY", "")
+    api_key = _resolve_api_key()
     if not api_key:
-        try:
-            from dotenv import load_dotenv
-            load_dotenv()
-            api_key = os.environ.get("GOOGLE_API_KEY", "")
-        except Exception:
-            pass
-    if not api_key or api_key == "your_google_api_key_here":
         result = _generate_local_insights(analysis_results, anomaly_results, forecast_results)
         _insight_cache[key] = result
-        return result
+        yield {"result": result}
+        return
 
-    print(f"[InsightGen] Using API key: {api_key[:10]}... model: {settings.GEMINI_MODEL}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Using API key: %s... model: %s", api_key[:10], settings.GEMINI_MODEL)
 
+    emitted = 0
     try:
         # Build compact prompt
-        summary = analysis_results.get("summary", {})
-        overview = (
-            f"Rows: {summary.get('total_rows', '?')}, "
-            f"Columns: {summary.get('total_columns', '?')} "
-            f"({summary.get('numeric_columns', 0)} numeric, "
-            f"{summary.get('categorical_columns', 0)} categorical)"
-        )
+        prompt = _build_prompt(prompt_inputs)
+        client = await _get_client(api_key)
 
-        prompt = INSIGHT_PROMPT.format(
-            overview=overview,
-            descriptive_stats=_format_stats_compact(analysis_results.get("descriptive_stats", {})),
-            correlations=_format_correlations_compact(analysis_results.get("strong_correlations", [])),
-            distributions=_format_dict_compact(analysis_results.get("distributions", {}), 1500),
-            trends=_format_dict_compact(analysis_results.get("trends", {}), 1500),
-            anomalies=_format_anomalies_compact(anomaly_results or {}),
-            forecasts=_format_forecasts_compact(forecast_results or []),
-        )
+        # Near-identical analysis already reported on? Reuse it.
+        prompt_emb = await _embed_prompt(client, prompt, file_id)
+        similar = _semantic_lookup(file_id, prompt_emb)
+        if similar is not None:
+            _insight_cache[key] = similar
+            yield {"result": similar}
+            return
 
         # Call Gemini with retry + jitter
-        client = genai.Client(api_key=api_key)
-        last_error = None
-
         for attempt in range(MAX_RETRIES):
+            # Another request hit the quota while we were backing off — don't pile on
+            if attempt and not _is_api_available():
+                result = _generate_local_insights(analysis_results, anomaly_results, forecast_results)
+                _insight_cache[key] = result
+                yield {"result": result}
+                return
+            buf = io.StringIO()
             try:
-                response = await client.aio.models.generate_content(
-                    model=settings.GEMINI_MODEL,
-                    contents=prompt,
-                    config=genai_types.GenerateContentConfig(
-                        temperature=0.2,
-                        max_output_tokens=2048,  # reduced from 4096
-                    ),
-                )
+                async with _gemini_semaphore:
+                    stream = await client.aio.models.generate_content_stream(
+                        model=settings.GEMINI_MODEL,
+                        contents=prompt,
+                        config=_gen_config(),
+                    )
+                    async for chunk in stream:
+                        if not chunk.text:
+                            continue
+                        buf.write(chunk.text)
+                        if settings.INSIGHT_STRUCTURED_OUTPUT:
+                            continue  # partial JSON — sections are emitted once it's complete
+                        # Every section but the last one seen so far is finished
+                        done = list(_parse_sections(buf.getvalue()).items())[:-1]
+                        for name, content in done[emitted:]:
+                            yield {"section": name, "content": content}
+                        emitted = max(emitted, len(done))
                 break
             except Exception as retry_err:
-                last_error = retry_err
                 err_str = str(retry_err)
-                if "429" in err_str or "RESOURCE_EXHAUSTED" in err_str:
+                # Once sections have gone out, a retry would repeat them — give up instead
+                if emitted == 0 and ("429" in err_str or "RESOURCE_EXHAUSTED" in err_str):
                     if attempt < MAX_RETRIES - 1:
-                        delay = RETRY_DELAYS[attempt] + random.uniform(0, 3)
-                        print(f"[InsightGen] Rate limited, retrying in {delay:.1f}s (attempt {attempt+1})")
+                        delay = _backoff_delay(attempt)
+                        logger.info("Rate limited, retrying in %.1fs (attempt %d)", delay, attempt + 1)
                         await asyncio.sleep(delay)
                         continue
                     # All retries exhausted → set cooldown + fall back to local
                     _set_api_cooldown()
-                    print("[InsightGen] Quota exhausted, using local fallback.")
+                    logger.warning("Quota exhausted, using local fallback.")
                     result = _generate_local_insights(analysis_results, anomaly_results, forecast_results)
                     _insight_cache[key] = result
-                    return result
+                    yield {"result": result}
+                    return
                 raise
 
-        insight_text = response.text if response.text else "No insights generated."
-        sections = _parse_sections(insight_text)
+        insight_text, sections = _sections_from_response(buf.getvalue() or "No insights generated.")
+        for name, content in list(sections.items())[emitted:]:
+            yield {"section": name, "content": content}
 
         result = {"insights": insight_text, "sections": sections, "error": None}
         _insight_cache[key] = result
-        return result
+        _semantic_store(file_id, prompt_emb, result)
+        yield {"result": result}
 
     except Exception as e:
-        traceback.print_exc()
         # On any failure, try local fallback
-        print(f"[InsightGen] API failed: {e}. Using local fallback.")
+        logger.exception("API failed: %s. Using local fallback.", e)
         result = _generate_local_insights(analysis_results, anomaly_results, forecast_results)
         _insight_cache[key] = result
-        return result
+        yield {"result": result}
+
+
+async def generate_insights(
+    analysis_results: dict,
+    anomaly_results: Optional[dict] = None,
+    forecast_results: Optional[list] = None,
+    file_id: Optional[str] = None,
+) -> dict:
+    """Generate AI-powered insights and return only the final result dict."""
+    result = None
+    async for event in stream_insights(analysis_results, anomaly_results, forecast_results, file_id):
+        if "result" in event:
+            result = event["result"]
+    return result
+
+
+# ── Batched generation ───────────────────────────────────────
+# Several reports share one generate_content call: the prompts are numbered
+# in one request and the model separates its reports with a sentinel line.
+INSIGHT_BREAK = "---INSIGHT-BREAK---"
+_INSIGHT_BREAK_RE = re.compile(rf"^[ \t]*{re.escape(INSIGHT_BREAK)}[ \t]*$", re.MULTILINE)
+MAX_BATCH_REPORTS = 4  # reports per combined call; larger batches are split
+_BATCH_PROMPT_HEADER = (
+    "Below are {n} independent datasets, each with its own instructions. "
+    "Write one Markdown insight report per dataset, in the same order, and "
+    "put a line containing only " + INSIGHT_BREAK + " between consecutive reports. "
+    "Do not number or title the reports."
+)
+
+
+def _build_batch_prompt(prompts: list[str]) -> str:
+    parts = [_BATCH_PROMPT_HEADER.format(n=len(prompts))]
+    for i, prompt in enumerate(prompts, 1):
+        parts.append(f"=== DATASET {i} of {len(prompts)} ===\n{prompt}")
+    return "\n\n".join(parts)
+
+
+async def _generate_batch_texts(client: genai.Client, prompts: list[str]) -> list[str]:
+    """One combined Gemini call for all prompts, split back into one text per prompt ("" if missing)."""
+    config = genai_types.GenerateContentConfig(
+        temperature=0.2,
+        max_output_tokens=2048 * len(prompts),
+    )
+    for attempt in range(MAX_RETRIES):
+        try:
+            async with _gemini_semaphore:
+                response = await client.aio.models.generate_content(
+                    model=settings.GEMINI_MODEL,
+                    contents=_build_batch_prompt(prompts),
+                    config=config,
+                )
+            break
+        except Exception as retry_err:
+            err_str = str(retry_err)
+            if "429" in err_str or "RESOURCE_EXHAUSTED" in err_str:
+                if attempt < MAX_RETRIES - 1 and _is_api_available():
+                    delay = _backoff_delay(attempt)
+                    logger.info("Rate limited, retrying batch in %.1fs (attempt %d)", delay, attempt + 1)
+                    await asyncio.sleep(delay)
+                    continue
+                _set_api_cooldown()
+            raise
+    texts = [t.strip() for t in _INSIGHT_BREAK_RE.split(response.text or "")]
+    if len(texts) != len(prompts):
+        logger.warning("Batch reply had %d reports for %d prompts.", len(texts), len(prompts))
+    return (texts + [""] * len(prompts))[:len(prompts)]
+
+
+async def generate_insights_batch(items: list[dict]) -> list[dict]:
+    """
+    Generate insights for several analyses with one Gemini call per
+    MAX_BATCH_REPORTS reports, instead of one call each.
+
+    Each item holds generate_insights keyword arguments (analysis_results,
+    anomaly_results, forecast_results, optional file_id). Cached reports are reused and
+    identical analyses are generated once. A report missing from the reply
+    falls back to local insights on its own; if the call fails, every report
+    in it does. Results are returned in input order.
+    """
+    keys, pending = [], {}
+    for item in items:
+        analysis = item["analysis_results"]
+        anomalies = item.get("anomaly_results") or {}
+        forecasts = item.get("forecast_results") or []
+        inputs = _prompt_inputs(analysis, anomalies, forecasts, item.get("file_id"))
+        key = _cache_key(inputs)
+        keys.append(key)
+        if key not in _insight_cache:
+            pending.setdefault(key, ((analysis, anomalies, forecasts), inputs))
+
+    results = {k: _insight_cache[k] for k in keys if k in _insight_cache}
+
+    def _local(key):
+        results[key] = _generate_local_insights(*pending[key][0])
+        _insight_cache[key] = results[key]
+
+    api_key = _resolve_api_key()
+    if not pending or not api_key or not _is_api_available():
+        for key in pending:
+            _local(key)
+        return [results[k] for k in keys]
+
+    client = await _get_client(api_key)
+    pending_keys = list(pending)
+    groups = [pending_keys[i:i + MAX_BATCH_REPORTS] for i in range(0, len(pending_keys), MAX_BATCH_REPORTS)]
+
+    async def _run_group(group: list[str]):
+        prompts = [_build_prompt(pending[k][1]) for k in group]
+        try:
+            texts = await _generate_batch_texts(client, prompts)
+        except Exception as e:
+            logger.exception("Batch insight call failed: %s. Using local fallback.", e)
+            texts = [""] * len(group)
+        for key, text in zip(group, texts):
+            sections = _parse_sections(text)
+            if not sections:
+                _local(key)
+                continue
+            results[key] = {"insights": text, "sections": sections, "error": None}
+            _insight_cache[key] = results[key]
+
+    await asyncio.gather(*(_run_group(g) for g in groups))
+    return [results[k] for k in keys]
+
+
+# "## Header" line followed by everything up to the next "## " line (or the end)
+_SECTION_RE = re.compile(r"^## ([^\n]*)\n?(.*?)(?=^## |\Z)", re.MULTILINE | re.DOTALL)
 
 
 def _parse_sections(markdown: str) -> dict:
     """Parse a markdown insight report into individual sections."""
-    sections = {}
-    current_section = None
-    current_lines = []
-    
-    for line in markdown.split("\n"):
-        if line.startswith("## "):
-            if current_section:
-                sections[current_section] = "\n".join(current_lines).strip()
-            current_section = line[3:].strip().lower().replace(" ", "_").replace("&", "and")
-            current_lines = []
-        elif current_section:
-            current_lines.append(line)
-    
-    if current_section:
-        sections[current_section] = "\n".join(current_lines).strip()
-    
-    return sections
+    return {
+        m.group(1).strip().lower().replace(" ", "_").replace("&", "and"): m.group(2).strip()
+        for m in _SECTION_RE.finditer(markdown)
+    }
 
 
 # ══════════════════════════════════════════════════════════════
@@ -307,109 +747,88 @@ def _generate_local_insights(
     summary = analysis_results.get("summary", {})
     stats = analysis_results.get("descriptive_stats", {})
     corrs = analysis_results.get("strong_correlations", [])
-    distributions = analysis_results.get("distributions", {})
     trends = analysis_results.get("trends", {})
-    feature_imp = analysis_results.get("feature_importance", [])
     anomalies = anomaly_results or {}
-
-    lines = []
+    anomaly_total = anomalies.get("summary", {}).get("total_anomalous_values", 0)
 
     # ── Executive Summary ────────────────────────────────────
-    lines.append("## Executive Summary")
-    lines.append(
+    lines = [
+        "## Executive Summary",
         f"This dataset contains **{summary.get('total_rows', '?')} rows** and "
         f"**{summary.get('total_columns', '?')} columns** "
         f"({summary.get('numeric_columns', 0)} numeric, "
-        f"{summary.get('categorical_columns', 0)} categorical). "
-    )
-    anomaly_total = anomalies.get("summary", {}).get("total_anomalous_values", 0)
+        f"{summary.get('categorical_columns', 0)} categorical). ",
+    ]
     if anomaly_total > 0:
         lines.append(f"**{anomaly_total} anomalous values** were detected across the dataset. ")
     if corrs:
         lines.append(f"**{len(corrs)} strong correlations** were found between variables.")
-    lines.append("")
 
     # ── Key Findings ─────────────────────────────────────────
-    lines.append("## Key Findings")
-    finding_num = 1
-    for col, m in list(stats.items())[:5]:
-        mean = m.get("mean")
-        std = m.get("std")
-        if mean is not None and std is not None:
-            cv = abs(std / mean * 100) if mean != 0 else 0
-            volatility = "high" if cv > 50 else "moderate" if cv > 20 else "low"
-            lines.append(
-                f"{finding_num}. **{col}** has a mean of **{_num(mean)}** "
-                f"(std: {_num(std)}, CV: {cv:.1f}% — {volatility} variability)"
-            )
-            finding_num += 1
+    findings = [
+        _mean_finding(col, m["mean"], m["std"])
+        for col, m in list(stats.items())[:5]
+        if m.get("mean") is not None and m.get("std") is not None
+    ]
     if corrs:
         top = corrs[0]
-        lines.append(
-            f"{finding_num}. Strongest correlation: **{top.get('col_a')}** and "
+        findings.append(
+            f"Strongest correlation: **{top.get('col_a')}** and "
             f"**{top.get('col_b')}** (r = {_num(top.get('correlation', 0))})"
         )
-    lines.append("")
+    lines += ["", "## Key Findings"]
+    lines += [f"{i}. {text}" for i, text in enumerate(findings, 1)]
 
     # ── Trends & Patterns ────────────────────────────────────
-    lines.append("## Trends & Patterns")
+    lines += ["", "## Trends & Patterns"]
     if trends:
-        for col_name, trend_data in list(trends.items())[:6]:
-            if isinstance(trend_data, dict):
-                direction = trend_data.get("direction", "unknown")
-                strength = trend_data.get("strength", "")
-                lines.append(f"- **{col_name}**: {direction} trend ({strength})")
-            else:
-                lines.append(f"- **{col_name}**: {trend_data}")
+        lines += [
+            f"- **{col_name}**: {t.get('direction', 'unknown')} trend ({t.get('strength', '')})"
+            if isinstance(t, dict) else f"- **{col_name}**: {t}"
+            for col_name, t in list(trends.items())[:6]
+        ]
     else:
         lines.append("- No significant time-based trends detected.")
-    lines.append("")
 
     # ── Anomalies & Concerns ─────────────────────────────────
-    lines.append("## Anomalies & Concerns")
+    lines += ["", "## Anomalies & Concerns"]
     if anomaly_total > 0:
-        per_col = anomalies.get("per_column", {})
-        for col, data in list(per_col.items())[:6]:
-            z = data.get("z_score", {}).get("count", 0)
-            iqr = data.get("iqr", {}).get("count", 0)
-            if z + iqr > 0:
-                lines.append(f"- **{col}**: {z} Z-score outliers, {iqr} IQR outliers")
+        lines += [
+            f"- **{col}**: {z} Z-score outliers, {iqr} IQR outliers"
+            for col, data in list(anomalies.get("per_column", {}).items())[:6]
+            if (z := data.get("z_score", {}).get("count", 0)) + (iqr := data.get("iqr", {}).get("count", 0)) > 0
+        ]
     else:
         lines.append("- No significant anomalies detected.")
-    lines.append("")
 
     # ── Correlations ─────────────────────────────────────────
     if corrs:
-        lines.append("## Correlations & Relationships")
-        for c in corrs[:5]:
-            direction = c.get("direction", "positive")
-            strength = c.get("strength", "strong")
-            lines.append(
-                f"- **{c.get('col_a')}** and **{c.get('col_b')}**: "
-                f"r = {_num(c.get('correlation', 0))} ({strength}, {direction})"
-            )
-        lines.append("")
+        lines += ["", "## Correlations & Relationships"]
+        lines += [
+            f"- **{c.get('col_a')}** and **{c.get('col_b')}**: "
+            f"r = {_num(c.get('correlation', 0))} ({c.get('strength', 'strong')}, {c.get('direction', 'positive')})"
+            for c in corrs[:5]
+        ]
 
     # ── Recommendations ──────────────────────────────────────
-    lines.append("## Actionable Recommendations")
-    rec_num = 1
+    recs = []
     if anomaly_total > 0:
-        lines.append(f"{rec_num}. Investigate the {anomaly_total} detected anomalies for data quality or business events.")
-        rec_num += 1
+        recs.append(f"Investigate the {anomaly_total} detected anomalies for data quality or business events.")
     if corrs:
         top = corrs[0]
-        lines.append(f"{rec_num}. Leverage the strong relationship between {top.get('col_a')} and {top.get('col_b')} for predictive modeling.")
-        rec_num += 1
+        recs.append(f"Leverage the strong relationship between {top.get('col_a')} and {top.get('col_b')} for predictive modeling.")
     # High-variability columns
-    for col, m in list(stats.items())[:3]:
-        mean = m.get("mean", 0)
-        std = m.get("std", 0)
-        if mean and abs(std / mean * 100) > 40:
-            lines.append(f"{rec_num}. Analyze what drives the high variability in **{col}** (CV > 40%).")
-            rec_num += 1
-            break
-    if rec_num <= 3:
-        lines.append(f"{rec_num}. Collect more data over time to strengthen trend analysis.")
+    volatile = next(
+        (col for col, m in list(stats.items())[:3]
+         if m.get("mean", 0) and abs(m.get("std", 0) / m.get("mean", 0) * 100) > 40),
+        None,
+    )
+    if volatile is not None:
+        recs.append(f"Analyze what drives the high variability in **{volatile}** (CV > 40%).")
+    if len(recs) < 3:
+        recs.append("Collect more data over time to strengthen trend analysis.")
+    lines += ["", "## Actionable Recommendations"]
+    lines += [f"{i}. {text}" for i, text in enumerate(recs, 1)]
     lines.append("")
 
     markdown = "\n".join(lines)
@@ -423,12 +842,24 @@ def _generate_local_insights(
     }
 
 
+_NUM_SPEC_LARGE = ",.0f"
+_NUM_SPEC_SMALL = ".4f"
+
+
 def _num(v) -> str:
     """Format a number for display."""
     if v is None:
         return "N/A"
     if isinstance(v, float):
-        if abs(v) >= 1000:
-            return f"{v:,.0f}"
-        return f"{v:.4f}"
+        return format(v, _NUM_SPEC_LARGE if abs(v) >= 1000 else _NUM_SPEC_SMALL)
     return str(v)
+
+
+def _mean_finding(col: str, mean, std) -> str:
+    """One Key Findings line: mean, std and coefficient of variation for a column."""
+    cv = abs(std / mean * 100) if mean != 0 else 0
+    volatility = "high" if cv > 50 else "moderate" if cv > 20 else "low"
+    return (
+        f"**{col}** has a mean of **{_num(mean)}** "
+        f"(std: {_num(std)}, CV: {cv:.1f}% — {volatility} variability)"
+    )
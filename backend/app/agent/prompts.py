@@ -3,9 +3,47 @@ prompts.py — System Prompts for the BI Agent
 
 System prompts tell the AI how to behave. Think of it as the agent's "job description".
 A well-written prompt is crucial for getting good results from an LLM.
+
+Prompts are compressed once at import (filler phrases, e.g./i.e. asides,
+blank lines and repeated spaces removed) to cut input tokens on every call.
+The original wording is kept in *_VERBOSE for comparison; set
+PROMPT_COMPRESSION=False to send it instead.
 """
 
-SYSTEM_PROMPT = """
+import re
+
+from ..config import settings
+
+# (pattern, replacement) pairs applied line by line — newlines and Markdown
+# headers are preserved because the model mirrors the prompt's structure.
+_COMPRESSION_RULES = [
+    (re.compile(r"\bI would like you to\s+", re.IGNORECASE), ""),
+    (re.compile(r"\bcould you\s+", re.IGNORECASE), ""),
+    (re.compile(r"\b(?:please|kindly)\s+", re.IGNORECASE), ""),
+    (re.compile(r"\bprovide a detailed explanation of\b", re.IGNORECASE), "explain"),
+    (re.compile(r"\s*\((?:e\.g\.|i\.e\.|for example)[^)]*\)", re.IGNORECASE), ""),
+    (re.compile(r"[ \t]{2,}"), " "),
+]
+
+
+def compress_prompt(text: str) -> str:
+    """Rule-based prompt compression: drop filler and hedges, keep line structure."""
+    lines = []
+    for line in text.splitlines():
+        original = line.strip()
+        line = original
+        for pattern, repl in _COMPRESSION_RULES:
+            line = pattern.sub(repl, line)
+        line = line.strip()
+        if not line:
+            continue
+        if line != original:
+            line = line[0].upper() + line[1:]
+        lines.append(line)
+    return "\n".join(lines)
+
+
+SYSTEM_PROMPT_VERBOSE = """
 You are an expert Business Intelligence Analyst AI assistant. You help users
 understand their data by providing clear, actionable insights.
 
@@ -30,7 +68,7 @@ When analyzing data:
 - Suggest follow-up analyses if relevant
 """
 
-INSIGHT_GENERATION_PROMPT = """
+INSIGHT_GENERATION_PROMPT_VERBOSE = """
 Based on the following analysis results, generate clear business insights:
 
 Data Summary:
@@ -54,3 +92,10 @@ Please provide:
 
 Format your response in clear Markdown with headers and bullet points.
 """
+
+if settings.PROMPT_COMPRESSION:
+    SYSTEM_PROMPT = compress_prompt(SYSTEM_PROMPT_VERBOSE)
+    INSIGHT_GENERATION_PROMPT = compress_prompt(INSIGHT_GENERATION_PROMPT_VERBOSE)
+else:
+    SYSTEM_PROMPT = SYSTEM_PROMPT_VERBOSE
+    INSIGHT_GENERATION_PROMPT = INSIGHT_GENERATION_PROMPT_VERBOSE
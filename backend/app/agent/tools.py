@@ -6,77 +6,118 @@ The agent reads the function name, docstring, and parameter types to
 understand what each tool does, then decides which one to call.
 
 These tools give the agent access to the data without exposing raw DataFrames.
+Each tool takes the calling request's ToolContext as its first argument; the
+model only sees the remaining parameters (see TOOL_DECLARATIONS in bi_agent.py).
 """
 
+import threading
+import weakref
+from typing import NamedTuple
+
 import pandas as pd
 import numpy as np
-import os
-import json
+from cachetools import LRUCache
+
+
+class ToolContext(NamedTuple):
+    """The data one chat request's tools read — built per request, never shared,
+    so concurrent chats on different files can't see each other's frames."""
+    df: pd.DataFrame | None
+    analysis: dict | None
+    file_id: str | None
+    columns: dict
+
 
+# Column context per DataFrame, so repeat questions on a file skip the dtype
+# scans. Keyed by id(df); the weakref guards against a recycled id.
+_column_cache: LRUCache = LRUCache(maxsize=32)
+_column_cache_lock = threading.Lock()
 
-# Module-level data store (set by the agent before a session)
-_current_df: pd.DataFrame | None = None
-_current_analysis: dict | None = None
-_current_file_id: str | None = None
 
+def _build_column_context(df: pd.DataFrame) -> dict:
+    """Column-type lists and lowercase-name lookups, computed in one place."""
+    lower_map = {str(c).lower(): c for c in df.columns}
+    return {
+        "numeric": df.select_dtypes(include="number").columns.tolist(),
+        "cat": df.select_dtypes(include=["object", "category"]).columns.tolist(),
+        "lower_map": lower_map,
+        # (lowercase name, column), longest first, for substring matching
+        "by_length": sorted(lower_map.items(), key=lambda kv: len(kv[0]), reverse=True),
+    }
 
-def set_context(df: pd.DataFrame, analysis: dict, file_id: str):
-    """Set the data context for tools to use during a session."""
-    global _current_df, _current_analysis, _current_file_id
-    _current_df = df
-    _current_analysis = analysis
-    _current_file_id = file_id
 
+def get_column_context(df: pd.DataFrame) -> dict:
+    """Return column-type info for df, cached while df is alive."""
+    with _column_cache_lock:
+        hit = _column_cache.get(id(df))
+    if hit is not None and hit[0]() is df:
+        return hit[1]
+    cols = _build_column_context(df)
+    with _column_cache_lock:
+        _column_cache[id(df)] = (weakref.ref(df), cols)
+    return cols
 
-def get_data_summary() -> str:
+
+def make_tool_context(df: pd.DataFrame, analysis: dict, file_id: str) -> ToolContext:
+    """Bundle one request's data for the tools."""
+    return ToolContext(df, analysis, file_id, get_column_context(df))
+
+
+def get_data_summary(ctx: ToolContext) -> str:
     """Get a high-level summary of the loaded dataset including row count, column names, and data types.
     Use this first to understand what data is available."""
-    if _current_df is None:
+    if ctx.df is None:
         return "No data loaded."
 
-    df = _current_df
+    df = ctx.df
     info_lines = [
-        f"Dataset: {_current_file_id}",
+        f"Dataset: {ctx.file_id}",
         f"Rows: {len(df):,}",
         f"Columns: {len(df.columns)}",
         "",
         "Column details:",
     ]
-    for col in df.columns:
-        dtype = str(df[col].dtype)
-        missing = int(df[col].isnull().sum())
-        unique = int(df[col].nunique())
-        info_lines.append(f"  - {col} ({dtype}): {unique} unique, {missing} missing")
+    # One pass each over the whole frame instead of two scans per column
+    missing = df.isnull().sum()
+    unique = df.nunique()
+    for col, dtype in df.dtypes.items():
+        info_lines.append(f"  - {col} ({dtype}): {int(unique[col])} unique, {int(missing[col])} missing")
 
     return "\n".join(info_lines)
 
 
-def get_column_statistics(column_name: str) -> str:
+def get_column_statistics(ctx: ToolContext, column_name: str) -> str:
     """Get detailed statistics for a specific numeric column.
     Returns count, mean, std, min, max, median, quartiles.
     Args:
         column_name: The exact name of the column to analyze.
     """
-    if _current_df is None:
+    if ctx.df is None:
         return "No data loaded."
 
-    if column_name not in _current_df.columns:
-        return f"Column \'{column_name}\' not found. Available: {list(_current_df.columns)}"
+    if column_name not in ctx.df.columns:
+        return f"Column \'{column_name}\' not found. Available: {list(ctx.df.columns)}"
 
-    s = _current_df[column_name]
+    s = ctx.df[column_name]
 
     if pd.api.types.is_numeric_dtype(s):
-        stats = s.describe()
+        # One NaN drop, then a single percentile call yields min/quartiles/max
+        # together (cheaper than describe()'s separate reductions)
+        v = s.dropna().to_numpy(dtype=float)
+        if len(v) == 0:
+            return f"Column \'{column_name}\' has no non-missing values."
+        lo, q1, med, q3, hi = np.percentile(v, [0, 25, 50, 75, 100])
+        std = v.std(ddof=1) if len(v) > 1 else float("nan")
         return (
             f"Statistics for \'{column_name}\':\n"
-            f"  Count: {int(stats['count']):,}\n"
-            f"  Mean: {stats['mean']:.4f}\n"
-            f"  Std: {stats['std']:.4f}\n"
-            f"  Min: {stats['min']:.4f}\n"
-            f"  25%: {stats['25%']:.4f}\n"
-            f"  Median: {stats['50%']:.4f}\n"
-            f"  75%: {stats['75%']:.4f}\n"
-            f"  Max: {stats['max']:.4f}"
+            f"  Count: {len(v):,}\n"
+            f"  Mean: {v.mean():.4f}\n"
+            f"  Std: {std:.4f}\n"
+            f"  Min: {lo:.4f}\n"
+            f"  25%: {q1:.4f}\n"
+            f"  Median: {med:.4f}\n"
+            f"  75%: {q3:.4f}\n"
+            f"  Max: {hi:.4f}"
         )
     else:
         vc = s.value_counts().head(10)
@@ -86,7 +127,7 @@ def get_column_statistics(column_name: str) -> str:
         return "\n".join(lines)
 
 
-def query_data(filter_column: str, operator: str, value: str) -> str:
+def query_data(ctx: ToolContext, filter_column: str, operator: str, value: str) -> str:
     """Filter the dataset and return matching rows count and sample.
     Args:
         filter_column: Column name to filter on.
@@ -95,17 +136,20 @@ def query_data(filter_column: str, operator: str, value: str) -> str:
     Returns:
         A summary of matching rows.
     """
-    if _current_df is None:
+    if ctx.df is None:
         return "No data loaded."
 
-    df = _current_df
+    df = ctx.df
     if filter_column not in df.columns:
         return f"Column \'{filter_column}\' not found. Available: {list(df.columns)}"
 
     col = df[filter_column]
     try:
         if operator == "contains":
-            mask = col.astype(str).str.contains(str(value), case=False, na=False)
+            # Plain substring match; string-dtype columns (incl. string[pyarrow],
+            # which pandas routes to Arrow's match_substring) skip the astype copy
+            text = col if isinstance(col.dtype, pd.StringDtype) else col.astype(str)
+            mask = text.str.contains(str(value), case=False, regex=False, na=False)
         elif operator == "==":
             if pd.api.types.is_numeric_dtype(col):
                 mask = col == float(value)
@@ -135,10 +179,11 @@ def query_data(filter_column: str, operator: str, value: str) -> str:
 
         if len(filtered) > 0:
             result_lines.append("\nSample (first 5 rows):")
-            sample = filtered.head(5)
-            for _, row in sample.iterrows():
-                row_str = ", ".join(f"{c}={row[c]}" for c in df.columns[:6])
-                result_lines.append(f"  {row_str}")
+            cols = df.columns[:6]
+            records = filtered.head(5)[cols].to_dict(orient="records")
+            result_lines.extend(
+                "  " + ", ".join(f"{c}={r[c]}" for c in cols) for r in records
+            )
 
         return "\n".join(result_lines)
 
@@ -146,13 +191,13 @@ def query_data(filter_column: str, operator: str, value: str) -> str:
         return f"Filter failed: {str(e)}"
 
 
-def get_correlation_insights() -> str:
+def get_correlation_insights(ctx: ToolContext) -> str:
     """Get strong correlations found in the data.
     Returns pairs of columns with correlation > 0.7."""
-    if _current_analysis is None:
+    if ctx.analysis is None:
         return "No analysis available."
 
-    corrs = _current_analysis.get("strong_correlations", [])
+    corrs = ctx.analysis.get("strong_correlations", [])
     if not corrs:
         return "No strong correlations (|r| > 0.7) found in this dataset."
 
@@ -165,13 +210,13 @@ def get_correlation_insights() -> str:
     return "\n".join(lines)
 
 
-def get_trend_insights() -> str:
+def get_trend_insights(ctx: ToolContext) -> str:
     """Get time-series trend information for numeric columns.
     Shows direction, statistical significance, and percentage change."""
-    if _current_analysis is None:
+    if ctx.analysis is None:
         return "No analysis available."
 
-    trends = _current_analysis.get("trends", {})
+    trends = ctx.analysis.get("trends", {})
     if not trends:
         return "No trends detected. This may mean the data has no datetime column."
 
@@ -185,17 +230,17 @@ def get_trend_insights() -> str:
     return "\n".join(lines)
 
 
-def get_anomaly_summary() -> str:
+def get_anomaly_summary(ctx: ToolContext) -> str:
     """Get a summary of detected anomalies in the data.
     Returns count of anomalies per column and overall statistics."""
-    if _current_analysis is None:
+    if ctx.analysis is None:
         return "No analysis available."
 
     # Anomalies are stored separately but we access via analysis context
     return "Anomaly data is available in the analysis results. Ask me about specific columns."
 
 
-def compute_group_aggregation(group_by_column: str, value_column: str, aggregation: str) -> str:
+def compute_group_aggregation(ctx: ToolContext, group_by_column: str, value_column: str, aggregation: str) -> str:
     """Compute a grouped aggregation on the data.
     Args:
         group_by_column: Column to group by.
@@ -204,10 +249,10 @@ def compute_group_aggregation(group_by_column: str, value_column: str, aggregati
     Returns:
         Aggregated results per group.
     """
-    if _current_df is None:
+    if ctx.df is None:
         return "No data loaded."
 
-    df = _current_df
+    df = ctx.df
     for c in [group_by_column, value_column]:
         if c not in df.columns:
             return f"Column \'{c}\' not found. Available: {list(df.columns)}"
@@ -217,25 +262,30 @@ def compute_group_aggregation(group_by_column: str, value_column: str, aggregati
         return f"Unknown aggregation: {aggregation}. Use: {list(agg_funcs.keys())}"
 
     try:
-        grouped = df.groupby(group_by_column)[value_column].agg(agg_funcs[aggregation])
+        grouped = df.groupby(group_by_column, sort=False, observed=True)[value_column].agg(agg_funcs[aggregation])
         grouped = grouped.sort_values(ascending=False)
 
+        # Aggregates share one dtype, so pick the format once for the whole column
+        top = grouped.head(15)
+        fmt = "{:,.4f}".format if pd.api.types.is_float_dtype(top) else "{:,}".format
         lines = [f"{aggregation.upper()} of {value_column} by {group_by_column}:"]
-        for idx, val in grouped.head(15).items():
-            lines.append(f"  {idx}: {val:,.4f}" if isinstance(val, float) else f"  {idx}: {val:,}")
+        # Nullable aggregates (e.g. Int64) can hold <NA>, which format() rejects
+        lines.extend(
+            f"  {idx}: {'N/A' if pd.isna(val) else fmt(val)}" for idx, val in top.items()
+        )
         return "\n".join(lines)
 
     except Exception as e:
         return f"Aggregation failed: {str(e)}"
 
 
-def get_analysis_results() -> str:
+def get_analysis_results(ctx: ToolContext) -> str:
     """Get the full statistical analysis summary including descriptive stats,
     distributions, categorical summaries, and segment analysis."""
-    if _current_analysis is None:
+    if ctx.analysis is None:
         return "No analysis available."
 
-    summary = _current_analysis.get("summary", {})
+    summary = ctx.analysis.get("summary", {})
     lines = [
         "Analysis Summary:",
         f"  Rows: {summary.get('total_rows', 0):,}",
@@ -249,7 +299,7 @@ def get_analysis_results() -> str:
     ]
 
     # Add descriptive stats summary
-    desc = _current_analysis.get("descriptive_stats", {})
+    desc = ctx.analysis.get("descriptive_stats", {})
     if desc:
         lines.append("\nDescriptive Stats (mean values):")
         for col, stats in desc.items():
@@ -5,64 +5,304 @@ Triggers data cleaning, statistical analysis, anomaly detection,
 forecasting, and AI insight generation on an uploaded dataset.
 """
 
-import json
-import math
+import asyncio
+import hashlib
+import logging
 import os
 import traceback
+from typing import Iterator
 
 import numpy as np
+import orjson
 import pandas as pd
-from fastapi import APIRouter, HTTPException
+from cachetools import LRUCache
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel
 
 from ..config import settings
 from ..core.file_parser import parse_file, get_file_path
 from ..core.data_cleaner import clean_data
-from ..core.analyzer import run_analysis as analyze_data
+from ..core.analyzer import ColumnTypes, column_types, run_analysis as analyze_data
 from ..core.forecaster import generate_all_forecasts
 from ..core.anomaly import detect_anomalies
-from ..agent.insight_generator import generate_insights
+from ..agent.insight_generator import (
+    generate_insights, generate_insights_batch, invalidate_prompt_inputs, stream_insights,
+)
+from ..agent.bi_agent import invalidate_file
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-# In-memory cache of results keyed by file_id
-_results_cache: dict = {}
-# Separate cache for cleaned DataFrames (needed by chat agent)
-_df_cache: dict = {}
+# ── Analysis cache ───────────────────────────────────────────
+# Keyed by file_id. Each entry keeps the cleaned DataFrame (needed by
+# chat/dashboard/reports) and its column types, the JSON-safe results dict,
+# and the results already serialized to bytes so GET /results never
+# re-encodes.
+# Bounded by bytes rather than entry count, since cleaned DataFrames are
+# the bulk of the server's memory and vary by orders of magnitude in size.
+# With ANALYSIS_CACHE_DIR set (and diskcache installed) entries are also
+# written to a disk cache shared by every uvicorn worker, so a worker that
+# didn't run the analysis can still serve it.
+_SHARED_CACHE_TTL = 3600
+
+
+def _entry_size(entry: dict) -> int:
+    return int(entry["df"].memory_usage(deep=True).sum()) + 2 * len(entry["body"])
+
+
+_analysis_cache: LRUCache = LRUCache(
+    maxsize=settings.ANALYSIS_CACHE_MB * 1024 * 1024, getsizeof=_entry_size,
+)
+
+
+def _open_shared_analysis_cache():
+    """Open the on-disk analysis cache shared across workers, or None."""
+    if not settings.ANALYSIS_CACHE_DIR:
+        return None
+    try:
+        import diskcache
+        return diskcache.Cache(settings.ANALYSIS_CACHE_DIR, size_limit=4 * 2**30)
+    except Exception as e:
+        logger.warning("Shared analysis cache unavailable, using in-process cache: %s", e)
+        return None
+
+
+_shared_analysis_cache = _open_shared_analysis_cache()
+
+
+def _cache_locally(file_id: str, entry: dict):
+    try:
+        _analysis_cache[file_id] = entry
+    except ValueError:  # a single file larger than the whole budget
+        _analysis_cache.pop(file_id, None)
+        logger.warning("Analysis for %s exceeds ANALYSIS_CACHE_MB; not kept in memory", file_id)
+
+
+def _store_entry(file_id: str, entry: dict):
+    _cache_locally(file_id, entry)
+    if _shared_analysis_cache is not None:
+        _shared_analysis_cache.set(file_id, entry, expire=_SHARED_CACHE_TTL)
+
+
+def _get_entry(file_id: str) -> dict | None:
+    entry = _analysis_cache.get(file_id)
+    if entry is None and _shared_analysis_cache is not None:
+        entry = _shared_analysis_cache.get(file_id)
+        if entry is not None:
+            _cache_locally(file_id, entry)
+    return entry
 
 
 def get_cached_data(file_id: str):
     """Return (cleaned_df, results_dict) from cache, or (None, None)."""
-    return _df_cache.get(file_id), _results_cache.get(file_id)
+    entry = _get_entry(file_id)
+    if entry is None:
+        return None, None
+    return entry["df"], entry["results"]
 
 
-def _make_json_safe(obj):
-    """Recursively convert numpy/pandas types to JSON-safe Python types."""
-    if obj is None:
-        return None
-    if isinstance(obj, (np.integer,)):
-        return int(obj)
-    if isinstance(obj, (np.floating,)):
-        v = float(obj)
-        if math.isnan(v) or math.isinf(v):
-            return None
-        return round(v, 6)
-    if isinstance(obj, (np.bool_,)):
-        return bool(obj)
-    if isinstance(obj, np.ndarray):
-        return [_make_json_safe(x) for x in obj.tolist()]
+def get_column_types(file_id: str) -> ColumnTypes | None:
+    """Column-type lists computed when the file was analyzed, or None."""
+    entry = _get_entry(file_id)
+    return entry["col_types"] if entry is not None else None
+
+
+def _cached_results(file_id: str) -> dict:
+    """Cached results dict for file_id, or a 404 telling the client to run analysis."""
+    _, results = get_cached_data(file_id)
+    if results is None:
+        raise HTTPException(
+            status_code=404,
+            detail="No analysis results found. Run /run/{file_id} first.",
+        )
+    return results
+
+
+# orjson handles dicts/lists/floats (NaN/inf -> null) and numpy arrays and
+# scalars in C; _json_default only sees the few types it doesn't know, and
+# stringifies anything unrecognized rather than failing the response.
+_ORJSON_OPTS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def _json_default(obj):
     if isinstance(obj, pd.Timestamp):
         return obj.isoformat()
+    if isinstance(obj, np.ndarray):  # object-dtype / non-contiguous arrays
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if obj is pd.NaT or obj is pd.NA:
+        return None
+    return str(obj)  # e.g. pd.Timedelta — stringified, as the old encoder did
+
+
+def _str_keys(obj):
+    """Stringify dict keys throughout obj — numpy-typed keys are the one thing orjson rejects."""
     if isinstance(obj, dict):
-        return {str(k): _make_json_safe(v) for k, v in obj.items()}
+        return {str(k): _str_keys(v) for k, v in obj.items()}
     if isinstance(obj, (list, tuple)):
-        return [_make_json_safe(x) for x in obj]
-    if isinstance(obj, float):
-        if math.isnan(obj) or math.isinf(obj):
-            return None
-        return round(obj, 6)
+        return [_str_keys(v) for v in obj]
     return obj
 
 
+def json_dumps(obj) -> bytes:
+    """Serialize a result tree to JSON bytes.
+
+    Values never need a Python pass; only if a dict has numpy-typed keys
+    (e.g. from a value_counts() index) are the keys rewritten and encoding
+    retried.
+    """
+    try:
+        return orjson.dumps(obj, default=_json_default, option=_ORJSON_OPTS)
+    except orjson.JSONEncodeError:
+        return orjson.dumps(_str_keys(obj), default=_json_default, option=_ORJSON_OPTS)
+
+
+def json_response(obj, etag: str | None = None) -> Response:
+    """Pre-serialized JSON response — skips FastAPI's jsonable_encoder walk.
+
+    obj may also be bytes that were already serialized with json_dumps.
+    """
+    body = obj if isinstance(obj, bytes) else json_dumps(obj)
+    return Response(content=body, media_type="application/json", headers=_etag_headers(etag))
+
+
+# ── Conditional GETs ─────────────────────────────────────────
+# Everything served for a file (results, dashboard summary, charts) is a
+# pure function of its cache entry, so one ETag per analysis run lets a
+# client that already has the payload get a bodiless 304 instead.
+_CACHE_CONTROL = "private, max-age=300"
+
+
+def _etag_headers(etag: str | None) -> dict | None:
+    return {"ETag": etag, "Cache-Control": _CACHE_CONTROL} if etag else None
+
+
+def get_etag(file_id: str) -> str | None:
+    """ETag of the file's current analysis run, or None if not cached."""
+    entry = _get_entry(file_id)
+    return entry["etag"] if entry is not None else None
+
+
+def not_modified(request: Request, etag: str | None) -> Response | None:
+    """A 304 response if the request's If-None-Match already names etag, else None."""
+    header = request.headers.get("if-none-match")
+    if not etag or not header:
+        return None
+    tags = [t.strip().removeprefix("W/") for t in header.split(",")]
+    if "*" in tags or etag in tags:
+        return Response(status_code=304, headers=_etag_headers(etag))
+    return None
+
+
+def _save_cleaned(df: pd.DataFrame, file_id: str) -> str:
+    """Write the cleaned data to OUTPUT_DIR and return the file name.
+
+    Parquet (zstd) when pyarrow is installed — much smaller and faster than
+    CSV and keeps dtypes. Falls back to CSV without pyarrow or for columns
+    Arrow can't type (mixed-type object columns).
+    """
+    output_dir = settings.OUTPUT_DIR
+    os.makedirs(output_dir, exist_ok=True)
+    parquet_path = os.path.join(output_dir, f"{file_id}_cleaned.parquet")
+    try:
+        df.to_parquet(parquet_path, engine="pyarrow", compression="zstd", index=False)
+        return os.path.basename(parquet_path)
+    except (ImportError, ValueError, TypeError):
+        if os.path.exists(parquet_path):
+            os.remove(parquet_path)
+    df.to_csv(os.path.join(output_dir, f"{file_id}_cleaned.csv"), index=False)
+    return f"{file_id}_cleaned.csv"
+
+
+def _pipeline_sections(file_path: str, file_id: str, state: dict) -> Iterator[tuple[str, object]]:
+    """Blocking parse -> clean -> analyze -> anomalies -> forecasts pipeline.
+
+    Yields each top-level section of the result as soon as it's ready, so the
+    streaming endpoint can send (and drop) it before the next stage runs. The
+    cleaned DataFrame and its column types are left in `state`.
+    """
+    yield "file_id", file_id
+
+    # 1. Parse the uploaded file
+    raw_df = parse_file(file_path)
+
+    # 2. Clean the data
+    cleaning_result = clean_data(raw_df)
+    del raw_df
+    cleaned_df = state["df"] = cleaning_result["cleaned_df"]
+    yield "cleaning", {
+        "actions": cleaning_result["actions"],
+        "summary": cleaning_result["summary"],
+    }
+    # One dtype scan, shared by every step below and cached with the results
+    col_types = state["col_types"] = column_types(cleaned_df)
+
+    # 3. Run statistical analysis on cleaned data
+    yield "analysis", analyze_data(cleaned_df, col_types)
+
+    # 4. Run anomaly detection
+    yield "anomalies", detect_anomalies(cleaned_df, columns=col_types.numeric)
+
+    # 5. Run forecasting (if time-series data detected)
+    forecast_result = None
+    datetime_cols = col_types.datetime
+    numeric_cols = col_types.numeric
+    if datetime_cols and numeric_cols:
+        forecast_result = generate_all_forecasts(
+            cleaned_df, datetime_cols[0], numeric_cols, periods=30
+        )
+    yield "forecasts", forecast_result
+
+    # 6. Build preview of cleaned data (first 15 rows)
+    yield "preview", cleaned_df.head(15).to_dict(orient="records")
+
+    # 7. Save cleaned data to outputs
+    yield "cleaned_file", _save_cleaned(cleaned_df, file_id)
+
+
+def _run_pipeline(file_path: str, file_id: str) -> tuple[pd.DataFrame, ColumnTypes, bytes]:
+    """Run the whole pipeline and return the cleaned DataFrame, its column
+    types and the serialized result. Runs in a worker thread so a large file
+    doesn't stall every other request on the loop.
+    """
+    state = {}
+    result = dict(_pipeline_sections(file_path, file_id, state))
+    result["status"] = "completed"
+    # Serialize once; the cached copy is parsed back from the same bytes
+    # so chat/insights/reports see plain JSON types.
+    return state["df"], state["col_types"], json_dumps(result)
+
+
+def _cache_run(file_id: str, df: pd.DataFrame, col_types: ColumnTypes, body: bytes):
+    """Cache results AND the cleaned DataFrame for chat/insights.
+
+    Chat answers and insight prompt inputs computed against a previous
+    run are now stale.
+    """
+    _store_entry(file_id, {
+        "df": df,
+        "col_types": col_types,
+        "results": orjson.loads(body),
+        "body": body,
+        "etag": f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"',
+    })
+    invalidate_file(file_id)
+    invalidate_prompt_inputs(file_id)
+
+
+def _require_upload(file_id: str) -> str:
+    try:
+        file_path = get_file_path(file_id)
+    except FileNotFoundError:
+        file_path = None
+    if not file_path:
+        raise HTTPException(status_code=404, detail=f"File '{file_id}' not found.")
+    return file_path
+
+
 @router.post("/run/{file_id}")
 async def run_analysis(file_id: str):
     """
@@ -71,65 +311,10 @@ async def run_analysis(file_id: str):
     Pipeline: parse -> clean -> analyze -> anomalies -> forecasts -> cache.
     """
     try:
-        # 1. Locate and parse the file
-        file_path = get_file_path(file_id)
-        if not file_path:
-            raise HTTPException(status_code=404, detail=f"File '{file_id}' not found.")
-
-        raw_df = parse_file(file_path)
-
-        # 2. Clean the data
-        cleaning_result = clean_data(raw_df)
-        cleaned_df = cleaning_result["cleaned_df"]
-        cleaning_actions = cleaning_result["actions"]
-        cleaning_summary = cleaning_result["summary"]
-
-        # 3. Run statistical analysis on cleaned data
-        analysis_result = analyze_data(cleaned_df)
-
-        # 4. Run anomaly detection
-        anomaly_result = detect_anomalies(cleaned_df)
-
-        # 5. Run forecasting (if time-series data detected)
-        forecast_result = None
-        datetime_cols = analysis_result.get("datetime_columns", [])
-        numeric_cols = cleaned_df.select_dtypes(include=[np.number]).columns.tolist()
-        if datetime_cols and numeric_cols:
-            forecast_result = generate_all_forecasts(
-                cleaned_df, datetime_cols[0], numeric_cols, periods=30
-            )
-
-        # 6. Save cleaned data to outputs
-        output_dir = settings.OUTPUT_DIR
-        os.makedirs(output_dir, exist_ok=True)
-        cleaned_path = os.path.join(output_dir, f"{file_id}_cleaned.csv")
-        cleaned_df.to_csv(cleaned_path, index=False)
-
-        # 7. Build preview of cleaned data (first 15 rows)
-        preview_records = cleaned_df.head(15).to_dict(orient="records")
-
-        result = {
-            "file_id": file_id,
-            "status": "completed",
-            "cleaning": {
-                "actions": cleaning_actions,
-                "summary": cleaning_summary,
-            },
-            "analysis": analysis_result,
-            "anomalies": anomaly_result,
-            "forecasts": forecast_result,
-            "preview": preview_records,
-            "cleaned_file": f"{file_id}_cleaned.csv",
-        }
-
-        # Make everything JSON-safe
-        result = _make_json_safe(result)
-
-        # Cache results AND the cleaned DataFrame for chat/insights
-        _results_cache[file_id] = result
-        _df_cache[file_id] = cleaned_df
-
-        return result
+        file_path = _require_upload(file_id)
+        cleaned_df, col_types, body = await asyncio.to_thread(_run_pipeline, file_path, file_id)
+        _cache_run(file_id, cleaned_df, col_types, body)
+        return Response(content=body, media_type="application/json")
 
     except HTTPException:
         raise
@@ -138,12 +323,99 @@ async def run_analysis(file_id: str):
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
 
+@router.post("/run/{file_id}/stream")
+async def run_analysis_stream(file_id: str):
+    """
+    Same pipeline and response document as POST /run/{file_id}, but each
+    section is sent as soon as its stage finishes, so the client can start
+    rendering the cleaning report while analysis is still running and the
+    server never holds the whole result as Python objects.
+
+    Errors after the first byte can't change the status code; the document
+    then ends with "status": "failed" and an "error" message instead.
+    """
+    file_path = _require_upload(file_id)
+
+    async def chunks():
+        state = {}
+        sections = _pipeline_sections(file_path, file_id, state)
+        parts = []  # serialized sections, joined into the cached body at the end
+        try:
+            while (section := await asyncio.to_thread(next, sections, None)) is not None:
+                key, value = section
+                part = json_dumps(key) + b":" + json_dumps(value)
+                yield (b"," if parts else b"{") + part
+                parts.append(part)
+        except Exception as e:
+            logger.exception("Streaming analysis failed for %s", file_id)
+            failed = json_dumps("status") + b':"failed",' + json_dumps("error") + b":" + json_dumps(f"Analysis failed: {e}")
+            yield (b"," if parts else b"{") + failed + b"}"
+            return
+
+        status = json_dumps("status") + b':"completed"'
+        yield b"," + status + b"}"
+        parts.append(status)
+        _cache_run(file_id, state["df"], state["col_types"], b"{" + b",".join(parts) + b"}")
+
+    return StreamingResponse(chunks(), media_type="application/json")
+
+
+@router.get("/cleaned/{file_id}.csv")
+async def download_cleaned_csv(file_id: str):
+    """Cleaned data as a CSV download, rendered on demand from the cached frame."""
+    df, _ = get_cached_data(file_id)
+    if df is None:
+        raise HTTPException(status_code=404, detail="No results found. Run analysis first.")
+    csv = await asyncio.to_thread(df.to_csv, index=False)
+    return Response(
+        content=csv,
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="{file_id}_cleaned.csv"'},
+    )
+
+
 @router.get("/results/{file_id}")
-async def get_results(file_id: str):
+async def get_results(file_id: str, request: Request):
     """Retrieve cached analysis results for a file."""
-    if file_id not in _results_cache:
+    entry = _get_entry(file_id)
+    if entry is None:
         raise HTTPException(status_code=404, detail="No results found. Run analysis first.")
-    return _results_cache[file_id]
+    return not_modified(request, entry["etag"]) or Response(
+        content=entry["body"], media_type="application/json", headers=_etag_headers(entry["etag"]),
+    )
+
+
+class InsightBatchRequest(BaseModel):
+    file_ids: list[str]
+
+
+# Declared before /insights/{file_id} so "batch" isn't taken for a file id
+@router.post("/insights/batch")
+async def get_insights_batch(request: InsightBatchRequest):
+    """
+    Insights for several analyzed files at once, in request order.
+
+    Reports that aren't cached are written by one combined Gemini call
+    (see generate_insights_batch) instead of one call per file.
+    """
+    items = []
+    for file_id in request.file_ids:
+        cached = _cached_results(file_id)
+        forecasts = cached.get("forecasts", [])
+        items.append({
+            "analysis_results": cached.get("analysis", {}),
+            "anomaly_results": cached.get("anomalies", {}),
+            "forecast_results": forecasts if isinstance(forecasts, list) else [],
+            "file_id": file_id,
+        })
+
+    try:
+        results = await generate_insights_batch(items)
+        return json_response({"results": dict(zip(request.file_ids, results))})
+
+    except Exception as e:
+        logger.exception("Batch insight generation failed")
+        raise HTTPException(status_code=500, detail=f"Insight generation failed: {str(e)}")
 
 
 @router.post("/insights/{file_id}")
@@ -158,13 +430,7 @@ async def get_insights(file_id: str):
       - Anomalies & Concerns
       - Recommendations
     """
-    if file_id not in _results_cache:
-        raise HTTPException(
-            status_code=404,
-            detail="No analysis results found. Run /run/{file_id} first.",
-        )
-
-    cached = _results_cache[file_id]
+    cached = _cached_results(file_id)
     analysis = cached.get("analysis", {})
     anomalies = cached.get("anomalies", {})
     forecasts = cached.get("forecasts", [])
@@ -174,9 +440,41 @@ async def get_insights(file_id: str):
             analysis_results=analysis,
             anomaly_results=anomalies,
             forecast_results=forecasts if isinstance(forecasts, list) else [],
+            file_id=file_id,
         )
-        return _make_json_safe(result)
+        return json_response(result)
 
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Insight generation failed: {str(e)}")
+
+
+@router.post("/insights/{file_id}/stream")
+async def stream_insights_endpoint(file_id: str):
+    """
+    Streaming variant of /insights/{file_id}.
+
+    Returns newline-delimited JSON events so the UI can show each report
+    section as soon as Gemini finishes writing it:
+        {"section": "...", "content": "..."}  — one completed section
+        {"result": {...}}                     — the full insight payload (last line)
+    """
+    cached = _cached_results(file_id)
+    analysis = cached.get("analysis", {})
+    anomalies = cached.get("anomalies", {})
+    forecasts = cached.get("forecasts", [])
+
+    async def events():
+        try:
+            async for event in stream_insights(
+                analysis_results=analysis,
+                anomaly_results=anomalies,
+                forecast_results=forecasts if isinstance(forecasts, list) else [],
+                file_id=file_id,
+            ):
+                yield json_dumps(event) + b"\n"
+        except Exception as e:
+            logger.exception("Streaming insight generation failed for %s", file_id)
+            yield json_dumps({"result": {"error": f"Insight generation failed: {str(e)}"}}) + b"\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
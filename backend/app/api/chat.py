@@ -6,13 +6,18 @@ The Google ADK agent interprets the question and returns answers.
 Supports multi-turn conversations with history context.
 """
 
-import traceback
+import logging
+from functools import lru_cache
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, List
 
-from ..agent.bi_agent import run_agent_query
-from .analysis import get_cached_data
+from ..agent.bi_agent import run_agent_query, stream_agent_query
+from ..core.analyzer import ColumnTypes
+from .analysis import get_cached_data, get_column_types, json_dumps
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -37,25 +42,44 @@ class ChatResponse(BaseModel):
     suggestions: list = []
 
 
-def _build_suggestions(df, analysis: dict) -> list:
-    """Generate contextual question suggestions based on the data."""
-    suggestions = [
-        "What are the key insights from this dataset?",
-        "Are there any anomalies or outliers?",
-        "Summarize the main trends.",
-    ]
+_BASE_SUGGESTIONS = (
+    "What are the key insights from this dataset?",
+    "Are there any anomalies or outliers?",
+    "Summarize the main trends.",
+)
 
-    numeric_cols = df.select_dtypes(include=["number"]).columns.tolist()
-    cat_cols = df.select_dtypes(include=["object", "category"]).columns.tolist()
 
+@lru_cache(maxsize=256)
+def _suggestions_for(numeric_cols: tuple, cat_cols: tuple) -> tuple:
+    """Suggestions depend only on the leading column names, so they're memoized on those."""
+    suggestions = list(_BASE_SUGGESTIONS)
     if numeric_cols:
         suggestions.append(f"What is the distribution of {numeric_cols[0]}?")
     if len(numeric_cols) >= 2:
         suggestions.append(f"How are {numeric_cols[0]} and {numeric_cols[1]} correlated?")
     if cat_cols and numeric_cols:
         suggestions.append(f"Break down {numeric_cols[0]} by {cat_cols[0]}.")
+    return tuple(suggestions[:6])
+
+
+def _build_suggestions(col_types: ColumnTypes | None) -> list:
+    """Generate contextual question suggestions based on the data."""
+    if col_types is None:
+        return list(_BASE_SUGGESTIONS)
+    return list(_suggestions_for(tuple(col_types.numeric[:2]), tuple(col_types.categorical[:1])))
+
 
-    return suggestions[:6]
+def _question_with_history(request: ChatRequest) -> str:
+    """Append the last few conversation turns to the question as context."""
+    question = request.question
+    if request.history and len(request.history) > 0:
+        recent = request.history[-6:]  # last 3 exchanges
+        history_context = "\n\nConversation context:\n"
+        for msg in recent:
+            prefix = "User" if msg.role == "user" else "Assistant"
+            history_context += f"{prefix}: {msg.content[:300]}\n"
+        question = f"{question}\n{history_context}"
+    return question
 
 
 @router.post("/ask", response_model=ChatResponse)
@@ -87,17 +111,7 @@ async def ask_question(request: ChatRequest):
         anomalies = results.get("anomalies", {})
 
         # Build context from conversation history
-        history_context = ""
-        if request.history and len(request.history) > 0:
-            recent = request.history[-6:]  # last 3 exchanges
-            history_context = "\n\nConversation context:\n"
-            for msg in recent:
-                prefix = "User" if msg.role == "user" else "Assistant"
-                history_context += f"{prefix}: {msg.content[:300]}\n"
-
-        question = request.question
-        if history_context:
-            question = f"{question}\n{history_context}"
+        question = _question_with_history(request)
 
         result = await run_agent_query(
             df=df,
@@ -108,7 +122,7 @@ async def ask_question(request: ChatRequest):
             session_id=request.session_id,
         )
 
-        suggestions = _build_suggestions(df, analysis) if not result.get("error") else []
+        suggestions = _build_suggestions(get_column_types(request.file_id)) if not result.get("error") else []
 
         return ChatResponse(
             answer=result["answer"],
@@ -119,10 +133,60 @@ async def ask_question(request: ChatRequest):
         )
 
     except Exception as e:
-        traceback.print_exc()
+        logger.exception("Chat failed for %s", request.file_id)
         raise HTTPException(status_code=500, detail=f"Chat failed: {str(e)}")
 
 
+@router.post("/ask/stream")
+async def ask_question_stream(request: ChatRequest):
+    """
+    Streaming variant of /ask.
+
+    Returns newline-delimited JSON events so the UI can render the answer
+    as it is generated:
+        {"delta": "..."}   — a piece of answer text
+        {"result": {...}}  — the final ChatResponse payload (last line)
+    """
+    df, results = get_cached_data(request.file_id)
+
+    if df is None or results is None:
+        raise HTTPException(
+            status_code=404,
+            detail="No analysis results found. Please run analysis first.",
+        )
+
+    analysis = results.get("analysis", {})
+    anomalies = results.get("anomalies", {})
+    question = _question_with_history(request)
+
+    async def events():
+        try:
+            async for event in stream_agent_query(
+                df=df,
+                analysis_results=analysis,
+                anomaly_results=anomalies,
+                file_id=request.file_id,
+                question=question,
+                session_id=request.session_id,
+            ):
+                if "result" in event:
+                    result = event["result"]
+                    suggestions = _build_suggestions(get_column_types(request.file_id)) if not result.get("error") else []
+                    event = {"result": ChatResponse(
+                        answer=result["answer"],
+                        tool_calls=result.get("tool_calls", []),
+                        session_id=result.get("session_id"),
+                        error=result.get("error", False),
+                        suggestions=suggestions,
+                    ).model_dump()}
+                yield json_dumps(event) + b"\n"
+        except Exception as e:
+            logger.exception("Streaming chat failed for %s", request.file_id)
+            yield json_dumps({"result": {"answer": f"Chat failed: {str(e)}", "error": True}}) + b"\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
 @router.get("/suggestions/{file_id}")
 async def get_suggestions(file_id: str):
     """Get contextual question suggestions for a dataset."""
@@ -134,5 +198,4 @@ async def get_suggestions(file_id: str):
             "Summarize the main trends.",
         ]}
 
-    analysis = results.get("analysis", {})
-    return {"suggestions": _build_suggestions(df, analysis)}
+    return {"suggestions": _build_suggestions(get_column_types(file_id))}
@@ -6,16 +6,38 @@ Charts are Plotly JSON objects that the frontend renders with react-plotly.js.
 """
 
 import traceback
-from fastapi import APIRouter, HTTPException
+from typing import Callable
 
-from .analysis import get_cached_data, _make_json_safe
+from cachetools import LRUCache
+from fastapi import APIRouter, HTTPException, Request
+
+from .analysis import get_cached_data, get_column_types, get_etag, json_dumps, json_response, not_modified
 from ..core.chart_generator import generate_all_charts, generate_dashboard_summary
 
 router = APIRouter()
 
+# ── Payload cache ────────────────────────────────────────────
+# Charts and the summary are pure functions of one analysis run, so their
+# serialized bytes are kept keyed by (file_id, ETag). A re-run changes the
+# ETag, which retires the old payloads without explicit invalidation.
+_payload_cache = LRUCache(maxsize=64 * 2**20, getsizeof=len)
+
+
+def _cached_payload(kind: str, file_id: str, etag: str | None, build: Callable[[], object]) -> bytes:
+    key = (kind, file_id, etag)
+    if etag is not None and (body := _payload_cache.get(key)) is not None:
+        return body
+    body = json_dumps(build())
+    if etag is not None:
+        try:
+            _payload_cache[key] = body
+        except ValueError:  # single payload larger than the whole cache
+            pass
+    return body
+
 
 @router.get("/summary/{file_id}")
-async def get_dashboard_summary(file_id: str):
+async def get_dashboard_summary(file_id: str, request: Request):
     """
     Get KPI summary cards for the dashboard header.
 
@@ -29,18 +51,22 @@ async def get_dashboard_summary(file_id: str):
             detail="No analysis results found. Run analysis first.",
         )
 
+    etag = get_etag(file_id)
+    if (cached := not_modified(request, etag)) is not None:
+        return cached
+
     try:
         analysis = results.get("analysis", {})
         anomalies = results.get("anomalies", {})
         forecasts = results.get("forecasts")
 
-        summary = generate_dashboard_summary(
+        body = _cached_payload("summary", file_id, etag, lambda: generate_dashboard_summary(
             df=df,
             analysis=analysis,
             anomalies=anomalies,
             forecasts=forecasts if isinstance(forecasts, list) else None,
-        )
-        return _make_json_safe(summary)
+        ))
+        return json_response(body, etag)
 
     except Exception as e:
         traceback.print_exc()
@@ -48,7 +74,7 @@ async def get_dashboard_summary(file_id: str):
 
 
 @router.get("/charts/{file_id}")
-async def get_charts(file_id: str):
+async def get_charts(file_id: str, request: Request):
     """
     Get all Plotly chart configurations for the frontend to render.
 
@@ -61,16 +87,24 @@ async def get_charts(file_id: str):
             detail="No analysis results found. Run analysis first.",
         )
 
+    etag = get_etag(file_id)
+    if (cached := not_modified(request, etag)) is not None:
+        return cached
+
     try:
         analysis = results.get("analysis", {})
         anomalies = results.get("anomalies", {})
 
-        charts = generate_all_charts(
-            df=df,
-            analysis=analysis,
-            anomalies=anomalies,
-        )
-        return _make_json_safe({"charts": charts, "count": len(charts)})
+        def build():
+            charts = generate_all_charts(
+                df=df,
+                analysis=analysis,
+                anomalies=anomalies,
+                col_types=get_column_types(file_id),
+            )
+            return {"charts": charts, "count": len(charts)}
+
+        return json_response(_cached_payload("charts", file_id, etag, build), etag)
 
     except Exception as e:
         traceback.print_exc()
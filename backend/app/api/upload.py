@@ -7,11 +7,18 @@ Saves the file, parses it, profiles the data, and returns a rich preview.
 
 from fastapi import APIRouter, UploadFile, File, HTTPException, Query
 from app.config import settings
+from app.agent.bi_agent import invalidate_file
+from app.agent.insight_generator import invalidate_prompt_inputs
+import asyncio
 import os
 import uuid
 
+import numpy as np
+
 router = APIRouter()
 
+_UPLOAD_CHUNK_BYTES = 1024 * 1024
+
 
 @router.post("/")
 async def upload_file(file: UploadFile = File(...)):
@@ -39,20 +46,26 @@ async def upload_file(file: UploadFile = File(...)):
     file_id = str(uuid.uuid4())[:8]
     save_path = os.path.join(settings.UPLOAD_DIR, f"{file_id}{ext}")
 
-    # Save the file to disk
+    # Stream the upload to disk in chunks — memory stays at one chunk, and
+    # the writes run off the event loop so other requests aren't stalled
     os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
-    contents = await file.read()
+    max_bytes = settings.MAX_FILE_SIZE_MB * 1024 * 1024
+    size = 0
+    with open(save_path, "wb") as f:
+        while chunk := await file.read(_UPLOAD_CHUNK_BYTES):
+            size += len(chunk)
+            if size > max_bytes:
+                break
+            await asyncio.to_thread(f.write, chunk)
 
     # Check file size
-    size_mb = round(len(contents) / (1024 * 1024), 2)
-    if size_mb > settings.MAX_FILE_SIZE_MB:
+    if size > max_bytes:
+        os.remove(save_path)
         raise HTTPException(
             status_code=400,
-            detail=f"File too large ({size_mb} MB). Maximum allowed: {settings.MAX_FILE_SIZE_MB} MB",
+            detail=f"File too large. Maximum allowed: {settings.MAX_FILE_SIZE_MB} MB",
         )
-
-    with open(save_path, "wb") as f:
-        f.write(contents)
+    size_mb = round(size / (1024 * 1024), 2)
 
     # Parse and profile the file
     from app.core.file_parser import parse_file, profile_dataframe, get_sheet_names
@@ -68,29 +81,17 @@ async def upload_file(file: UploadFile = File(...)):
         raise HTTPException(status_code=400, detail=f"Failed to parse file: {str(e)}")
 
     # Build preview — convert to JSON-safe format
-    import numpy as np
-    import math
-
     preview_df = df.head(10).copy()
     # Convert datetime columns to strings for JSON serialization
     for col in preview_df.select_dtypes(include=["datetime64"]).columns:
         preview_df[col] = preview_df[col].astype(str)
 
-    # Convert to records and sanitize NaN/Inf values (not JSON-compliant)
+    # NaN/Inf aren't JSON-compliant: Inf -> NaN, then every missing cell -> None.
+    # The object cast also turns numpy scalars into plain Python numbers.
+    num_cols = preview_df.select_dtypes(include="number").columns
+    preview_df[num_cols] = preview_df[num_cols].replace([np.inf, -np.inf], np.nan)
+    preview_df = preview_df.astype(object).where(preview_df.notna(), None)
     preview_records = preview_df.to_dict(orient="records")
-    for row in preview_records:
-        for key, val in row.items():
-            if val is None:
-                continue
-            if isinstance(val, float) and (math.isnan(val) or math.isinf(val)):
-                row[key] = None
-            elif isinstance(val, (np.integer,)):
-                row[key] = int(val)
-            elif isinstance(val, (np.floating,)):
-                if np.isnan(val) or np.isinf(val):
-                    row[key] = None
-                else:
-                    row[key] = float(val)
 
     return {
         "file_id": file_id,
@@ -128,6 +129,8 @@ async def delete_upload(file_id: str):
     try:
         path = get_file_path(file_id, settings.UPLOAD_DIR)
         os.remove(path)
+        invalidate_file(file_id)
+        invalidate_prompt_inputs(file_id)
         return {"status": "deleted", "file_id": file_id}
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail=f"File not found: {file_id}")
@@ -24,6 +24,22 @@ class Settings(BaseSettings):
     # ── Google ADK / Gemini ──────────────────────────────────
     GOOGLE_API_KEY: str = ""          # Your Gemini API key
     GEMINI_MODEL: str = "gemini-2.5-flash"  # 2.5-flash has better free-tier quota
+    PROMPT_COMPRESSION: bool = True   # Send rule-compressed prompts (fewer input tokens)
+
+    # ── Chat Agent Cache ─────────────────────────────────────
+    AGENT_SEMANTIC_CACHE: bool = True       # Reuse answers for paraphrased questions
+    AGENT_EMBED_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"
+    AGENT_SEMANTIC_THRESHOLD: float = 0.92  # Min cosine similarity for a cache hit
+    AGENT_CACHE_FILE: str = "data/llm_cache.json"  # Persisted on shutdown
+    AGENT_CACHE_DIR: str = ""               # diskcache dir shared by all workers ("" = per-process)
+    AGENT_FAST_PATH: bool = True            # Answer short generic questions locally, skipping Gemini
+
+    # ── Insight Cache ────────────────────────────────────────
+    INSIGHT_SEMANTIC_CACHE: bool = False    # Reuse reports for near-identical re-analyses of the same file (one embed call per miss)
+    INSIGHT_EMBED_MODEL: str = "text-embedding-004"
+    INSIGHT_SEMANTIC_THRESHOLD: float = 0.92  # Min cosine similarity for a cache hit
+    INSIGHT_STRUCTURED_OUTPUT: bool = True  # Ask Gemini for JSON sections instead of Markdown
+    INSIGHT_CACHE_FILE: str = "data/insight_cache.json"  # Persisted on shutdown
 
     # ── CORS (frontend URLs allowed to call this backend) ────
     CORS_ORIGINS: List[str] = [
@@ -37,6 +53,9 @@ class Settings(BaseSettings):
     UPLOAD_DIR: str = "uploads"
     OUTPUT_DIR: str = "outputs"
     MAX_FILE_SIZE_MB: int = 50
+    USE_PYARROW_CSV: bool = True      # Parse CSVs with pyarrow's multi-threaded reader when installed
+    ANALYSIS_CACHE_MB: int = 1024     # Memory budget for analyzed files (least recently used evicted)
+    ANALYSIS_CACHE_DIR: str = ""      # diskcache dir shared by all workers ("" = per-process only)
 
     class Config:
         env_file = ".env"
@@ -5,125 +5,191 @@ Performs automated analysis on cleaned data:
   - Descriptive statistics (mean, median, std, quartiles, etc.)
   - Correlation analysis (Pearson + strength classification)
   - Trend detection (linear regression on time-series)
-  - Distribution analysis (skewness, kurtosis, normality test)
+  - Distribution analysis (skewness, kurtosis, D'Agostino-Pearson normality test)
   - Categorical column profiling
   - Feature importance ranking (mutual information)
   - Segment analysis (group-by stats for top categorical columns)
 """
 
+import warnings
+from typing import NamedTuple
+
 import pandas as pd
 import numpy as np
+from joblib import Parallel, delayed
 from scipy import stats as sp_stats
 from sklearn.feature_selection import mutual_info_regression
 
+MI_SAMPLE_ROWS = 5000  # rows used for the mutual-information feature ranking
+PARALLEL_MIN_COLS = 4  # narrower tables aren't worth the thread-pool overhead
+SHAPIRO_MAX_ROWS = 5000  # Shapiro-Wilk up to this size; D'Agostino's test (batched) above
+
+
+class ColumnTypes(NamedTuple):
+    """Column names grouped by dtype — computed once per cleaned DataFrame."""
+    numeric: list
+    categorical: list
+    datetime: list
+
+
+def _dtype_group(dt) -> str | None:
+    if dt.kind in "iufcm":
+        return "numeric"
+    if isinstance(dt, np.dtype):
+        return {"O": "categorical", "M": "datetime"}.get(dt.kind)
+    return "categorical" if isinstance(dt, pd.CategoricalDtype) else None
+
 
-def run_analysis(df: pd.DataFrame) -> dict:
+def column_types(df: pd.DataFrame) -> ColumnTypes:
+    """Scan the DataFrame's dtypes once and group its columns.
+
+    Each distinct dtype is classified once, instead of three select_dtypes
+    calls; the groups match select_dtypes(np.number), (["object", "category"])
+    and (["datetime64"]) exactly — timedelta counts as numeric, bool doesn't,
+    and tz-aware datetimes, string and period dtypes fall in no group.
+    """
+    dtypes = df.dtypes
+    group_of = {dt: _dtype_group(dt) for dt in set(dtypes.tolist())}
+    groups = {"numeric": [], "categorical": [], "datetime": [], None: []}
+    for col, dt in zip(dtypes.index.tolist(), dtypes.tolist()):
+        groups[group_of[dt]].append(col)
+    return ColumnTypes(groups["numeric"], groups["categorical"], groups["datetime"])
+
+
+def run_analysis(df: pd.DataFrame, col_types: ColumnTypes | None = None) -> dict:
     """
     Run comprehensive statistical analysis on a cleaned DataFrame.
 
+    Args:
+        df: cleaned DataFrame
+        col_types: precomputed column_types(df); computed here if omitted
+
     Returns:
         dict with analysis results organized by category.
     """
     results = {}
 
-    numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
-    cat_cols = df.select_dtypes(include=["object", "category"]).columns.tolist()
-    datetime_cols = df.select_dtypes(include=["datetime64"]).columns.tolist()
+    numeric_cols, cat_cols, datetime_cols = col_types or column_types(df)
 
     # 1. Descriptive Statistics
+    # One describe() over all numeric columns (NaNs skipped natively); the
+    # derived range/IQR/CV are computed column-wise on the resulting arrays.
     if numeric_cols:
-        desc_rows = {}
-        for col in numeric_cols:
-            s = df[col].dropna()
-            desc_rows[col] = {
-                "count": int(s.count()),
-                "mean": round(float(s.mean()), 4),
-                "std": round(float(s.std()), 4),
-                "min": round(float(s.min()), 4),
-                "q1": round(float(s.quantile(0.25)), 4),
-                "median": round(float(s.median()), 4),
-                "q3": round(float(s.quantile(0.75)), 4),
-                "max": round(float(s.max()), 4),
-                "range": round(float(s.max() - s.min()), 4),
-                "iqr": round(float(s.quantile(0.75) - s.quantile(0.25)), 4),
-                "cv": round(float(s.std() / s.mean()), 4) if s.mean() != 0 else None,
+        desc = df[numeric_cols].describe().T
+        mean = desc["mean"].to_numpy(dtype=float)
+        std = desc["std"].to_numpy(dtype=float)
+        lo, q1, med, q3, hi = (desc[k].to_numpy(dtype=float) for k in ("min", "25%", "50%", "75%", "max"))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cv = np.round(std / mean, 4)
+        table = np.round(np.column_stack([mean, std, lo, q1, med, q3, hi, hi - lo, q3 - q1]), 4)
+        counts = desc["count"].astype(int).tolist()
+
+        results["descriptive_stats"] = {
+            col: {
+                "count": n,
+                "mean": m, "std": sd, "min": mn, "q1": a, "median": md, "q3": b, "max": mx,
+                "range": rg, "iqr": iq,
+                "cv": c if m_raw != 0 else None,
             }
-        results["descriptive_stats"] = desc_rows
+            for col, n, (m, sd, mn, a, md, b, mx, rg, iq), c, m_raw
+            in zip(numeric_cols, counts, table.tolist(), cv.tolist(), mean.tolist())
+        }
 
     # 2. Correlation Matrix
     if len(numeric_cols) >= 2:
-        corr_matrix = df[numeric_cols].corr()
+        C = _corr_matrix(df, numeric_cols)
         results["correlation_matrix"] = {
-            col: {col2: round(float(v), 4) for col2, v in row.items()}
-            for col, row in corr_matrix.to_dict().items()
+            col: dict(zip(numeric_cols, row))
+            for col, row in zip(numeric_cols, np.round(C, 4).tolist())
         }
 
-        strong = []
-        for i in range(len(numeric_cols)):
-            for j in range(i + 1, len(numeric_cols)):
-                r = corr_matrix.iloc[i, j]
-                if abs(r) > 0.7:
-                    abs_r = abs(r)
-                    strength = (
-                        "very_strong" if abs_r > 0.9
-                        else "strong" if abs_r > 0.7
-                        else "moderate"
-                    )
-                    strong.append({
-                        "col_a": numeric_cols[i],
-                        "col_b": numeric_cols[j],
-                        "correlation": round(float(r), 4),
-                        "strength": strength,
-                        "direction": "positive" if r > 0 else "negative",
-                    })
-        strong.sort(key=lambda x: abs(x["correlation"]), reverse=True)
+        # All upper-triangle pairs at once; only |r| > 0.7 survive the mask
+        iu, ju = np.triu_indices(C.shape[0], k=1)
+        r = C[iu, ju]
+        keep = np.abs(r) > 0.7
+        iu, ju, r = iu[keep], ju[keep], np.round(r[keep], 4)
+        order = np.argsort(-np.abs(r), kind="stable")
+        strength = np.where(np.abs(r) > 0.9, "very_strong", "strong")
+        direction = np.where(r > 0, "positive", "negative")
+        strong = [
+            {
+                "col_a": numeric_cols[iu[k]],
+                "col_b": numeric_cols[ju[k]],
+                "correlation": float(r[k]),
+                "strength": str(strength[k]),
+                "direction": str(direction[k]),
+            }
+            for k in order
+        ]
         results["strong_correlations"] = strong
 
     # 3. Distribution Analysis
+    # Skew/kurtosis come from one pandas reduction per statistic.
     distributions = {}
-    for col in numeric_cols:
-        s = df[col].dropna()
-        if len(s) < 8:
-            continue
-        skew = float(s.skew())
-        kurt = float(s.kurtosis())
-
-        sample = s.sample(min(5000, len(s)), random_state=42)
-        try:
-            _, p_val = sp_stats.shapiro(sample)
-            is_normal = p_val > 0.05
-        except Exception:
-            p_val = None
-            is_normal = abs(skew) < 1
-
-        if abs(skew) < 0.5:
-            shape = "symmetric"
-        elif skew > 0:
-            shape = "right_skewed"
-        else:
-            shape = "left_skewed"
-
-        distributions[col] = {
-            "skewness": round(skew, 4),
-            "kurtosis": round(kurt, 4),
-            "shapiro_p": round(float(p_val), 6) if p_val is not None else None,
-            "is_normal": is_normal,
-            "shape": shape,
-        }
+    counts = df[numeric_cols].count()
+    dist_cols = [c for c in numeric_cols if counts[c] >= 8]
+    if dist_cols:
+        sub = df[dist_cols]
+        skews = sub.skew().to_numpy(dtype=float)
+        kurts = sub.kurt().to_numpy(dtype=float)
+
+        # Shapiro-Wilk per column where it is reliable (small n, discrete
+        # values); D'Agostino's K² is only trusted on large columns, where it
+        # runs once over a shared sample for all of them
+        p_vals = np.full(len(dist_cols), np.nan)
+        tests = np.where(counts[dist_cols].to_numpy() <= SHAPIRO_MAX_ROWS, "shapiro", "dagostino")
+        with np.errstate(all="ignore"), warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            large = []
+            for j, col in enumerate(dist_cols):
+                if tests[j] == "dagostino":
+                    large.append(j)
+                    continue
+                try:
+                    p_vals[j] = sp_stats.shapiro(sub[col].dropna().to_numpy(dtype=float))[1]
+                except Exception:
+                    pass
+            if large:
+                big = sub.iloc[:, large]
+                sample = big.sample(SHAPIRO_MAX_ROWS, random_state=42).to_numpy(dtype=float, na_value=np.nan)
+                try:
+                    _, big_p = sp_stats.normaltest(
+                        sample, axis=0,
+                        nan_policy="omit" if np.isnan(sample).any() else "propagate",
+                    )
+                    p_vals[large] = np.asarray(big_p, dtype=float)
+                except Exception:
+                    pass
+
+        shapes = np.select([np.abs(skews) < 0.5, skews > 0], ["symmetric", "right_skewed"], "left_skewed")
+        # Untestable columns (e.g. constant) fall back to a skew heuristic
+        is_normal = np.where(np.isnan(p_vals), np.abs(skews) < 1, p_vals > 0.05)
+        for col, skew, kurt, p_val, test, normal, shape in zip(
+            dist_cols, np.round(skews, 4).tolist(), np.round(kurts, 4).tolist(),
+            np.round(p_vals, 6).tolist(), tests.tolist(), is_normal.tolist(), shapes.tolist(),
+        ):
+            p_val = None if np.isnan(p_val) else p_val
+            distributions[col] = {
+                "skewness": skew,
+                "kurtosis": kurt,
+                "normality_p": p_val,
+                "normality_test": test,
+                "shapiro_p": p_val,  # pre-normality_p key, kept for API consumers
+                "is_normal": normal,
+                "shape": shape,
+            }
     results["distributions"] = distributions
 
     # 4. Categorical Column Summary
-    cat_summary = {}
-    for col in cat_cols:
-        vc = df[col].value_counts()
-        cat_summary[col] = {
-            "unique_count": int(df[col].nunique()),
-            "top_values": {str(k): int(v) for k, v in vc.head(10).items()},
-            "top_value": str(vc.index[0]) if len(vc) > 0 else None,
-            "top_freq": int(vc.iloc[0]) if len(vc) > 0 else 0,
-            "top_pct": round(float(vc.iloc[0] / len(df) * 100), 1) if len(vc) > 0 else 0,
-        }
-    results["categorical_summary"] = cat_summary
+    # Wide tables profile their columns on a thread pool — the hash-table
+    # builds behind value_counts run in Cython without the GIL.
+    if len(cat_cols) >= PARALLEL_MIN_COLS:
+        profiles = Parallel(n_jobs=-1, backend="threading")(
+            delayed(_cat_profile)(df[col], len(df)) for col in cat_cols
+        )
+    else:
+        profiles = [_cat_profile(df[col], len(df)) for col in cat_cols]
+    results["categorical_summary"] = dict(zip(cat_cols, profiles))
 
     # 5. Time-series Detection + Trends
     results["datetime_columns"] = datetime_cols
@@ -134,24 +200,35 @@ def run_analysis(df: pd.DataFrame) -> dict:
         date_col = datetime_cols[0]
         df_sorted = df.sort_values(date_col).dropna(subset=[date_col])
 
-        for col in numeric_cols[:8]:
-            s = df_sorted[col].dropna()
-            if len(s) < 4:
-                continue
-            x = np.arange(len(s))
-            y = s.values.astype(float)
-
-            slope, intercept, r_value, p_value, std_err = sp_stats.linregress(x, y)
-            trends[col] = {
-                "slope": round(float(slope), 6),
-                "r_squared": round(float(r_value ** 2), 4),
-                "p_value": round(float(p_value), 6),
-                "direction": "increasing" if slope > 0 else "decreasing",
-                "significant": p_value < 0.05,
-                "start_val": round(float(y[0]), 4),
-                "end_val": round(float(y[-1]), 4),
-                "pct_change": round(float((y[-1] - y[0]) / y[0] * 100), 2) if y[0] != 0 else None,
-            }
+        # One vectorized OLS over the first 8 numeric columns instead of a
+        # linregress call per column
+        trend_cols = numeric_cols[:8]
+        Y = df_sorted[trend_cols].to_numpy(dtype=float, na_value=np.nan)
+        if len(Y) >= 4:
+            fit = _batch_linregress(Y)
+            y0, y1 = fit["start"], fit["end"]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                pct = np.round((y1 - y0) / y0 * 100, 2)
+            # Every statistic is rounded once across all trend columns
+            rows = zip(
+                trend_cols, fit["n"].tolist(),
+                np.round(fit["slope"], 6).tolist(), (fit["slope"] > 0).tolist(), np.round(fit["r"] ** 2, 4).tolist(),
+                np.round(fit["p_value"], 6).tolist(), (fit["p_value"] < 0.05).tolist(),
+                np.round(y0, 4).tolist(), np.round(y1, 4).tolist(), pct.tolist(), (y0 != 0).tolist(),
+            )
+            for col, n, slope, rising, r2, p_value, significant, start, end, pct_change, has_base in rows:
+                if n < 4:
+                    continue
+                trends[col] = {
+                    "slope": slope,
+                    "r_squared": r2,
+                    "p_value": p_value,
+                    "direction": "increasing" if rising else "decreasing",
+                    "significant": significant,
+                    "start_val": start,
+                    "end_val": end,
+                    "pct_change": pct_change if has_base else None,
+                }
     results["trends"] = trends
 
     # 6. Feature Importance (Mutual Information)
@@ -170,6 +247,7 @@ def run_analysis(df: pd.DataFrame) -> dict:
     results["summary"] = {
         "total_rows": len(df),
         "total_columns": len(df.columns),
+        "missing_cells": int(df.size - df.count().sum()),
         "numeric_columns": len(numeric_cols),
         "categorical_columns": len(cat_cols),
         "datetime_columns": len(datetime_cols),
@@ -181,6 +259,81 @@ def run_analysis(df: pd.DataFrame) -> dict:
     return results
 
 
+def _cat_profile(s: pd.Series, n_rows: int) -> dict:
+    """Value-count profile of one categorical column."""
+    vc = s.value_counts()
+    return {
+        "unique_count": len(vc),  # value_counts drops NaN, same as nunique()
+        "top_values": {str(k): int(v) for k, v in vc.head(10).items()},
+        "top_value": str(vc.index[0]) if len(vc) > 0 else None,
+        "top_freq": int(vc.iloc[0]) if len(vc) > 0 else 0,
+        "top_pct": round(float(vc.iloc[0] / n_rows * 100), 1) if len(vc) > 0 else 0,
+    }
+
+
+def _corr_matrix(df: pd.DataFrame, cols: list) -> np.ndarray:
+    """Pearson correlation matrix of df[cols] (same values as df.corr()).
+
+    Cleaned numeric columns are normally NaN-free, so the matrix is one
+    float32 gemm over the standardized columns — half the memory traffic of
+    pandas' float64 pairwise loop. Centering and scaling happen in float64
+    first: a large column offset (e.g. ~1e7) would otherwise eat most of
+    float32's digits before the mean is removed. Columns that still contain
+    NaNs need pairwise-complete handling and fall back to pandas.
+    """
+    X = df[cols].to_numpy(dtype=np.float64, na_value=np.nan)
+    if np.isnan(X).any():
+        return df[cols].corr().to_numpy()
+
+    # Constant columns -> NaN, as in pandas. Tested on the raw values: the
+    # mean of n copies of 0.1 isn't exactly 0.1, so centering leaves dust
+    constant = X.min(axis=0) == X.max(axis=0)
+    X -= X.mean(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        X /= np.sqrt((X * X).sum(axis=0))
+        X[:, constant] = np.nan
+        Z = X.astype(np.float32)  # unit-norm columns: float32 keeps ~7 digits of r
+        C = (Z.T @ Z).astype(np.float64)
+    np.clip(C, -1.0, 1.0, out=C)
+    np.fill_diagonal(C, np.where(np.isnan(np.diag(C)), np.nan, 1.0))
+    return C
+
+
+def _batch_linregress(Y: np.ndarray) -> dict:
+    """sp_stats.linregress(arange(n), y) for every column of Y in one pass.
+
+    NaNs are dropped per column and x counts only the remaining values, the
+    same as calling linregress on each column after dropna().
+    """
+    valid = ~np.isnan(Y)
+    n = valid.sum(axis=0)
+    x = np.cumsum(valid, axis=0) - 1.0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        xm = (n - 1) / 2.0
+        ym = np.where(valid, Y, 0.0).sum(axis=0) / n
+        dx = np.where(valid, x - xm, 0.0)
+        dy = np.where(valid, Y - ym, 0.0)
+        sxx = (dx * dx).sum(axis=0)
+        syy = (dy * dy).sum(axis=0)
+        sxy = (dx * dy).sum(axis=0)
+
+        slope = sxy / sxx
+        r = np.where(sxx * syy == 0, 0.0, np.clip(sxy / np.sqrt(sxx * syy), -1.0, 1.0))
+        dof = n - 2
+        t = r * np.sqrt(dof / ((1.0 - r) * (1.0 + r)))
+        p_value = 2 * sp_stats.t.sf(np.abs(t), dof)
+
+    cols = np.arange(Y.shape[1])
+    return {
+        "n": n,
+        "slope": slope,
+        "r": r,
+        "p_value": p_value,
+        "start": Y[valid.argmax(axis=0), cols],
+        "end": Y[len(Y) - 1 - valid[::-1].argmax(axis=0), cols],
+    }
+
+
 def _compute_feature_importance(df, numeric_cols, cat_cols):
     """Rank feature importance using mutual information."""
     if len(numeric_cols) < 2:
@@ -191,48 +344,61 @@ def _compute_feature_importance(df, numeric_cols, cat_cols):
         if not feature_cols:
             return None
 
-        X = df[feature_cols].fillna(0)
-        y = df[target_col].fillna(0)
+        # The KNN-based MI estimate is stable on a few thousand rows, so fit on
+        # a fixed-seed subsample; float32 halves the neighbour-search traffic.
+        sub = df if len(df) <= MI_SAMPLE_ROWS else df.sample(MI_SAMPLE_ROWS, random_state=42)
+        X = sub[feature_cols].fillna(0).to_numpy(dtype=np.float32)
+        y = sub[target_col].fillna(0).to_numpy(dtype=np.float32)
 
-        mi_scores = mutual_info_regression(X, y, random_state=42)
+        mi_scores = mutual_info_regression(X, y, n_neighbors=3, copy=False, random_state=42)
 
-        importance = []
-        for col, score in sorted(zip(feature_cols, mi_scores), key=lambda x: x[1], reverse=True):
-            importance.append({
-                "feature": col,
-                "importance": round(float(score), 4),
-                "target": target_col,
-            })
-        return importance[:10]
+        order = np.argsort(-mi_scores, kind="stable")[:10]
+        rounded = np.round(mi_scores, 4)
+        return [
+            {"feature": feature_cols[i], "importance": float(rounded[i]), "target": target_col}
+            for i in order.tolist()
+        ]
     except Exception:
         return None
 
 
+_SEGMENT_SAMPLE_ROWS = 50_000
+
+
 def _segment_analysis(df, cat_cols, numeric_cols):
     """Group-by analysis: how do numeric columns differ across categories?"""
     segments = {}
+    # Cheap bail-out first: >20 distinct values in the head means the column
+    # is out; only the survivors get a full-column nunique.
+    nunique = df[cat_cols].head(_SEGMENT_SAMPLE_ROWS).nunique()
+    cat_cols = [c for c in cat_cols if nunique[c] <= 20]
+    if cat_cols and len(df) > _SEGMENT_SAMPLE_ROWS:
+        nunique = df[cat_cols].nunique()
+
     for cat_col in cat_cols:
-        if df[cat_col].nunique() > 20 or df[cat_col].nunique() < 2:
+        if not 2 <= nunique[cat_col] <= 20:
+            continue
+
+        # One groupby per category column covers every numeric column;
+        # stats are rounded for the whole frame at once
+        try:
+            g = df.groupby(cat_col, observed=True)[numeric_cols].agg(["mean", "median", "std", "count"]).round(4)
+        except Exception:
             continue
 
         seg = {}
         for num_col in numeric_cols:
-            try:
-                grouped = df.groupby(cat_col)[num_col].agg(["mean", "median", "std", "count"])
-                grouped = grouped.dropna()
-                if len(grouped) < 2:
-                    continue
-                seg[num_col] = {
-                    str(idx): {
-                        "mean": round(float(row["mean"]), 4),
-                        "median": round(float(row["median"]), 4),
-                        "std": round(float(row["std"]), 4) if not np.isnan(row["std"]) else 0,
-                        "count": int(row["count"]),
-                    }
-                    for idx, row in grouped.iterrows()
-                }
-            except Exception:
+            # Groups with any NaN stat (incl. single-row std) are left out
+            grouped = g[num_col].dropna()
+            if len(grouped) < 2:
                 continue
+            seg[num_col] = {
+                label: {"mean": mean, "median": median, "std": std, "count": int(count)}
+                for label, mean, median, std, count in zip(
+                    grouped.index.astype(str).tolist(),
+                    *(grouped[k].tolist() for k in ("mean", "median", "std", "count")),
+                )
+            }
 
         if seg:
             segments[cat_col] = seg
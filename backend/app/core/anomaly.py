@@ -10,7 +10,6 @@ Identifies unusual data points using multiple methods:
 import pandas as pd
 import numpy as np
 from sklearn.ensemble import IsolationForest
-from sklearn.preprocessing import StandardScaler
 
 
 def detect_anomalies(df: pd.DataFrame, columns: list = None, method: str = "all") -> dict:
@@ -39,13 +38,9 @@ def detect_anomalies(df: pd.DataFrame, columns: list = None, method: str = "all"
         "summary": {},
     }
 
-    # Per-column analysis (Z-score + IQR)
-    total_anomalies = 0
-    for col in numeric_cols:
-        col_result = _detect_column_anomalies(df[col], col, method)
-        if col_result:
-            results["per_column"][col] = col_result
-            total_anomalies += col_result.get("total_anomalies", 0)
+    # Per-column analysis (Z-score + IQR), all columns in one 2-D pass
+    results["per_column"] = _detect_column_anomalies(df, numeric_cols, method)
+    total_anomalies = sum(r["total_anomalies"] for r in results["per_column"].values())
 
     # Multi-variate Isolation Forest
     if method in ("all", "isolation_forest") and len(numeric_cols) >= 2:
@@ -70,79 +65,106 @@ def detect_anomalies(df: pd.DataFrame, columns: list = None, method: str = "all"
     return results
 
 
-def _detect_column_anomalies(series: pd.Series, col_name: str, method: str) -> dict | None:
-    """Detect anomalies in a single column using Z-score and/or IQR."""
-    s = series.dropna()
-    if len(s) < 10:
-        return None
+def _detect_column_anomalies(df: pd.DataFrame, numeric_cols: list, method: str) -> dict:
+    """Detect anomalies in every numeric column using Z-score and/or IQR.
 
-    result = {
-        "total_anomalies": 0,
-    }
+    Mean, std and quartiles are reductions over one (columns x rows) block,
+    and the z-score / IQR masks are single broadcasts over it; only the
+    reporting of the first 20 hits per column is a Python-level loop.
+    NaNs are masked rather than dropped, so row positions map straight back
+    to df.index.
+    """
+    block = df[numeric_cols].to_numpy(dtype=np.float64, na_value=np.nan).T
+    valid = ~np.isnan(block)
+    n = valid.sum(axis=1)
+    eligible = n >= 10
+    results = {col: {"total_anomalies": 0} for col, ok in zip(numeric_cols, eligible.tolist()) if ok}
+
+    # Constant columns (IDs, flags) can't have outliers by either method;
+    # one NaN-skipping min/max sweep drops them before mean/std/quartiles
+    keep = eligible & (np.fmin.reduce(block, axis=1) < np.fmax.reduce(block, axis=1))
+    if not keep.any():
+        return results
+    cols = [c for c, k in zip(numeric_cols, keep.tolist()) if k]
+    if not keep.all():
+        block, n = block[keep], n[keep]
+    has_nan = bool((n < block.shape[1]).any())
+    n = n.tolist()
+    labels = df.index
 
     # Z-score method
     if method in ("all", "zscore"):
-        mean = float(s.mean())
-        std = float(s.std())
-        if std > 0:
-            z_scores = ((s - mean) / std).abs()
-            z_anomalies = z_scores > 3  # 3 standard deviations
-            z_count = int(z_anomalies.sum())
-            z_indices = s[z_anomalies].index.tolist()[:20]  # limit to 20
-
-            # Get actual anomalous values
-            z_values = []
-            for idx in z_indices:
-                z_values.append({
-                    "index": int(idx),
-                    "value": round(float(s[idx]), 4),
-                    "z_score": round(float(z_scores[idx]), 2),
-                })
-
-            result["zscore"] = {
-                "count": z_count,
-                "pct": round(z_count / len(s) * 100, 2),
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = np.nanmean(block, axis=1) if has_nan else block.mean(axis=1)
+            std = np.nanstd(block, axis=1, ddof=1) if has_nan else block.std(axis=1, ddof=1)
+            # One scratch matrix, transformed in place: (x - mean) -> |.| -> / std
+            z_scores = block - mean[:, None]
+            np.abs(z_scores, out=z_scores)
+            z_scores /= std[:, None]
+        z_anomalies = z_scores > 3  # 3 standard deviations (NaN rows never match)
+        z_counts = np.count_nonzero(z_anomalies, axis=1).tolist()
+
+        for j, col in enumerate(cols):
+            if not std[j] > 0:
+                continue
+            hits = np.flatnonzero(z_anomalies[j])[:20]  # limit to 20
+            results[col]["zscore"] = {
+                "count": z_counts[j],
+                "pct": round(z_counts[j] / n[j] * 100, 2),
                 "threshold": 3.0,
-                "anomalies": z_values,
+                "anomalies": [
+                    {"index": int(idx), "value": value, "z_score": z}
+                    for idx, value, z in zip(
+                        labels[hits].tolist(), np.round(block[j, hits], 4).tolist(),
+                        np.round(z_scores[j, hits], 2).tolist(),
+                    )
+                ],
             }
-            result["total_anomalies"] += z_count
+            results[col]["total_anomalies"] += z_counts[j]
+        del z_scores, z_anomalies
 
     # IQR method
+    # Both quartiles for every column from one percentile call (same linear
+    # interpolation as Series.quantile). np.nanpercentile loops per column,
+    # so it's only used when some column actually has NaNs.
     if method in ("all", "iqr"):
-        q1 = float(s.quantile(0.25))
-        q3 = float(s.quantile(0.75))
+        if has_nan:
+            q1, q3 = np.nanpercentile(block, [25.0, 75.0], axis=1)
+        else:
+            q1, q3 = np.percentile(block, [25.0, 75.0], axis=1)
         iqr = q3 - q1
-
-        if iqr > 0:
-            lower = q1 - 1.5 * iqr
-            upper = q3 + 1.5 * iqr
-            iqr_mask = (s < lower) | (s > upper)
-            iqr_count = int(iqr_mask.sum())
-            iqr_indices = s[iqr_mask].index.tolist()[:20]
-
-            iqr_values = []
-            for idx in iqr_indices:
-                val = float(s[idx])
-                iqr_values.append({
-                    "index": int(idx),
-                    "value": round(val, 4),
-                    "deviation": "below" if val < lower else "above",
-                })
-
-            result["iqr"] = {
+        lower = q1 - 1.5 * iqr
+        upper = q3 + 1.5 * iqr
+        below = block < lower[:, None]
+        iqr_mask = block > upper[:, None]
+        iqr_mask |= below
+        iqr_counts = np.count_nonzero(iqr_mask, axis=1).tolist()
+
+        for j, col in enumerate(cols):
+            if not iqr[j] > 0:
+                continue
+            hits = np.flatnonzero(iqr_mask[j])[:20]
+            iqr_count = iqr_counts[j]
+            results[col]["iqr"] = {
                 "count": iqr_count,
-                "pct": round(iqr_count / len(s) * 100, 2),
-                "lower_bound": round(lower, 4),
-                "upper_bound": round(upper, 4),
-                "anomalies": iqr_values,
+                "pct": round(iqr_count / n[j] * 100, 2),
+                "lower_bound": round(float(lower[j]), 4),
+                "upper_bound": round(float(upper[j]), 4),
+                "anomalies": [
+                    {"index": int(idx), "value": value, "deviation": "below" if b else "above"}
+                    for idx, value, b in zip(
+                        labels[hits].tolist(), np.round(block[j, hits], 4).tolist(), below[j, hits].tolist(),
+                    )
+                ],
             }
             # Use max of zscore and iqr for total
+            result = results[col]
             if "zscore" in result:
                 result["total_anomalies"] = max(result["total_anomalies"], iqr_count)
             else:
                 result["total_anomalies"] += iqr_count
 
-    return result
+    return results
 
 
 def _isolation_forest(df: pd.DataFrame, numeric_cols: list) -> dict | None:
@@ -158,38 +180,56 @@ def _isolation_forest(df: pd.DataFrame, numeric_cols: list) -> dict | None:
         if len(X) < 20:
             return None
 
-        # Scale features
-        scaler = StandardScaler()
-        X_scaled = scaler.fit_transform(X)
+        # No scaling: split points are drawn uniformly within each feature's
+        # range, so the trees are invariant to per-feature affine transforms.
+        # The forest works in float32 internally, so convert once up front.
+        X_arr = X.to_numpy(dtype=np.float32)
 
         # Fit Isolation Forest
         contamination = min(0.1, max(0.01, 5.0 / len(X)))  # adaptive contamination
+        # 256-row subsamples per tree (sklearn's default, spelled out since
+        # it's what keeps the fit cheap on large frames)
         iso = IsolationForest(
-            contamination=contamination,
+            contamination="auto",
+            max_samples=min(256, len(X)),
             random_state=42,
             n_estimators=100,
+            n_jobs=-1,  # trees are built and scored in parallel
         )
-        predictions = iso.fit_predict(X_scaled)
-        scores = iso.decision_function(X_scaled)
-
-        # -1 = anomaly, 1 = normal
-        anomaly_mask = predictions == -1
+        iso.fit(X_arr)
+        # With a numeric contamination, fit() scores every row once to place
+        # offset_ and decision_function() scores them all again. Fitting with
+        # "auto" skips the first pass; the same percentile offset is applied
+        # here to the single set of scores, so labels and scores are unchanged.
+        raw_scores = iso.score_samples(X_arr)
+        scores = raw_scores - np.percentile(raw_scores, 100.0 * contamination)
+        anomaly_mask = scores < 0  # what predict() does
         anomaly_count = int(anomaly_mask.sum())
 
         # Get top anomalies (most anomalous first, by score)
         anomaly_indices = np.where(anomaly_mask)[0]
         anomaly_scores = scores[anomaly_mask]
-        sorted_idx = np.argsort(anomaly_scores)  # most negative = most anomalous
-
-        top_anomalies = []
-        for i in sorted_idx[:15]:  # top 15
-            row_idx = int(anomaly_indices[i])
-            row_data = {col: round(float(X.iloc[row_idx][col]), 4) for col in numeric_cols[:6]}
-            top_anomalies.append({
+        # Only the 15 most negative (most anomalous) scores are reported, so
+        # select them in O(n) and sort just those
+        k = min(15, anomaly_scores.size)
+        part = np.argpartition(anomaly_scores, k - 1)[:k] if k else np.empty(0, dtype=np.intp)
+        sorted_idx = part[np.argsort(anomaly_scores[part])]
+
+        # Pull the reported rows/columns out in one positional slice (in the
+        # original float64, not the forest's float32 copy)
+        top_idx = anomaly_indices[sorted_idx]
+        top_cols = numeric_cols[:6]
+        top_rows = np.round(X.iloc[top_idx, :len(top_cols)].to_numpy(dtype=np.float64), 4)
+        top_anomalies = [
+            {
                 "row_index": row_idx,
-                "anomaly_score": round(float(anomaly_scores[i]), 4),
-                "values": row_data,
-            })
+                "anomaly_score": score,
+                "values": dict(zip(top_cols, row)),
+            }
+            for row_idx, score, row in zip(
+                top_idx.tolist(), np.round(anomaly_scores[sorted_idx], 4).tolist(), top_rows.tolist(),
+            )
+        ]
 
         return {
             "anomaly_count": anomaly_count,
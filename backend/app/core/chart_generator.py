@@ -22,11 +22,17 @@ import math
 import numpy as np
 import pandas as pd
 
+from .analyzer import ColumnTypes, column_types
+
 
 # ──────────────────────────────────────────────────────────────────
 # Helpers
 # ──────────────────────────────────────────────────────────────────
 
+# Line/scatter traces longer than this are thinned by a fixed stride; the
+# chart is only ~1000px wide, so more points just cost payload and render time.
+MAX_CHART_POINTS = 10_000
+
 _PALETTE = [
     "#6366f1", "#8b5cf6", "#06b6d4", "#10b981", "#f59e0b",
     "#ef4444", "#ec4899", "#14b8a6", "#f97316", "#3b82f6",
@@ -53,28 +59,93 @@ def _safe(v):
     return v
 
 
+def _stride(n: int) -> slice:
+    """Every k-th row, with k chosen so at most MAX_CHART_POINTS remain."""
+    return slice(None, None, -(-n // MAX_CHART_POINTS) if n > MAX_CHART_POINTS else 1)
+
+
+def _dropna_list(df: pd.DataFrame, col: str, safe_vals: dict | None):
+    """JSON-safe non-null values of df[col], from safe_vals when precomputed."""
+    if safe_vals is not None and col in safe_vals:
+        return safe_vals[col]
+    return _safe_list(df[col].dropna())
+
+
 def _safe_list(series):
-    """Convert a pandas Series to a JSON-safe list."""
+    """Convert a pandas Series to JSON-safe values.
+
+    Finite float columns come back as a float32 ndarray rather than a list:
+    chart JSON is written by orjson (OPT_SERIALIZE_NUMPY), which encodes it
+    straight from the buffer with float32's shortest repr — no Python float
+    per point, and fewer digits on the wire than float64. Columns with
+    NaN/inf need None placeholders and stay lists.
+    """
+    arr = series.to_numpy()
+    if arr.dtype.kind in "fiub":
+        return _safe_array(arr)
     return [_safe(x) for x in series.tolist()]
 
 
+def _safe_array(arr: np.ndarray):
+    """_safe_list for a numeric ndarray."""
+    # Numeric columns skip the per-value _safe() dispatch: one rounding pass,
+    # with NaN/inf masked to None only if there are any
+    if arr.dtype.kind == "f":
+        finite = np.isfinite(arr)
+        if finite.all():
+            return arr.astype(np.float32)
+        arr = np.round(arr.astype(np.float64, copy=False), 6)
+        return np.where(finite, arr, None).tolist()
+    return arr.tolist()
+
+
+def _precompute_numeric(df: pd.DataFrame, numeric_cols: list) -> dict:
+    """JSON-safe non-null values for each column, shared by the builders.
+
+    Float columns are read as one (columns x rows) block with a single NaN
+    mask, instead of a dropna() copy per column; NaN-free rows are used
+    as-is. Integer columns can't hold NaN and keep their exact int values.
+    """
+    float_cols = [c for c in numeric_cols if df[c].dtype.kind == "f"]
+    safe_vals = {}
+    if float_cols:
+        block = df[float_cols].to_numpy(dtype=np.float64, na_value=np.nan).T
+        nan_mask = np.isnan(block)
+        has_nan = nan_mask.any(axis=1).tolist()
+        for j, col in enumerate(float_cols):
+            safe_vals[col] = _safe_array(block[j][~nan_mask[j]] if has_nan[j] else block[j])
+    return {
+        col: safe_vals[col] if col in safe_vals else _safe_list(df[col].dropna())
+        for col in numeric_cols
+    }
+
+
 # ──────────────────────────────────────────────────────────────────
 # Individual Chart Builders
 # ──────────────────────────────────────────────────────────────────
 
-def build_histogram(df: pd.DataFrame, col: str, color: str = "#6366f1") -> dict:
-    """Histogram for a single numeric column."""
-    vals = df[col].dropna()
+def build_histogram(df: pd.DataFrame, col: str, color: str = "#6366f1", safe_vals: dict | None = None) -> dict | None:
+    """Histogram for a single numeric column.
+
+    Binned here rather than by Plotly, so the payload is one bar per bin
+    instead of every raw value. Returns None when no finite value remains.
+    """
+    vals = np.asarray(_dropna_list(df, col, safe_vals), dtype=np.float64)
+    vals = vals[np.isfinite(vals)]  # ±inf arrive as None → NaN and break auto-ranging
+    if len(vals) == 0:
+        return None
+    counts, edges = np.histogram(vals, bins=min(30, max(10, len(vals) // 5)))
     return {
         "id": f"hist_{col}",
         "type": "histogram",
         "title": f"Distribution of {col}",
         "data": [
             {
-                "type": "histogram",
-                "x": _safe_list(vals),
+                "type": "bar",
+                "x": np.round((edges[:-1] + edges[1:]) / 2, 6).tolist(),
+                "y": counts.tolist(),
+                "width": float(edges[1] - edges[0]),
                 "marker": {"color": color, "opacity": 0.75},
-                "nbinsx": min(30, max(10, len(vals) // 5)),
                 "name": col,
             }
         ],
@@ -89,14 +160,13 @@ def build_histogram(df: pd.DataFrame, col: str, color: str = "#6366f1") -> dict:
     }
 
 
-def build_box_plots(df: pd.DataFrame, numeric_cols: list) -> dict:
+def build_box_plots(df: pd.DataFrame, numeric_cols: list, safe_vals: dict | None = None) -> dict:
     """Combined box plot for all numeric columns."""
     traces = []
     for i, col in enumerate(numeric_cols[:8]):
-        vals = df[col].dropna()
         traces.append({
             "type": "box",
-            "y": _safe_list(vals),
+            "y": _dropna_list(df, col, safe_vals),
             "name": col,
             "marker": {"color": _PALETTE[i % len(_PALETTE)]},
             "boxmean": True,
@@ -122,13 +192,11 @@ def build_correlation_heatmap(analysis: dict) -> dict | None:
     if not corr:
         return None
     cols = list(corr.keys())
-    z = []
-    for r in cols:
-        row = []
-        for c in cols:
-            val = corr.get(r, {}).get(c, 0)
-            row.append(_safe(val))
-        z.append(row)
+    # One float matrix (None -> NaN), then z and its text labels in bulk
+    M = np.array([[row.get(c, 0) for c in cols] for row in map(corr.get, cols)], dtype=np.float64)
+    finite = np.isfinite(M)
+    z = np.where(finite, np.round(M, 6), None).tolist()
+    text = np.where(finite, np.char.mod("%.2f", M), "").tolist()
 
     return {
         "id": "corr_heatmap",
@@ -144,7 +212,7 @@ def build_correlation_heatmap(analysis: dict) -> dict | None:
                 "zmin": -1,
                 "zmax": 1,
                 "reversescale": True,
-                "text": [[f"{v:.2f}" if v is not None else "" for v in row] for row in z],
+                "text": text,
                 "texttemplate": "%{text}",
                 "hovertemplate": "%{y} vs %{x}: %{z:.3f}<extra></extra>",
             }
@@ -167,6 +235,7 @@ def build_scatter_pairs(df: pd.DataFrame, analysis: dict) -> list:
         if a not in df.columns or b not in df.columns:
             continue
         sub = df[[a, b]].dropna()
+        sub = sub.iloc[_stride(len(sub))]
         charts.append({
             "id": f"scatter_{a}_{b}",
             "type": "scatter",
@@ -201,6 +270,7 @@ def build_trend_chart(df: pd.DataFrame, datetime_col: str, numeric_cols: list) -
     if datetime_col not in df.columns:
         return None
     sorted_df = df.sort_values(datetime_col)
+    sorted_df = sorted_df.iloc[_stride(len(sorted_df))]
     x_vals = _safe_list(sorted_df[datetime_col])
 
     traces = []
@@ -237,11 +307,25 @@ def build_trend_chart(df: pd.DataFrame, datetime_col: str, numeric_cols: list) -
     }
 
 
-def build_categorical_bars(df: pd.DataFrame, cat_cols: list) -> list:
+def _top_counts(df: pd.DataFrame, col: str, n: int, analysis: dict | None) -> tuple[list, list]:
+    """Labels and counts of the n most frequent values of df[col].
+
+    run_analysis already value-counted every categorical column and kept the
+    top 10, so that is reused when available instead of re-hashing the column.
+    """
+    top = ((analysis or {}).get("categorical_summary") or {}).get(col, {}).get("top_values")
+    if top is not None and n <= 10:
+        items = list(top.items())[:n]
+        return [k for k, _ in items], [int(v) for _, v in items]
+    vc = df[col].value_counts().head(n)
+    return [str(x) for x in vc.index.tolist()], vc.astype(int).tolist()
+
+
+def build_categorical_bars(df: pd.DataFrame, cat_cols: list, analysis: dict | None = None) -> list:
     """Bar charts for top values in categorical columns."""
     charts = []
     for i, col in enumerate(cat_cols[:4]):
-        vc = df[col].value_counts().head(10)
+        labels, counts = _top_counts(df, col, 10, analysis)
         charts.append({
             "id": f"cat_bar_{col}",
             "type": "bar",
@@ -249,8 +333,8 @@ def build_categorical_bars(df: pd.DataFrame, cat_cols: list) -> list:
             "data": [
                 {
                     "type": "bar",
-                    "x": [str(x) for x in vc.index.tolist()],
-                    "y": [int(v) for v in vc.values.tolist()],
+                    "x": labels,
+                    "y": counts,
                     "marker": {"color": _PALETTE[i % len(_PALETTE)], "opacity": 0.85},
                     "name": col,
                 }
@@ -266,9 +350,9 @@ def build_categorical_bars(df: pd.DataFrame, cat_cols: list) -> list:
     return charts
 
 
-def build_pie_chart(df: pd.DataFrame, col: str) -> dict:
+def build_pie_chart(df: pd.DataFrame, col: str, analysis: dict | None = None) -> dict:
     """Pie chart for a categorical column."""
-    vc = df[col].value_counts().head(8)
+    labels, counts = _top_counts(df, col, 8, analysis)
     return {
         "id": f"pie_{col}",
         "type": "pie",
@@ -276,10 +360,10 @@ def build_pie_chart(df: pd.DataFrame, col: str) -> dict:
         "data": [
             {
                 "type": "pie",
-                "labels": [str(x) for x in vc.index.tolist()],
-                "values": [int(v) for v in vc.values.tolist()],
+                "labels": labels,
+                "values": counts,
                 "hole": 0.4,
-                "marker": {"colors": _PALETTE[: len(vc)]},
+                "marker": {"colors": _PALETTE[: len(counts)]},
                 "textinfo": "percent+label",
             }
         ],
@@ -324,16 +408,14 @@ def build_feature_importance_bar(analysis: dict) -> dict | None:
     }
 
 
-def build_anomaly_overlay(df: pd.DataFrame, anomalies: dict) -> list:
+def build_anomaly_overlay(df: pd.DataFrame, anomalies: dict, safe_vals: dict | None = None) -> list:
     """Scatter charts with anomaly points highlighted."""
     per_col = anomalies.get("per_column", {})
     charts = []
     for i, (col, info) in enumerate(list(per_col.items())[:4]):
         if col not in df.columns:
             continue
-        vals = df[col].dropna()
-        x_all = list(range(len(vals)))
-        y_all = _safe_list(vals)
+        y_all = np.asarray(_dropna_list(df, col, safe_vals))
 
         # Collect anomaly indices
         anom_indices = set()
@@ -351,10 +433,17 @@ def build_anomaly_overlay(df: pd.DataFrame, anomalies: dict) -> list:
                 if idx is not None:
                     anom_indices.add(idx)
 
-        x_normal = [x for x in x_all if x not in anom_indices]
-        y_normal = [y_all[x] for x in x_normal]
-        x_anom = [x for x in x_all if x in anom_indices]
-        y_anom = [y_all[x] for x in x_anom]
+        # One boolean mask splits the points instead of a set lookup per row
+        is_anom = np.zeros(len(y_all), dtype=bool)
+        idxs = np.fromiter(anom_indices, dtype=np.int64, count=len(anom_indices))
+        is_anom[idxs[(idxs >= 0) & (idxs < len(y_all))]] = True
+        x_anom = np.flatnonzero(is_anom)
+        # Every anomaly is kept; only the normal background is thinned
+        x_normal = np.flatnonzero(~is_anom)
+        x_normal = x_normal[_stride(len(x_normal))]
+        y_normal, y_anom = y_all[x_normal], y_all[x_anom]
+        if y_all.dtype == object:  # None placeholders for inf; orjson can't take object arrays
+            y_normal, y_anom = y_normal.tolist(), y_anom.tolist()
 
         charts.append({
             "id": f"anomaly_{col}",
@@ -398,6 +487,7 @@ def generate_all_charts(
     df: pd.DataFrame,
     analysis: dict,
     anomalies: dict | None = None,
+    col_types: ColumnTypes | None = None,
 ) -> list[dict]:
     """
     Generate a comprehensive set of charts from the analysis results.
@@ -406,17 +496,21 @@ def generate_all_charts(
       id, type, title, data, layout
     """
     charts = []
-    numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
-    cat_cols = df.select_dtypes(include=["object", "category"]).columns.tolist()
-    datetime_cols = df.select_dtypes(include=["datetime64"]).columns.tolist()
+    numeric_cols, cat_cols, datetime_cols = col_types or column_types(df)
+
+    # Histograms, box plots and anomaly overlays all plot the same non-null
+    # values, so they're extracted once and shared
+    safe_vals = _precompute_numeric(df, numeric_cols[:8])
 
     # 1. Histograms for numeric columns (max 6)
     for i, col in enumerate(numeric_cols[:6]):
-        charts.append(build_histogram(df, col, _PALETTE[i % len(_PALETTE)]))
+        hist = build_histogram(df, col, _PALETTE[i % len(_PALETTE)], safe_vals)
+        if hist:
+            charts.append(hist)
 
     # 2. Box plots
     if numeric_cols:
-        charts.append(build_box_plots(df, numeric_cols))
+        charts.append(build_box_plots(df, numeric_cols, safe_vals))
 
     # 3. Correlation heatmap
     heatmap = build_correlation_heatmap(analysis)
@@ -433,11 +527,11 @@ def generate_all_charts(
             charts.append(trend)
 
     # 6. Categorical bar charts
-    charts.extend(build_categorical_bars(df, cat_cols))
+    charts.extend(build_categorical_bars(df, cat_cols, analysis))
 
     # 7. Pie chart for first categorical column
     if cat_cols:
-        charts.append(build_pie_chart(df, cat_cols[0]))
+        charts.append(build_pie_chart(df, cat_cols[0], analysis))
 
     # 8. Feature importance
     fi = build_feature_importance_bar(analysis)
@@ -446,7 +540,7 @@ def generate_all_charts(
 
     # 9. Anomaly overlays
     if anomalies:
-        charts.extend(build_anomaly_overlay(df, anomalies))
+        charts.extend(build_anomaly_overlay(df, anomalies, safe_vals))
 
     return charts
 
@@ -474,7 +568,11 @@ def generate_dashboard_summary(
 
     # Data quality = % non-missing cells
     total_cells = total_rows * total_cols
-    missing_cells = int(df.isnull().sum().sum()) if total_cells > 0 else 0
+    # Counted once by run_analysis; older cached results fall back to a
+    # per-column non-null count
+    missing_cells = summary.get("missing_cells")
+    if missing_cells is None:
+        missing_cells = int(total_cells - df.count().sum()) if total_cells > 0 else 0
     quality = round((1 - missing_cells / total_cells) * 100, 1) if total_cells > 0 else 100.0
 
     # Anomaly count
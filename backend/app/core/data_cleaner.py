@@ -16,9 +16,12 @@ explaining every change, so the user knows exactly what happened to their data.
 Key principle: Be transparent. Never silently modify data without telling the user.
 """
 
+import warnings
+from typing import Any
+
 import pandas as pd
 import numpy as np
-from typing import Any
+from pandas.tseries.api import guess_datetime_format
 
 
 # ── Step Functions ───────────────────────────────────────────────
@@ -55,9 +58,11 @@ def _step_remove_empty(df: pd.DataFrame, actions: list) -> pd.DataFrame:
 
 def _step_remove_duplicates(df: pd.DataFrame, actions: list) -> pd.DataFrame:
     """Step 2: Remove duplicate rows."""
-    dup_count = int(df.duplicated().sum())
+    # One hashing pass: the same mask gives the count and the rows to keep
+    duplicated = df.duplicated()
+    dup_count = int(duplicated.sum())
     if dup_count > 0:
-        df = df.drop_duplicates().reset_index(drop=True)
+        df = df[~duplicated.to_numpy()].reset_index(drop=True)
         actions.append({
             "step": "Remove duplicates",
             "severity": "warning" if dup_count > len(df) * 0.05 else "info",
@@ -117,54 +122,91 @@ def _step_standardize_columns(df: pd.DataFrame, actions: list) -> pd.DataFrame:
             "affected": 0,
         })
 
-    # Handle duplicated column names after standardizing
-    if df.columns.duplicated().any():
-        cols = pd.Series(df.columns)
-        for dup in cols[cols.duplicated()].unique():
-            idxs = cols[cols == dup].index.tolist()
-            for i, idx in enumerate(idxs[1:], start=2):
-                cols.iloc[idx] = f"{dup}_{i}"
-        df.columns = cols
+    # Handle duplicated column names after standardizing: the 2nd, 3rd, ...
+    # occurrence of a name gets _2, _3, ... in one pass over the names
+    if len(set(new_names)) < len(new_names):
+        seen = {}
+        deduped = []
+        for name in new_names:
+            seen[name] = k = seen.get(name, 0) + 1
+            deduped.append(name if k == 1 else f"{name}_{k}")
+        df.columns = deduped
         actions.append({
             "step": "Fix duplicate column names",
             "severity": "warning",
             "detail": "Some columns had the same name after standardizing. Added suffixes to disambiguate.",
-            "affected": int(df.columns.duplicated().sum()),
+            "affected": len(new_names) - len(seen),
         })
 
     return df
 
 
+# Type inference screens each text column on a sample first; only columns
+# whose sample clears the threshold (with some slack for sampling noise) pay
+# for a full-column conversion, which then decides against the real 80%.
+_TYPE_SAMPLE_ROWS = 1000
+_TYPE_SAMPLE_SLACK = 0.1
+
+
+def _parse_datetimes(s: pd.Series) -> pd.Series:
+    """pd.to_datetime(s, format="mixed") without per-value format inference.
+
+    The format is guessed once from the first value and the whole column is
+    parsed with it; only values that don't fit it fall back to mixed parsing.
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)
+        fmt = guess_datetime_format(str(s.iloc[0]), dayfirst=False)
+    if fmt is None:
+        return pd.to_datetime(s, format="mixed", errors="coerce", dayfirst=False)
+    parsed = pd.to_datetime(s, format=fmt, errors="coerce")
+    leftover = parsed.isna()
+    if leftover.mean() > 0.05:  # genuinely mixed formats: the guess didn't help
+        return pd.to_datetime(s, format="mixed", errors="coerce", dayfirst=False)
+    if leftover.any():
+        parsed[leftover] = pd.to_datetime(s[leftover], format="mixed", errors="coerce", dayfirst=False)
+    return parsed
+
+
 def _step_convert_types(df: pd.DataFrame, actions: list) -> pd.DataFrame:
     """Step 4: Auto-detect and convert data types."""
     conversions = []
 
     for col in df.columns:
-        original_dtype = str(df[col].dtype)
-
         # Skip already-typed columns
         if df[col].dtype != "object":
             continue
 
-        # Try numeric first
-        numeric_converted = pd.to_numeric(df[col], errors="coerce")
-        non_null_original = df[col].dropna().shape[0]
-        non_null_numeric = numeric_converted.dropna().shape[0]
-
-        # If >80% of non-null values convert to numbers, treat as numeric
-        if non_null_original > 0 and non_null_numeric / non_null_original > 0.8:
-            df[col] = numeric_converted
-            conversions.append(f"'{col}': text → numeric")
+        values = df[col].dropna()
+        non_null_original = len(values)
+        if non_null_original == 0:
             continue
+        if non_null_original > _TYPE_SAMPLE_ROWS:
+            # Evenly spaced rather than random: keeps row order, which the
+            # mixed datetime parser relies on to reuse the last format.
+            sample = values.iloc[:: non_null_original // _TYPE_SAMPLE_ROWS]
+        else:
+            sample = values
+        screen = 0.8 - _TYPE_SAMPLE_SLACK if sample is not values else 0.8
+
+        # Try numeric first
+        if pd.to_numeric(sample, errors="coerce").notna().mean() > screen:
+            numeric_converted = pd.to_numeric(df[col], errors="coerce")
+            # If >80% of non-null values convert to numbers, treat as numeric
+            if numeric_converted.notna().sum() / non_null_original > 0.8:
+                df[col] = numeric_converted
+                conversions.append(f"'{col}': text → numeric")
+                continue
 
         # Try datetime
         try:
-            datetime_converted = pd.to_datetime(df[col], format="mixed", errors="coerce", dayfirst=False)
-            non_null_datetime = datetime_converted.dropna().shape[0]
-            if non_null_original > 0 and non_null_datetime / non_null_original > 0.8:
-                df[col] = datetime_converted
-                conversions.append(f"'{col}': text → datetime")
-                continue
+            probe = pd.to_datetime(sample, format="mixed", errors="coerce", dayfirst=False)
+            if probe.notna().mean() > screen:
+                parsed = _parse_datetimes(values)
+                if parsed.notna().sum() / non_null_original > 0.8:
+                    df[col] = parsed.reindex(df.index)
+                    conversions.append(f"'{col}': text → datetime")
+                    continue
         except Exception:
             pass
 
@@ -201,28 +243,18 @@ def _step_handle_missing(df: pd.DataFrame, actions: list) -> pd.DataFrame:
     dropped_cols = []
     filled_cols = []
 
-    for col in df.columns:
-        missing = int(df[col].isnull().sum())
-        if missing == 0:
-            continue
-
-        total = len(df)
+    total = len(df)
+    missing_counts = df.isnull().sum()
+    to_drop, num_cols, cat_cols = [], [], []
+    for col, missing in missing_counts[missing_counts > 0].items():
+        missing = int(missing)
         pct = missing / total * 100
-
         if pct > 60:
             # Too unreliable — drop it
-            df = df.drop(columns=[col])
+            to_drop.append(col)
             dropped_cols.append(f"'{col}' ({pct:.0f}% missing)")
         elif pd.api.types.is_numeric_dtype(df[col]):
-            median_val = df[col].median()
-            df[col] = df[col].fillna(median_val)
-            filled_cols.append({
-                "column": col,
-                "missing": missing,
-                "pct": round(pct, 1),
-                "strategy": "median",
-                "fill_value": _safe_val(median_val),
-            })
+            num_cols.append(col)
         elif pd.api.types.is_datetime64_any_dtype(df[col]):
             # Don't fill datetimes — just report
             missing_cols.append({
@@ -233,16 +265,35 @@ def _step_handle_missing(df: pd.DataFrame, actions: list) -> pd.DataFrame:
                 "fill_value": None,
             })
         else:
-            mode_series = df[col].mode()
-            mode_val = mode_series.iloc[0] if len(mode_series) > 0 else "Unknown"
-            df[col] = df[col].fillna(mode_val)
-            filled_cols.append({
-                "column": col,
-                "missing": missing,
-                "pct": round(pct, 1),
-                "strategy": "mode",
-                "fill_value": str(mode_val),
-            })
+            cat_cols.append(col)
+
+    if to_drop:
+        df = df.drop(columns=to_drop)
+
+    # One batched median/mode computation and fill per column group
+    fill_values = {}
+    if num_cols:
+        medians = df[num_cols].median()
+        df[num_cols] = df[num_cols].fillna(medians)
+        fill_values.update((col, ("median", _safe_val(val))) for col, val in zip(num_cols, medians.to_numpy()))
+    if cat_cols:
+        modes = df[cat_cols].mode().iloc[0].fillna("Unknown")
+        df[cat_cols] = df[cat_cols].fillna(modes)
+        fill_values.update((col, ("mode", str(val))) for col, val in modes.items())
+
+    # Report in original column order
+    for col in missing_counts.index:
+        if col not in fill_values:
+            continue
+        strategy, fill_value = fill_values[col]
+        missing = int(missing_counts[col])
+        filled_cols.append({
+            "column": col,
+            "missing": missing,
+            "pct": round(missing / total * 100, 1),
+            "strategy": strategy,
+            "fill_value": fill_value,
+        })
 
     if dropped_cols:
         actions.append({
@@ -288,9 +339,13 @@ def _step_strip_whitespace(df: pd.DataFrame, actions: list) -> pd.DataFrame:
     str_cols = df.select_dtypes(include=["object"]).columns.tolist()
     if str_cols:
         for col in str_cols:
-            df[col] = df[col].astype(str).str.strip()
-            # Replace 'nan' strings (from astype) back to NaN
-            df[col] = df[col].replace("nan", np.nan).replace("None", np.nan)
+            # Strip only the present values so real NaNs never round-trip
+            # through the string "nan"; literal "nan"/"None" text still maps to NaN.
+            values = df[col].to_numpy(dtype=object, copy=True)
+            present = pd.notna(values)
+            stripped = pd.Series(values[present]).astype(str).str.strip()
+            values[present] = stripped.mask(stripped.isin(("nan", "None"))).to_numpy()
+            df[col] = values
         actions.append({
             "step": "Clean text values",
             "severity": "info",
@@ -313,29 +368,28 @@ def _step_detect_outliers(df: pd.DataFrame, actions: list) -> pd.DataFrame:
     numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
     outlier_summary = []
 
-    for col in numeric_cols:
-        series = df[col].dropna()
-        if len(series) < 10:
-            continue
-
-        q1 = series.quantile(0.25)
-        q3 = series.quantile(0.75)
+    counts = df[numeric_cols].count()
+    numeric_cols = counts.index[counts >= 10].tolist()
+    if numeric_cols:
+        # One batched quantile call instead of two sorts per column
+        sub = df[numeric_cols]
+        q = sub.quantile([0.25, 0.75])
+        q1, q3 = q.iloc[0], q.iloc[1]
         iqr = q3 - q1
-
-        if iqr == 0:
-            continue
-
         lower = q1 - 1.5 * iqr
         upper = q3 + 1.5 * iqr
-        outliers = ((series < lower) | (series > upper)).sum()
+        outlier_counts = ((sub < lower) | (sub > upper)).sum()
 
-        if outliers > 0:
+        for col in numeric_cols:
+            outliers = outlier_counts[col]
+            if iqr[col] == 0 or outliers == 0:
+                continue
             outlier_summary.append({
                 "column": col,
                 "outlier_count": int(outliers),
-                "pct": round(outliers / len(series) * 100, 1),
-                "lower_bound": round(float(lower), 2),
-                "upper_bound": round(float(upper), 2),
+                "pct": round(outliers / counts[col] * 100, 1),
+                "lower_bound": round(float(lower[col]), 2),
+                "upper_bound": round(float(upper[col]), 2),
             })
 
     if outlier_summary:
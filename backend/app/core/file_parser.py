@@ -10,9 +10,21 @@ Why a separate module?
   - Reusable: any part of the app can call parse_file()
 """
 
+import csv
+import io
+import os
+
 import pandas as pd
 import numpy as np
-import os
+from joblib import Parallel, delayed
+
+from ..config import settings
+
+_CSV_ENCODINGS = ["utf-8", "latin-1", "cp1252"]
+_CSV_SEPARATORS = [",", ";", "\t", "|"]
+_SNIFF_BYTES = 64 * 1024
+_SNIFF_LINES = 20  # lines csv.Sniffer looks at (it's slow on large samples)
+PARALLEL_MIN_COLS = 4  # narrower tables aren't worth the thread-pool overhead
 
 
 def parse_file(file_path: str, sheet_name: int | str = 0) -> pd.DataFrame:
@@ -32,9 +44,18 @@ def parse_file(file_path: str, sheet_name: int | str = 0) -> pd.DataFrame:
     ext = os.path.splitext(file_path)[1].lower()
 
     if ext == ".csv":
+        # Pick encoding + delimiter from the first 64 KB, then parse the
+        # whole file once (instead of up to 12 full trial parses)
+        dialect = _sniff_csv(file_path)
+        if dialect is not None:
+            try:
+                return _read_csv(file_path, *dialect)
+            except Exception:
+                pass  # e.g. a decode error past the sample; try everything below
+
         # Try common CSV encodings and delimiters
-        for encoding in ["utf-8", "latin-1", "cp1252"]:
-            for sep in [",", ";", "\t", "|"]:
+        for encoding in _CSV_ENCODINGS:
+            for sep in _CSV_SEPARATORS:
                 try:
                     df = pd.read_csv(
                         file_path,
@@ -53,13 +74,66 @@ def parse_file(file_path: str, sheet_name: int | str = 0) -> pd.DataFrame:
         return pd.read_csv(file_path, on_bad_lines="skip")
 
     elif ext in (".xlsx", ".xls"):
-        df = pd.read_excel(file_path, sheet_name=sheet_name, engine="openpyxl")
-        return df
+        return _read_excel(file_path, sheet_name)
 
     else:
         raise ValueError(f"Unsupported file format: {ext}")
 
 
+def _sniff_csv(file_path: str) -> tuple[str, str] | None:
+    """Return (encoding, sep) that parses the head of the file into >1 column."""
+    with open(file_path, "rb") as f:
+        head = f.read(_SNIFF_BYTES)
+    if len(head) == _SNIFF_BYTES and b"\n" in head:
+        head = head[: head.rfind(b"\n") + 1]  # don't cut a row (or a UTF-8 char) in half
+
+    for encoding in _CSV_ENCODINGS:
+        try:
+            text = head.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+        # Let csv.Sniffer nominate a delimiter from the first lines so the
+        # usual case costs one trial parse; the full sweep is the fallback
+        for sep in _guess_separators(text):
+            try:
+                sample = pd.read_csv(io.StringIO(text), sep=sep, on_bad_lines="skip")
+            except Exception:
+                continue
+            # If only 1 column was detected, the separator was probably wrong
+            if len(sample.columns) > 1 or sep == "|":
+                return encoding, sep
+    return None
+
+
+def _guess_separators(text: str) -> list[str]:
+    """_CSV_SEPARATORS, with the one csv.Sniffer picks (if any) moved to the front."""
+    try:
+        lines = "".join(text.splitlines(keepends=True)[:_SNIFF_LINES])
+        sep = csv.Sniffer().sniff(lines, delimiters="".join(_CSV_SEPARATORS)).delimiter
+    except csv.Error:
+        return _CSV_SEPARATORS
+    return [sep] + [s for s in _CSV_SEPARATORS if s != sep]
+
+
+def _read_csv(file_path: str, encoding: str, sep: str) -> pd.DataFrame:
+    """Full CSV read — pyarrow's multi-threaded parser when enabled and installed."""
+    if settings.USE_PYARROW_CSV:
+        try:
+            return pd.read_csv(file_path, encoding=encoding, sep=sep, engine="pyarrow", on_bad_lines="skip")
+        except Exception:
+            pass  # pyarrow missing, or input it can't handle — use the C parser
+    return pd.read_csv(file_path, encoding=encoding, sep=sep, on_bad_lines="skip")
+
+
+def _read_excel(file_path: str, sheet_name: int | str) -> pd.DataFrame:
+    """Excel read — the Rust-backed calamine engine when installed, else openpyxl."""
+    try:
+        return pd.read_excel(file_path, sheet_name=sheet_name, engine="calamine")
+    except Exception:
+        pass  # python-calamine missing, or a workbook it can't handle
+    return pd.read_excel(file_path, sheet_name=sheet_name, engine="openpyxl")
+
+
 def get_sheet_names(file_path: str) -> list[str]:
     """
     Get sheet names from an Excel file.
@@ -67,6 +141,11 @@ def get_sheet_names(file_path: str) -> list[str]:
     """
     ext = os.path.splitext(file_path)[1].lower()
     if ext in (".xlsx", ".xls"):
+        try:
+            from python_calamine import CalamineWorkbook
+            return CalamineWorkbook.from_path(file_path).sheet_names
+        except Exception:
+            pass  # python-calamine missing, or a workbook it can't handle
         xl = pd.ExcelFile(file_path, engine="openpyxl")
         return xl.sheet_names
     return []
@@ -87,46 +166,14 @@ def profile_dataframe(df: pd.DataFrame) -> dict:
           - memory_usage_mb: approximate memory footprint
           - duplicate_rows: number of duplicate rows
     """
-    profiles = []
-
-    for col in df.columns:
-        series = df[col]
-        missing = int(series.isnull().sum())
-        total = len(series)
-
-        profile = {
-            "name": col,
-            "dtype": str(series.dtype),
-            "missing_count": missing,
-            "missing_pct": round(missing / total * 100, 1) if total > 0 else 0,
-            "unique_count": int(series.nunique()),
-            "sample_values": _get_sample_values(series),
-        }
-
-        # Add type-specific stats
-        if pd.api.types.is_numeric_dtype(series):
-            profile["category"] = "numeric"
-            clean = series.dropna()
-            if len(clean) > 0:
-                profile["min"] = _safe_number(clean.min())
-                profile["max"] = _safe_number(clean.max())
-                profile["mean"] = _safe_number(clean.mean())
-                profile["median"] = _safe_number(clean.median())
-                profile["std"] = _safe_number(clean.std())
-        elif pd.api.types.is_datetime64_any_dtype(series):
-            profile["category"] = "datetime"
-            clean = series.dropna()
-            if len(clean) > 0:
-                profile["min"] = str(clean.min())
-                profile["max"] = str(clean.max())
-        else:
-            profile["category"] = "text"
-            clean = series.dropna()
-            if len(clean) > 0:
-                top = clean.value_counts().head(3)
-                profile["top_values"] = {str(k): int(v) for k, v in top.items()}
-
-        profiles.append(profile)
+    # Wide tables profile their columns on a thread pool — the reductions
+    # and hash-table builds behind nunique/value_counts release the GIL.
+    if len(df.columns) >= PARALLEL_MIN_COLS:
+        profiles = Parallel(n_jobs=-1, backend="threading")(
+            delayed(_profile_column)(df[col]) for col in df.columns
+        )
+    else:
+        profiles = [_profile_column(df[col]) for col in df.columns]
 
     return {
         "row_count": len(df),
@@ -137,6 +184,44 @@ def profile_dataframe(df: pd.DataFrame) -> dict:
     }
 
 
+def _profile_column(series: pd.Series) -> dict:
+    """Profile one column: missing/unique counts, samples and type-specific stats."""
+    missing = int(series.isnull().sum())
+    total = len(series)
+
+    profile = {
+        "name": series.name,
+        "dtype": str(series.dtype),
+        "missing_count": missing,
+        "missing_pct": round(missing / total * 100, 1) if total > 0 else 0,
+        "unique_count": int(series.nunique()),
+        "sample_values": _get_sample_values(series),
+    }
+
+    # Add type-specific stats
+    if pd.api.types.is_numeric_dtype(series):
+        profile["category"] = "numeric"
+        # Aggregations skip NaN themselves; no dropna() copy needed
+        if missing < total:
+            profile["min"] = _safe_number(series.min())
+            profile["max"] = _safe_number(series.max())
+            profile["mean"] = _safe_number(series.mean())
+            profile["median"] = _safe_number(series.median())
+            profile["std"] = _safe_number(series.std())
+    elif pd.api.types.is_datetime64_any_dtype(series):
+        profile["category"] = "datetime"
+        if missing < total:
+            profile["min"] = str(series.min())
+            profile["max"] = str(series.max())
+    else:
+        profile["category"] = "text"
+        if missing < total:
+            top = series.value_counts(dropna=True).head(3)
+            profile["top_values"] = {str(k): int(v) for k, v in top.items()}
+
+    return profile
+
+
 def _safe_number(val) -> float | int | None:
     """Convert numpy numbers to Python-native numbers for JSON serialization."""
     if val is None or (isinstance(val, float) and np.isnan(val)):
@@ -152,8 +237,8 @@ def _safe_number(val) -> float | int | None:
 
 def _get_sample_values(series: pd.Series, n: int = 3) -> list:
     """Get n non-null sample values from a series."""
-    clean = series.dropna().unique()
-    samples = clean[:n].tolist()
+    uniques = series.unique()
+    samples = uniques[pd.notna(uniques)][:n].tolist()
     # Convert numpy types to Python-native for JSON
     result = []
     for s in samples:
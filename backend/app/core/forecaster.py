@@ -10,8 +10,11 @@ Prophet is great because:
   - Easy to use: just give it dates and values
 """
 
+from functools import lru_cache
+
 import pandas as pd
 import numpy as np
+from joblib import Parallel, delayed
 from scipy import stats as sp_stats
 
 
@@ -31,9 +34,13 @@ def generate_forecast(df, date_col: str, value_col: str, periods: int = 30) -> d
         dict with historical data, forecast data, confidence intervals, and method used.
     """
     # Prepare data
-    data = df[[date_col, value_col]].dropna().sort_values(date_col).copy()
+    data = df[[date_col, value_col]].dropna().sort_values(date_col, kind="stable")
     data.columns = ["ds", "y"]
+    return _forecast_series(data, value_col, periods)
+
 
+def _forecast_series(data: pd.DataFrame, value_col: str, periods: int) -> dict:
+    """Forecast one prepared, date-sorted ds/y frame (see generate_forecast)."""
     if len(data) < 4:
         return {
             "status": "insufficient_data",
@@ -59,12 +66,29 @@ def generate_all_forecasts(df, date_col: str, numeric_cols: list, periods: int =
     Returns:
         dict keyed by column name with forecast results.
     """
-    forecasts = {}
-    for col in numeric_cols[:5]:  # limit to 5 columns
-        result = generate_forecast(df, date_col, col, periods)
-        if result.get("status") != "insufficient_data":
-            forecasts[col] = result
-    return forecasts
+    cols = numeric_cols[:5]  # limit to 5 columns
+
+    # Sort by date once; each column then only drops its own missing values
+    base = df[[date_col, *dict.fromkeys(cols)]].dropna(subset=[date_col]).sort_values(date_col, kind="stable")
+
+    def forecast_col(col: str) -> dict:
+        data = base[[date_col, col]].dropna()
+        data.columns = ["ds", "y"]
+        return _forecast_series(data, col, periods)
+
+    # Prophet fits are mostly spent waiting on the cmdstan subprocess, so a
+    # thread pool runs them side by side; the linear fallback is too cheap to bother
+    if _load_prophet() is not None and len(cols) > 1:
+        results = Parallel(n_jobs=len(cols), backend="threading")(
+            delayed(forecast_col)(col) for col in cols
+        )
+    else:
+        results = [forecast_col(col) for col in cols]
+
+    return {
+        col: result for col, result in zip(cols, results)
+        if result.get("status") != "insufficient_data"
+    }
 
 
 def _detect_frequency(dates: pd.Series) -> str:
@@ -89,11 +113,22 @@ def _detect_frequency(dates: pd.Series) -> str:
         return "YS"
 
 
-def _prophet_forecast(data: pd.DataFrame, periods: int, freq: str) -> dict | None:
-    """Try to forecast using Prophet. Returns None if Prophet is unavailable."""
+@lru_cache(maxsize=1)
+def _load_prophet():
+    """Import Prophet once per process; None when it isn't installed."""
     try:
         from prophet import Prophet
+    except ImportError:
+        return None
+    return Prophet
+
 
+def _prophet_forecast(data: pd.DataFrame, periods: int, freq: str) -> dict | None:
+    """Try to forecast using Prophet. Returns None if Prophet is unavailable."""
+    Prophet = _load_prophet()
+    if Prophet is None:
+        return None
+    try:
         model = Prophet(
             yearly_seasonality="auto",
             weekly_seasonality="auto",
@@ -106,28 +141,11 @@ def _prophet_forecast(data: pd.DataFrame, periods: int, freq: str) -> dict | Non
         forecast = model.predict(future)
 
         # Extract results
-        historical = data.to_dict(orient="records")
-        for row in historical:
-            row["ds"] = row["ds"].isoformat() if hasattr(row["ds"], "isoformat") else str(row["ds"])
-
-        forecast_records = []
-        for _, row in forecast.tail(periods).iterrows():
-            forecast_records.append({
-                "ds": row["ds"].isoformat() if hasattr(row["ds"], "isoformat") else str(row["ds"]),
-                "yhat": round(float(row["yhat"]), 4),
-                "yhat_lower": round(float(row["yhat_lower"]), 4),
-                "yhat_upper": round(float(row["yhat_upper"]), 4),
-            })
-
-        # Full timeline for plotting
-        full_timeline = []
-        for _, row in forecast.iterrows():
-            full_timeline.append({
-                "ds": row["ds"].isoformat() if hasattr(row["ds"], "isoformat") else str(row["ds"]),
-                "yhat": round(float(row["yhat"]), 4),
-                "yhat_lower": round(float(row["yhat_lower"]), 4),
-                "yhat_upper": round(float(row["yhat_upper"]), 4),
-            })
+        historical = _history_records(data)
+        full_timeline = _timeline_records(
+            forecast["ds"], forecast["yhat"], forecast["yhat_lower"], forecast["yhat_upper"],
+        )
+        forecast_records = full_timeline[len(full_timeline) - periods:]
 
         return {
             "status": "success",
@@ -139,8 +157,6 @@ def _prophet_forecast(data: pd.DataFrame, periods: int, freq: str) -> dict | Non
             "full_timeline": full_timeline,
         }
 
-    except ImportError:
-        return None
     except Exception as e:
         print(f"Prophet failed: {e}")
         return None
@@ -165,31 +181,18 @@ def _linear_forecast(data: pd.DataFrame, periods: int, freq: str, col_name: str)
     last_date = data["ds"].iloc[-1]
     future_dates = pd.date_range(start=last_date, periods=periods + 1, freq=freq)[1:]
 
-    historical = data.to_dict(orient="records")
-    for row in historical:
-        row["ds"] = row["ds"].isoformat() if hasattr(row["ds"], "isoformat") else str(row["ds"])
+    historical = _history_records(data)
 
-    forecast_records = []
-    for i, (date, yhat) in enumerate(zip(future_dates, future_y)):
-        margin = 1.96 * rmse * np.sqrt(1 + (i + 1) / len(data))
-        forecast_records.append({
-            "ds": date.isoformat(),
-            "yhat": round(float(yhat), 4),
-            "yhat_lower": round(float(yhat - margin), 4),
-            "yhat_upper": round(float(yhat + margin), 4),
-        })
+    margin = 1.96 * rmse * np.sqrt(1 + np.arange(1, periods + 1) / len(data))
+    forecast_records = _timeline_records(
+        pd.Series(future_dates), future_y, future_y - margin, future_y + margin,
+    )
 
     # Full timeline
     fitted_y = slope * x + intercept
-    full_timeline = []
-    for date_val, yhat in zip(data["ds"].values, fitted_y):
-        ds = pd.Timestamp(date_val)
-        full_timeline.append({
-            "ds": ds.isoformat(),
-            "yhat": round(float(yhat), 4),
-            "yhat_lower": round(float(yhat - rmse), 4),
-            "yhat_upper": round(float(yhat + rmse), 4),
-        })
+    full_timeline = _timeline_records(
+        pd.Series(data["ds"].values), fitted_y, fitted_y - rmse, fitted_y + rmse,
+    )
     full_timeline.extend(forecast_records)
 
     return {
@@ -204,3 +207,28 @@ def _linear_forecast(data: pd.DataFrame, periods: int, freq: str, col_name: str)
         "forecast": forecast_records,
         "full_timeline": full_timeline,
     }
+
+
+def _isoformat(dates: pd.Series) -> list[str]:
+    """Timestamp.isoformat() for every date — one strftime for whole-second naive dates."""
+    if dates.dt.tz is None and not (dates.dt.microsecond.any() or dates.dt.nanosecond.any()):
+        return dates.dt.strftime("%Y-%m-%dT%H:%M:%S").tolist()
+    return [d.isoformat() for d in dates]
+
+
+def _history_records(data: pd.DataFrame) -> list[dict]:
+    """The ds/y input rows as JSON-ready dicts."""
+    return [{"ds": ds, "y": y} for ds, y in zip(_isoformat(data["ds"]), data["y"].tolist())]
+
+
+def _timeline_records(ds: pd.Series, yhat, yhat_lower, yhat_upper) -> list[dict]:
+    """Forecast rows as JSON-ready dicts, rounded column-wise instead of per cell."""
+    return [
+        {"ds": d, "yhat": y, "yhat_lower": lo, "yhat_upper": hi}
+        for d, y, lo, hi in zip(
+            _isoformat(ds),
+            np.round(np.asarray(yhat, dtype=float), 4).tolist(),
+            np.round(np.asarray(yhat_lower, dtype=float), 4).tolist(),
+            np.round(np.asarray(yhat_upper, dtype=float), 4).tolist(),
+        )
+    ]
@@ -7,19 +7,64 @@ to our server, FastAPI routes it to the correct handler function.
 Think of it like a receptionist who directs visitors to the right department.
 """
 
+import logging
+import logging.handlers
+import queue
+import sys
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 import os
 
 from app.api import upload, analysis, chat, reports, dashboard
+from app.agent.bi_agent import load_chat_cache, save_chat_cache
+from app.agent.insight_generator import load_insight_cache, save_insight_cache
 from app.config import settings
 
+
+# ── Logging ─────────────────────────────────────────────────────
+# Request handlers only push records onto an in-memory queue; a
+# background listener thread does the actual writing to stderr, so
+# concurrent requests never wait on each other at the write syscall.
+def _setup_logging() -> logging.handlers.QueueListener:
+    log_queue = queue.SimpleQueue()
+    stream = logging.StreamHandler(sys.stderr)
+    stream.setFormatter(logging.Formatter("[%(name)s] %(levelname)s %(message)s"))
+
+    app_logger = logging.getLogger("app")
+    app_logger.setLevel(logging.DEBUG if settings.DEBUG else logging.INFO)
+    app_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    app_logger.propagate = False
+
+    listener = logging.handlers.QueueListener(log_queue, stream)
+    listener.start()
+    return listener
+
+
+# ── Lifespan ────────────────────────────────────────────────────
+# Runs once when the server starts and once when it stops.
+# The chat answer and insight caches are restored on startup and saved on
+# shutdown so a restart doesn't throw away every previously paid-for answer.
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    listener = _setup_logging()
+    load_chat_cache()
+    load_insight_cache()
+    yield
+    save_chat_cache()
+    save_insight_cache()
+    listener.stop()
+    logging.getLogger("app").handlers.clear()
+
+
 # Create the FastAPI app instance
 app = FastAPI(
     title="Autonomous BI System",
     description="AI-powered business intelligence with automatic analysis, insights, and reporting.",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # ── CORS Middleware ──────────────────────────────────────────────
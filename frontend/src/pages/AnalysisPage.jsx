@@ -170,7 +170,7 @@ function DistributionTable({ distributions }) {
                   )}
                 </td>
                 <td className="py-1.5 text-right font-mono text-gray-500">
-                  {d.shapiro_p !== null ? d.shapiro_p?.toFixed(4) : "\u2014"}
+                  {d.normality_p != null ? d.normality_p.toFixed(4) : "\u2014"}
                 </td>
               </tr>
             ))}
@@ -33,7 +33,7 @@ import {
 } from "lucide-react";
 import { useCallback, useEffect, useRef, useState } from "react";
 import { useNavigate, useSearchParams } from "react-router-dom";
-import { askQuestion, getChatSuggestions, runAnalysis } from "../services/api";
+import { askQuestionStream, getChatSuggestions, runAnalysis } from "../services/api";
 
 /* ─── Markdown-lite renderer ───────────────────────────────────── */
 
@@ -397,33 +397,40 @@ function ChatPage() {
     setInput("");
     setLoading(true);
 
+    const assistantId = Date.now() + 1;
+
+    // Insert the assistant message on first use, then update it in place
+    const upsertAssistant = (update) =>
+      setMessages((prev) => {
+        const existing = prev.find((m) => m.id === assistantId);
+        if (!existing) {
+          return [...prev, { id: assistantId, role: "assistant", content: "", tools: [], error: false, timestamp: new Date(), ...update(null) }];
+        }
+        return prev.map((m) => (m.id === assistantId ? { ...m, ...update(m) } : m));
+      });
+
     try {
       const history = messages.map((m) => ({ role: m.role, content: m.content }));
-      const res = await askQuestion(fileId, question, history);
+      const res = await askQuestionStream(fileId, question, history, (delta) =>
+        upsertAssistant((m) => ({ content: (m?.content || "") + delta }))
+      );
 
-      const assistantMsg = {
-        id: Date.now() + 1,
-        role: "assistant",
+      // The final answer is authoritative — it replaces the streamed text
+      // (e.g. when a quota error is swapped for the local fallback)
+      upsertAssistant(() => ({
         content: res.answer,
         tools: res.tool_calls || [],
         error: res.error || false,
-        timestamp: new Date(),
-      };
-
-      setMessages((prev) => [...prev, assistantMsg]);
+      }));
 
       if (res.session_id) setSessionId(res.session_id);
       if (res.suggestions && res.suggestions.length > 0) setSuggestions(res.suggestions);
     } catch (err) {
       console.error(err);
-      const errorMsg = {
-        id: Date.now() + 1,
-        role: "assistant",
+      upsertAssistant(() => ({
         content: `Sorry, something went wrong: ${err.response?.data?.detail || err.message}`,
         error: true,
-        timestamp: new Date(),
-      };
-      setMessages((prev) => [...prev, errorMsg]);
+      }));
     } finally {
       setLoading(false);
       inputRef.current?.focus();
@@ -536,7 +543,7 @@ function ChatPage() {
             {messages.map((msg) => (
               <MessageBubble key={msg.id} message={msg} />
             ))}
-            {loading && <TypingIndicator />}
+            {loading && messages[messages.length - 1]?.role !== "assistant" && <TypingIndicator />}
             <div ref={messagesEndRef} />
           </div>
         )}
@@ -68,6 +68,56 @@ export async function askQuestion(fileId, question, history = []) {
     return response.data;
 }
 
+/**
+ * Streaming variant of askQuestion. Reads the NDJSON events from
+ * /chat/ask/stream, calling onDelta with each piece of answer text,
+ * and resolves with the final result payload (same shape as askQuestion).
+ * axios can't read a response body incrementally in the browser, so this uses fetch.
+ */
+export async function askQuestionStream(fileId, question, history = [], onDelta) {
+    const response = await fetch(`${API.defaults.baseURL}/chat/ask/stream`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+            file_id: fileId,
+            question,
+            history: history.map(m => ({ role: m.role, content: m.content })),
+        }),
+    });
+
+    if (!response.ok) {
+        const data = await response.json().catch(() => ({}));
+        const error = new Error(data.detail || `Request failed with status ${response.status}`);
+        error.response = { status: response.status, data };
+        throw error;
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let result = null;
+
+    const handleLine = (line) => {
+        if (!line.trim()) return;
+        const event = JSON.parse(line);
+        if (event.delta) onDelta?.(event.delta);
+        if (event.result) result = event.result;
+    };
+
+    for (;;) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+        lines.forEach(handleLine);
+    }
+    handleLine(buffer + decoder.decode());
+
+    if (!result) throw new Error('Chat stream ended without a result');
+    return result;
+}
+
 export async function getChatSuggestions(fileId) {
     const response = await API.get(`/chat/suggestions/${fileId}`);
     return response.data;
@@ -53,8 +53,68 @@ print('Answer:', d7.get('answer', '')[:300])
 print('Tools:', d7.get('tool_calls', []))
 print('Suggestions:', d7.get('suggestions', []))
 
+# Chat (streaming) — NDJSON deltas, then the same payload as /chat/ask
+print('\n=== CHAT STREAM ===')
+r9 = requests.post('http://localhost:8000/api/chat/ask/stream', json={
+    'file_id': '94303ac1',
+    'question': 'What are the top selling products?'
+}, stream=True)
+print('Status:', r9.status_code)
+events = [json.loads(line) for line in r9.iter_lines() if line]
+deltas = [e['delta'] for e in events if 'delta' in e]
+result = events[-1].get('result')
+print(f'Events: {len(events)} | deltas: {len(deltas)}')
+assert result is not None, 'last event must be the result'
+assert set(result) == set(d7), f'stream result keys {sorted(result)} != /ask keys {sorted(d7)}'
+print('Answer:', result.get('answer', '')[:300])
+
 # Suggestions
 print('\n=== SUGGESTIONS ===')
 r8 = requests.get('http://localhost:8000/api/chat/suggestions/94303ac1')
 print('Status:', r8.status_code)
 print('Suggestions:', r8.json())
+
+# Analysis (streaming) — one JSON document, same as POST /analysis/run
+print('\n=== ANALYSIS STREAM ===')
+r10 = requests.post('http://localhost:8000/api/analysis/run/94303ac1/stream', stream=True)
+print('Status:', r10.status_code)
+d10 = json.loads(b''.join(r10.iter_content(chunk_size=None)))
+print('Status field:', d10.get('status'))
+assert d10.get('status') == 'completed', d10.get('error')
+r11 = requests.get('http://localhost:8000/api/analysis/results/94303ac1')
+assert set(d10) == set(r11.json()), f'stream keys {sorted(d10)} != results keys {sorted(r11.json())}'
+print('Sections:', list(d10))
+
+# ETag — repeating a GET with If-None-Match must return 304 and no body
+print('\n=== ETAG / 304 ===')
+for path in ('/api/analysis/results/94303ac1',
+             '/api/dashboard/summary/94303ac1',
+             '/api/dashboard/charts/94303ac1'):
+    first = requests.get(f'http://localhost:8000{path}')
+    etag = first.headers.get('ETag')
+    again = requests.get(f'http://localhost:8000{path}', headers={'If-None-Match': etag})
+    print(f'  {path}: {first.status_code} -> {again.status_code} | ETag {etag}')
+    assert etag, f'{path} sent no ETag'
+    assert again.status_code == 304 and not again.content, f'{path} did not return an empty 304'
+
+# Cleaned data CSV
+print('\n=== CLEANED CSV ===')
+r12 = requests.get('http://localhost:8000/api/analysis/cleaned/94303ac1.csv')
+print('Status:', r12.status_code, '|', r12.headers.get('Content-Type'))
+header = r12.text.splitlines()[0]
+print('Header:', header[:200])
+assert r12.status_code == 200 and r12.headers['Content-Type'].startswith('text/csv')
+
+# Insights (streaming) — NDJSON sections, then the same payload as /analysis/insights
+print('\n=== INSIGHTS STREAM ===')
+r13 = requests.post('http://localhost:8000/api/analysis/insights/94303ac1')
+print('Status:', r13.status_code)
+r14 = requests.post('http://localhost:8000/api/analysis/insights/94303ac1/stream', stream=True)
+print('Stream status:', r14.status_code)
+events = [json.loads(line) for line in r14.iter_lines() if line]
+sections = [e['section'] for e in events if 'section' in e]
+result = events[-1].get('result')
+print(f'Events: {len(events)} | sections: {sections}')
+assert result is not None, 'last event must be the result'
+assert set(result) == set(r13.json()), f'stream result keys {sorted(result)} != insights keys {sorted(r13.json())}'
+print('Result sections:', list(result.get('sections', {})))